@@ -0,0 +1,74 @@
+####################################################################
+# Procesos de llegada y salida de paquetes de juegos en streaming. #
+####################################################################
+
+
+class ArrivalProcess:
+    """
+        Clase base de los procesos de llegada de paquetes.
+            En cada ronda llegan 'get_arrivals' paquetes nuevos, y cada uno permanece
+            'get_lifetime' rondas en la red antes de salir.
+    """
+
+    def get_arrivals(self, round, rng):
+        """ [Abstracto] Cantidad de paquetes que llegan en la ronda 'round'. """
+        pass
+
+    def get_lifetime(self, rng):
+        """ [Abstracto] Cantidad de rondas (al menos 1) que un paquete nuevo permanece en la red. """
+        pass
+
+
+class ConstantArrivals(ArrivalProcess):
+    """
+        Clase que modela la llegada de 'n_arrivals' paquetes por ronda que permanecen
+            exactamente 'lifetime' rondas (población estable de n_arrivals * lifetime).
+    """
+
+    def __init__(self, n_arrivals, lifetime):
+        self.n_arrivals = n_arrivals
+        self.lifetime = lifetime
+
+    def get_arrivals(self, round, rng):
+        return self.n_arrivals
+
+    def get_lifetime(self, rng):
+        return self.lifetime
+
+
+class PoissonArrivals(ArrivalProcess):
+    """
+        Clase que modela llegadas de Poisson con tasa 'rate' paquetes por ronda y permanencias
+            geométricas de media 'mean_lifetime' rondas (población media de rate * mean_lifetime).
+    """
+
+    def __init__(self, rate, mean_lifetime):
+        self.rate = rate
+        self.mean_lifetime = mean_lifetime
+
+    def get_arrivals(self, round, rng):
+        return int(rng.poisson(self.rate))
+
+    def get_lifetime(self, rng):
+        return int(rng.geometric(1 / self.mean_lifetime))
+
+
+class BurstArrivals(ArrivalProcess):
+    """
+        Clase que modela un tráfico en ráfagas: llegadas de Poisson con tasa 'burst_rate' durante
+            'burst_rounds' rondas de cada 'period', y con tasa 'base_rate' el resto del tiempo.
+    """
+
+    def __init__(self, base_rate, burst_rate, period, burst_rounds, mean_lifetime):
+        self.base_rate = base_rate
+        self.burst_rate = burst_rate
+        self.period = period
+        self.burst_rounds = burst_rounds
+        self.mean_lifetime = mean_lifetime
+
+    def get_arrivals(self, round, rng):
+        rate = self.burst_rate if round % self.period < self.burst_rounds else self.base_rate
+        return int(rng.poisson(rate))
+
+    def get_lifetime(self, rng):
+        return int(rng.geometric(1 / self.mean_lifetime))
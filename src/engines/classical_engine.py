@@ -0,0 +1,232 @@
+#############################################################################
+# Motor compilado (Numba) de las rondas de los protocolos clásicos CP y CM. #
+#############################################################################
+
+from src.protocols.classical_routing_protocols import ClassicalRoutingProtocol
+from src.protocols.strategies import PureStrategy, MixedStrategy
+
+from utils.lazy import lazy_import
+import utils.rng as ru
+
+import numpy as np
+
+numba = lazy_import("numba")
+
+
+#----------------- Motor ---------------------------------
+
+
+class NumbaClassicalEngine:
+    """
+        Clase que ejecuta un juego con un protocolo clásico (CP o CM) compilando sus rondas con Numba.
+            El juego se representa con arreglos planos (caminos como listas de aristas, flujos de las
+            aristas, camino y latencia de cada paquete y parámetros de las estrategias) y el kernel
+            ejecuta bloques de rondas sin volver a Python.
+            Los resultados son idénticos a los de RoutingGame.play: se replican el orden de las
+            operaciones y los números aleatorios de cada paquete (ver utils.rng.BlockRandom).
+            No mide las fases del juego aunque tenga un profiler.
+    """
+
+    def play(self, game):
+        """ Ejecuta el juego 'game' (ver RoutingGame.play) y retorna la red y las métricas de cada ronda. """
+        N, possible_paths, protocol = game.N, game.possible_paths, game.protocol
+        if not isinstance(protocol, ClassicalRoutingProtocol):
+            raise ValueError(f"El motor compilado sólo admite protocolos clásicos: {protocol.get_name()}")
+
+        # A. Reinicialización de la red.
+        N.reset_flow()
+        edges = list(N.edges())
+        edge_idxs = {edge: e for e, edge in enumerate(edges)}
+        latencies = [N[u][v]["latency"] for u, v in edges]
+        integral = all(isinstance(x, (int, np.integer)) for l in latencies for x in l)
+        a = np.array([l[0] for l in latencies], dtype=np.float64)
+        b = np.array([l[1] for l in latencies], dtype=np.float64)
+        path_edges = [[edge_idxs[(path[i], path[i+1])] for i in range(len(path)-1)] for path in possible_paths]
+        path_ptr = np.cumsum([0] + [len(p) for p in path_edges]).astype(np.int64)
+        path_edges = np.array([e for p in path_edges for e in p], dtype=np.int64)
+
+        # B. Inicialización de los generadores aleatorios y estrategias de los paquetes (como RoutingGame.start).
+        game.game_seed = ru.game_seed(game.seed)
+        for packet, rng in zip(game.packets, ru.packet_generators(game.game_seed, len(game.packets))):
+            packet.rng = rng
+        protocol.init(N, game.packets, possible_paths, game.seed)
+        strategies = [packet.strategy for packet in game.packets]
+        mixed = all(isinstance(s, MixedStrategy) for s in strategies)
+        if not mixed and not all(isinstance(s, PureStrategy) for s in strategies):
+            raise ValueError("El motor compilado sólo admite estrategias puras (CP) o mixtas (CM).")
+        n_packets = len(strategies)
+        pure_params = np.array([0 if mixed else s.params for s in strategies], dtype=np.int64)
+        mixed_params = np.array([s.params if mixed else np.zeros(len(possible_paths)) for s in strategies], dtype=np.float64)
+        alpha = strategies[0].alpha if mixed and n_packets > 0 else 0.0
+        rngs = [packet.rng for packet in game.packets]
+        # Los bloques se guardan por columnas: en CM todos los paquetes usan la misma fila en cada ronda.
+        uniforms = np.zeros((ru.BLOCK_SIZE, n_packets))
+        uniform_idxs = np.zeros(n_packets, dtype=np.int64)
+        for p, rng in enumerate(rngs):
+            # Bloque actual de cada paquete (vacío si todavía no usó números uniformes).
+            uniforms[ru.BLOCK_SIZE-len(rng.uniforms):, p] = rng.uniforms
+            uniform_idxs[p] = ru.BLOCK_SIZE - len(rng.uniforms) + rng.uniform_idx
+
+        # C. Ejecución de las rondas por bloques (se vuelve a Python sólo para generar más números aleatorios).
+        flows = np.zeros(len(edges))
+        packet_paths = np.full(n_packets, -1, dtype=np.int64)
+        packet_latencies = np.zeros(n_packets)
+        metrics = np.zeros((game.rounds, 4))
+        kernel = _get_kernel()
+        played = 0
+        while played < game.rounds:
+            for p in np.flatnonzero(uniform_idxs == ru.BLOCK_SIZE):
+                # Los bloques pueden ser más cortos que BLOCK_SIZE (ver utils.rng.BlockPool): se ubican al final.
+                block = rngs[p].next_block("uniform")
+                uniforms[ru.BLOCK_SIZE-len(block):, p] = block
+                uniform_idxs[p] = ru.BLOCK_SIZE - len(block)
+            played += kernel(mixed, game.rounds - played, path_ptr, path_edges, a, b, flows, packet_paths,
+                             packet_latencies, pure_params, mixed_params, alpha, uniforms, uniform_idxs, metrics[played:])
+
+        # D. Actualización de la red y retorno de las métricas.
+        cast = int if integral else float
+        for (u, v), flow in zip(edges, flows):
+            N[u][v]["flow"] = int(flow)
+        for packet, path_idx, latency in zip(game.packets, packet_paths, packet_latencies):
+            if path_idx >= 0:
+                packet.path = possible_paths[path_idx]
+                packet.latency = cast(latency)
+        round_metrics = [{"total_cost": cast(m[0]), "edge_flows_max": int(m[1]),
+                          "packet_latency_max": cast(m[2]), "expected_packet_latency": float(m[3])} for m in metrics]
+        return N, round_metrics
+
+
+#----------------- Kernel ---------------------------------
+
+
+_kernel = None
+
+def _get_kernel():
+    """ Compila el kernel la primera vez que se usa (Numba se importa sólo si se usa el motor). """
+    global _kernel, _path_latency, _categorical, _update_mixed_params
+    if _kernel is None:
+        _path_latency = numba.njit(cache=True)(_path_latency)
+        _categorical = numba.njit(cache=True)(_categorical)
+        _update_mixed_params = numba.njit(cache=True)(_update_mixed_params)
+        _kernel = numba.njit(cache=True)(_play_rounds)
+    return _kernel
+
+def _play_rounds(mixed, n_rounds, path_ptr, path_edges, a, b, flows, packet_paths, packet_latencies,
+                 pure_params, mixed_params, alpha, uniforms, uniform_idxs, metrics):
+    """
+        Ejecuta hasta 'n_rounds' rondas (ver RoutingGame._play_round) sobre los arreglos del juego.
+            Se detiene antes si algún paquete agotó su bloque de números aleatorios.
+            Retorna la cantidad de rondas ejecutadas.
+    """
+    n_packets = len(packet_paths)
+    n_paths = len(path_ptr) - 1
+    block_size = uniforms.shape[0]
+    selected = np.zeros(n_packets, dtype=np.int64)
+    path_latencies = np.zeros(n_paths)
+    min_latency_path_idxs = np.zeros(n_paths, dtype=np.int64)
+
+    for r in range(n_rounds):
+        for p in range(n_packets):
+            if uniform_idxs[p] >= block_size:
+                return r
+
+        # C.1. Cálculo de caminos efectivamente elegidos.
+        for p in range(n_packets):
+            if mixed:
+                u = uniforms[uniform_idxs[p], p]
+                uniform_idxs[p] += 1
+                selected[p] = _categorical(mixed_params, p, u)
+            else:
+                selected[p] = pure_params[p]
+
+        # C.2. Actualización del flujo de la red y latencia de paquetes.
+        for p in range(n_packets):
+            old_path = packet_paths[p]
+            if old_path >= 0:
+                for k in range(path_ptr[old_path], path_ptr[old_path+1]):
+                    flows[path_edges[k]] -= 1
+            new_path = selected[p]
+            for k in range(path_ptr[new_path], path_ptr[new_path+1]):
+                flows[path_edges[k]] += 1
+            packet_paths[p] = new_path
+            packet_latencies[p] = _path_latency(new_path, path_ptr, path_edges, a, b, flows)
+
+        # Latencia esperada y caminos de mínima latencia (ver Network.get_min_latency_path_idxs).
+        total_latency = 0.0
+        total_flow = 0.0
+        for q in range(n_paths):
+            path_latencies[q] = _path_latency(q, path_ptr, path_edges, a, b, flows)
+            path_flow = np.inf
+            for k in range(path_ptr[q], path_ptr[q+1]):
+                path_flow = min(path_flow, flows[path_edges[k]])
+            total_latency += path_latencies[q] * path_flow
+            total_flow += path_flow
+        expected_latency = total_latency / total_flow
+        n_min = 0
+        min_latency = np.inf
+        for q in range(n_paths):
+            if path_latencies[q] == min_latency:
+                min_latency_path_idxs[n_min] = q
+                n_min += 1
+            elif path_latencies[q] < min_latency:
+                min_latency_path_idxs[n_min] = q
+                n_min += 1
+                min_latency = path_latencies[q]
+
+        # C.3. Actualización de estrategias.
+        for p in range(n_packets):
+            payoff = np.sign(expected_latency - packet_latencies[p])
+            if mixed:
+                _update_mixed_params(mixed_params, p, selected[p], payoff, alpha)
+            elif payoff < 0:
+                u = uniforms[uniform_idxs[p], p]
+                uniform_idxs[p] += 1
+                pure_params[p] = min_latency_path_idxs[min(int(u * n_min), n_min - 1)]
+
+        # C.4. Cálculo de métricas.
+        total_cost = 0.0
+        edge_flows_max = -np.inf
+        for e in range(len(flows)):
+            total_cost += (a[e] + b[e] * flows[e]) * flows[e]
+            edge_flows_max = max(edge_flows_max, flows[e])
+        metrics[r, 0] = total_cost
+        metrics[r, 1] = edge_flows_max
+        metrics[r, 2] = packet_latencies.max()
+        metrics[r, 3] = expected_latency
+    return n_rounds
+
+def _path_latency(q, path_ptr, path_edges, a, b, flows):
+    """ Latencia del camino 'q' (ver Network.get_path_latency). """
+    latency = 0.0
+    for k in range(path_ptr[q], path_ptr[q+1]):
+        e = path_edges[k]
+        latency += a[e] + b[e] * flows[e]
+    return latency
+
+def _categorical(params, p, u):
+    """ Índice muestreado con las probabilidades de la fila 'p' (ver BlockRandom.categorical), sin reservar memoria. """
+    n = params.shape[1]
+    total = 0.0
+    for q in range(n):
+        total += params[p, q]
+    x = u * total
+    cumulative = 0.0
+    for q in range(n):
+        cumulative += params[p, q]
+        if cumulative > x:
+            return q
+    return n - 1
+
+def _update_mixed_params(params, p, selected_path_idx, payoff, alpha):
+    """ Actualización de la estrategia mixta de la fila 'p' (ver MixedStrategy.update y utils.math.normalized_probs). """
+    n_params = params.shape[1]
+    selected_variation = payoff * (alpha / 2)
+    other_variation = -payoff * (alpha / (2 * (n_params-1)))
+    for q in range(n_params):
+        params[p, q] += selected_variation if q == selected_path_idx else other_variation
+    total = 0.0
+    for q in range(n_params):
+        params[p, q] = max(min(params[p, q], 1.0), 0.0)
+        total += params[p, q]
+    for q in range(n_params):
+        params[p, q] = params[p, q] / total
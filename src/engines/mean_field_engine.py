@@ -0,0 +1,183 @@
+######################################################################
+# Motor de campo medio (determinista) de protocolos mixtos clásicos. #
+######################################################################
+
+from src.protocols.classical_routing_protocols import ClassicalRoutingProtocol
+from src.protocols.strategies import MixedStrategy
+from src.routing_games import RoutingGame
+
+from utils.lazy import lazy_import
+import utils.rng as ru
+
+import numpy as np
+
+special = lazy_import("scipy.special")
+
+
+#----------------- Motor ---------------------------------
+
+
+class MeanFieldEngine:
+    """
+        Clase que calcula la trayectoria esperada de un juego con un protocolo clásico mixto (CM)
+            en una sola pasada determinista, en lugar de promediar muchas repeticiones del juego.
+            En cada ronda se propagan las probabilidades de elegir cada camino de cada paquete:
+            - Carga esperada de las aristas, incluyendo el orden en que los paquetes se mueven
+              (los anteriores ya en su camino nuevo y los siguientes todavía en el de la ronda anterior).
+            - Latencia esperada de cada paquete según el camino elegido y su pago sg(E[l]-l_i).
+            - Actualización esperada de la estrategia (ver MixedStrategy.update) sobre todos los caminos
+              que el paquete pudo elegir.
+            second_moment: si es True, el pago es la probabilidad de cada signo (aproximación normal de la
+                latencia con la varianza de los demás paquetes) en lugar del signo de la latencia esperada,
+                y el costo total incluye la varianza de los flujos.
+            expected_start: si es True, todos los paquetes parten de la estrategia inicial esperada (uniforme,
+                media de la Dirichlet de MixedStrategy); si no, de las estrategias iniciales del juego.
+            Las métricas máximas (edge_flows_max y packet_latency_max) se aproximan con el máximo de los
+            valores esperados, por lo que subestiman las medias de Monte Carlo, y la latencia esperada de la
+            red se evalúa en los flujos esperados (ver 'validate' para medir el error en cada caso).
+    """
+
+    def __init__(self, second_moment = False, expected_start = True):
+        self.second_moment = second_moment
+        self.expected_start = expected_start
+
+    def play(self, game):
+        """
+            Calcula la trayectoria esperada del juego 'game' (ver RoutingGame.play).
+                Retorna la red (con los flujos esperados de la última ronda) y las métricas esperadas de cada ronda.
+        """
+        N, possible_paths, protocol = game.N, game.possible_paths, game.protocol
+        alpha = self._get_alpha(protocol, len(possible_paths))
+
+        # A. Matriz de incidencia arista-camino y términos de las latencias.
+        N.reset_flow()
+        edges = list(N.edges())
+        edge_idxs = {edge: e for e, edge in enumerate(edges)}
+        A = np.zeros((len(edges), len(possible_paths)))
+        for i, path in enumerate(possible_paths):
+            for j in range(len(path)-1):
+                A[edge_idxs[(path[j], path[j+1])], i] = 1
+        a = np.array([N[u][v]["latency"][0] for u, v in edges], dtype=float)
+        b = np.array([N[u][v]["latency"][1] for u, v in edges], dtype=float)
+        W = A.T @ (b[:, None] * A)
+
+        # B. Estrategias iniciales.
+        n_packets, n_paths = len(game.packets), len(possible_paths)
+        if self.expected_start:
+            probs = np.full((n_packets, n_paths), 1 / n_paths)
+        else:
+            game.game_seed = ru.game_seed(game.seed)
+            for packet, rng in zip(game.packets, ru.packet_generators(game.game_seed, n_packets)):
+                packet.rng = rng
+            protocol.init(N, game.packets, possible_paths, game.seed)
+            probs = np.array([packet.strategy.params for packet in game.packets], dtype=float)
+        variations = self._get_variations(n_paths, alpha)
+
+        # C. Rondas.
+        old_usage = np.zeros((n_packets, len(edges)))
+        old_moments = np.zeros((2, n_packets, n_paths))
+        metrics = []
+        for _ in range(game.rounds):
+            # C.1. Probabilidad de uso de cada arista y flujo esperado de los demás paquetes al moverse cada uno.
+            usage = probs @ A.T
+            others = np.cumsum(usage, axis=0) - usage + (old_usage.sum(axis=0) - np.cumsum(old_usage, axis=0))
+            latencies = A.T @ (a + b) + (others * b) @ A
+            flows = usage.sum(axis=0)
+            expected_latency = self._get_network_expected_latency(A, a, b, flows)
+
+            # C.2. Probabilidades del signo del pago de cada paquete según el camino elegido.
+            difference = expected_latency - latencies
+            if self.second_moment:
+                moments = np.array([probs @ W.T, probs @ (W.T**2)])
+                variances = moments[1] - moments[0]**2
+                old_variances = old_moments[1] - old_moments[0]**2
+                variance = (np.cumsum(variances, axis=0) - variances
+                            + old_variances.sum(axis=0) - np.cumsum(old_variances, axis=0))
+                std = np.sqrt(np.maximum(variance, 0))
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    positive = np.where(std > 0, 0.5 * (1 + special.erf(difference / (std * np.sqrt(2)))),
+                                        difference > 0)
+                negative = np.where(std > 0, 1 - positive, difference < 0)
+                old_moments = moments
+            else:
+                positive, negative = (difference > 0).astype(float), (difference < 0).astype(float)
+
+            # C.3. Métricas esperadas.
+            cost = a @ flows + b @ flows**2
+            if self.second_moment:
+                cost += b @ (usage * (1 - usage)).sum(axis=0)
+            metrics.append({"total_cost": float(cost),
+                            "edge_flows_max": float(flows.max()),
+                            "packet_latency_max": float(np.max(np.sum(probs * latencies, axis=1))),
+                            "expected_packet_latency": float(expected_latency)})
+
+            # C.4. Actualización esperada de las estrategias.
+            probs = self._get_expected_update(probs, variations, positive, negative)
+            old_usage = usage
+
+        # D. Actualización de la red y retorno de las métricas.
+        for (u, v), flow in zip(edges, flows):
+            N[u][v]["flow"] = float(flow)
+        return N, metrics
+
+    def validate(self, game, replicates = 100, seed = None):
+        """
+            Compara la trayectoria esperada con la media de 'replicates' repeticiones del juego (Monte Carlo),
+                con semillas (seed, k). Retorna, por métrica, ambas trayectorias, el desvío estándar de las
+                repeticiones, el error absoluto medio y máximo, el error relativo medio y la fracción de rondas
+                en que el campo medio cae dentro del intervalo de confianza del 95% de la media.
+        """
+        _, mean_field = self.play(game)
+        replicate_metrics = []
+        for k in range(replicates):
+            N = game.N.copy()
+            N.possible_paths = game.possible_paths
+            N.path_policy = game.N.path_policy
+            replicate = RoutingGame(N, len(game.packets), game.rounds, game.protocol, ru.seed_sequence(seed, k))
+            replicate_metrics.append(replicate.play()[1])
+
+        report = {}
+        for metric in mean_field[0]:
+            expected = np.array([m[metric] for m in mean_field])
+            samples = np.array([[m[metric] for m in metrics] for metrics in replicate_metrics], dtype=float)
+            mean, std = samples.mean(axis=0), samples.std(axis=0, ddof=1) if replicates > 1 else np.zeros(len(expected))
+            error = np.abs(expected - mean)
+            report[metric] = {"mean_field": expected, "monte_carlo": mean, "monte_carlo_std": std,
+                              "mean_abs_error": float(error.mean()), "max_abs_error": float(error.max()),
+                              "mean_rel_error": float(np.mean(error / np.maximum(np.abs(mean), 1e-12))),
+                              "within_ci": float(np.mean(error <= 1.96 * std / np.sqrt(replicates)))}
+        return report
+
+    def _get_alpha(self, protocol, n_paths):
+        """ Obtiene el parámetro de aprendizaje de las estrategias del protocolo (que deben ser mixtas y clásicas). """
+        strategy = protocol.strategy_provider(n_paths = n_paths)
+        if not isinstance(protocol, ClassicalRoutingProtocol) or not isinstance(strategy, MixedStrategy):
+            raise ValueError(f"El motor de campo medio sólo admite protocolos clásicos mixtos: {protocol.get_name()}")
+        return strategy.alpha
+
+    def _get_variations(self, n_paths, alpha):
+        """ Variación de las probabilidades (fila q) con pago positivo cuando se elige el camino q. """
+        variations = np.full((n_paths, n_paths), -alpha / (2 * (n_paths-1)))
+        np.fill_diagonal(variations, alpha / 2)
+        return variations
+
+    def _get_expected_update(self, probs, variations, positive, negative):
+        """
+            Estrategias esperadas tras la actualización: para cada camino q elegido (con probabilidad probs[p, q])
+                se aplica la variación con pago positivo o negativo, se limita a [0;1] y se normaliza
+                (ver utils.math.normalized_probs). Sin pago (empate) la estrategia no cambia.
+        """
+        updated = {}
+        for sign in [1, -1]:
+            values = np.clip(probs[:, None, :] + sign * variations[None, :, :], 0, 1)
+            updated[sign] = values / values.sum(axis=2, keepdims=True)
+        unchanged = 1 - positive - negative
+        return (np.einsum("pq,pqk->pk", probs * positive, updated[1])
+                + np.einsum("pq,pqk->pk", probs * negative, updated[-1])
+                + np.sum(probs * unchanged, axis=1, keepdims=True) * probs)
+
+    def _get_network_expected_latency(self, A, a, b, flows):
+        """ Latencia esperada de la red (ver Network.get_expected_latency) evaluada en los flujos esperados. """
+        path_latencies = A.T @ (a + b * flows)
+        path_flows = np.array([flows[A[:, q] > 0].min() for q in range(A.shape[1])])
+        return path_latencies @ path_flows / path_flows.sum()
@@ -5,7 +5,7 @@
 from .protocols.classical_routing_protocols import ClassicalRoutingProtocol
 from .protocols.quantum_routing_protocols import QuantumRoutingProtocol
 from .protocols.strategies import PureStrategy, MixedStrategy, RotationsBasedStrategy
-from .routing_games import RoutingGame, OptimalFlowRoutingGame
+from .routing_games import RoutingGame, OptimalFlowRoutingGame, OptimalFlowRangeRoutingGame, EquilibriumFlowRoutingGame, StreamingRoutingGame
 
 import numpy as np
 
@@ -13,13 +13,44 @@ import numpy as np
 #----------------- Juego ---------------------------------
 
 
-def opt(N, n):
+def opt(N, n, path_policy = None):
     """ Construye un juego que calcula el flujo óptimo. """
-    return OptimalFlowRoutingGame(N, n)
-
-def game(N, n, r, P):
-    """ Construye un juego genérico. """
-    return RoutingGame(N, n, r, P)
+    return OptimalFlowRoutingGame(N, n, path_policy = path_policy)
+
+def opt_range(N, max_n, path_policy = None, exact = False):
+    """ 
+        Construye un juego que calcula los flujos óptimos para 1..max_n paquetes en una sola pasada.
+            exact: si es True, las cantidades cuya optimalidad no se pudo certificar se resuelven con 'opt'.
+    """
+    return OptimalFlowRangeRoutingGame(N, max_n, path_policy, exact)
+
+def eq(N, n, integer = True, path_policy = None):
+    """ 
+        Construye un juego que calcula el flujo de equilibrio.
+            integer: equilibrio de Nash con flujos enteros (True) o de Wardrop continuo (False).
+    """
+    return EquilibriumFlowRoutingGame(N, n, integer, path_policy)
+
+def game(N, n, r, P, seed = None, profiler = None, path_policy = None, engine = None):
+    """ 
+        Construye un juego genérico. 
+            seed: si se indica, el juego usa números aleatorios comunes (mismas
+            subsecuencias aleatorias para cualquier protocolo con la misma semilla).
+            profiler: si se indica (utils.profiling.Profiler), mide el tiempo de cada fase del juego.
+            path_policy: si se indica (ver utils.network.PathPolicy), restringe los caminos posibles.
+            engine: si se indica (ver src.engines), ejecuta las rondas con ese motor (por ejemplo,
+            NumbaClassicalEngine para CP y CM con muchos paquetes y rondas).
+    """
+    return RoutingGame(N, n, r, P, seed, profiler, path_policy, engine)
+
+def stream(N, arrivals, r, P, seed = None, profiler = None, path_policy = None, max_packets = None):
+    """ 
+        Construye un juego en streaming, donde los paquetes llegan y salen de la red.
+            arrivals: el proceso de llegadas (ver src.arrival_processes).
+            max_packets: si se indica, limita la población activa (necesario para protocolos
+            cuánticos, cuyo circuito crece con la cantidad de paquetes activos).
+    """
+    return StreamingRoutingGame(N, arrivals, r, P, seed, profiler, path_policy, max_packets)
 
 
 #----------------- Protocolos ---------------------------------
@@ -67,12 +98,12 @@ def ewl(gamma = (7/16)*np.pi, alpha = 0.8, sigma = 1, n_params_per_qubit = 1):
 
 def _psp():
     """ Construye un generador de estrategias puras. """
-    return lambda n_paths = None, n_qubits = None : PureStrategy(n_qubits, n_paths)
+    return lambda n_paths = None, n_qubits = None, rng = None : PureStrategy(n_qubits, n_paths, rng)
 
 def _msp(alpha):
     """ Construye un generador de estrategias mixtas. """
-    return lambda n_paths = None, n_qubits = None : MixedStrategy(alpha, n_qubits, n_paths)
+    return lambda n_paths = None, n_qubits = None, rng = None : MixedStrategy(alpha, n_qubits, n_paths, rng)
 
 def _rbsp(alpha, sigma, n_params_per_qubit):
     """ Construye un generador de estrategias cuánticas basadas en rotaciones. """
-    return lambda n_paths = None, n_qubits = None : RotationsBasedStrategy(alpha, sigma, n_qubits, n_params_per_qubit)
+    return lambda n_paths = None, n_qubits = None, rng = None : RotationsBasedStrategy(alpha, sigma, n_qubits, n_params_per_qubit, rng)
@@ -0,0 +1,282 @@
+###################################################################
+# Análisis exacto de juegos puros pequeños como cadenas de Markov. #
+###################################################################
+
+from .protocols.quantum_routing_protocols import QuantumRoutingProtocol
+from .protocols.routing_protocols import RoutingProtocol
+from .protocols.strategies import PureStrategy
+
+from utils.lazy import lazy_import
+import utils.lists as lu
+import utils.math as math
+from utils.network import Packet
+
+import itertools
+import numpy as np
+
+qml = lazy_import("pennylane")
+sparse = lazy_import("scipy.sparse")
+csgraph = lazy_import("scipy.sparse.csgraph")
+linalg = lazy_import("scipy.sparse.linalg")
+
+
+# Métricas de cada ronda (ver utils.metric.calculate_protocol_execution_metrics).
+METRICS = ["total_cost", "edge_flows_max", "packet_latency_max", "expected_packet_latency"]
+
+
+class MarkovChainAnalyzer:
+    """
+        Clase que modela un juego con estrategias puras (CP o MWP) como una cadena de Markov finita.
+            El estado al comenzar cada ronda es el camino usado por cada paquete en la ronda anterior
+            (del que se mueve al actualizar el flujo) y el camino de su estrategia pura. Las transiciones
+            se construyen directamente de las reglas del protocolo:
+            - CP: cada paquete elige el camino de su estrategia.
+            - MWP: los caminos siguen la distribución exacta del resultado del circuito, y los resultados
+              inválidos se reemplazan por un camino uniforme con penalización.
+            - Los paquetes con pago negativo pasan a uno de los caminos de Network.get_min_latency_path_idxs
+              (uniformemente), y el resto mantiene su estrategia.
+            Sólo se construyen los estados alcanzables desde las estrategias iniciales (uniformes), por lo
+            que el tamaño de la cadena crece como m^(2n): está pensado para las redes de las pruebas de
+            combinaciones (2 caminos y pocos paquetes).
+    """
+
+    # Probabilidad mínima de un resultado del circuito (los menores se descartan y se renormaliza).
+    MIN_OUTCOME_PROB = 1e-12
+
+    def __init__(self, N, packets_to_send, protocol, path_policy = None):
+        if path_policy is not None:
+            N.set_path_policy(path_policy)
+        self.N = N
+        self.possible_paths = N.get_all_possible_paths()
+        self.n_packets = packets_to_send
+        self.protocol = protocol
+        self.quantum = isinstance(protocol, QuantumRoutingProtocol)
+
+        # Protocolo (sólo estrategias puras) y circuito exacto si es cuántico.
+        n_paths = len(self.possible_paths)
+        packets = [Packet() for _ in range(packets_to_send)]
+        protocol.init(N, packets, self.possible_paths)
+        self.strategies = [packet.strategy for packet in packets]
+        if not all(isinstance(s, PureStrategy) for s in self.strategies):
+            raise ValueError(f"El análisis exacto sólo admite protocolos con estrategias puras: {protocol.get_name()}")
+        if self.quantum:
+            dev = qml.device("default.qubit", wires=len(protocol.qubits))
+            self.probs_qnode = qml.QNode(protocol._probs_circuit, dev)
+            self.outcomes = {}
+
+        # Latencias de las aristas de cada camino.
+        self.path_edges = [[(path[i], path[i+1]) for i in range(len(path)-1)] for path in self.possible_paths]
+        self.latencies = {(u, v): tuple(N[u][v]["latency"]) for u, v in N.edges()}
+
+        # Estados iniciales: sin camino anterior y estrategias uniformes.
+        no_paths = (-1,) * packets_to_send
+        initial_states = [(no_paths, params) for params in itertools.product(range(n_paths), repeat=packets_to_send)]
+        self._build(initial_states)
+
+    def get_expected_metrics(self, rounds):
+        """ Devuelve las métricas esperadas de cada una de las primeras 'rounds' rondas (como RoutingGame.play). """
+        distribution = self.initial.copy()
+        metrics = []
+        for _ in range(rounds):
+            metrics.append(dict(zip(METRICS, distribution @ self.metrics)))
+            distribution = self.T.T @ distribution
+        return metrics
+
+    def get_long_run_analysis(self):
+        """
+            Analiza el comportamiento a largo plazo desde las estrategias iniciales:
+                - closed_classes: clases cerradas (recurrentes) de la cadena, como listas de estados.
+                - absorption_probabilities: probabilidad de terminar en cada clase cerrada.
+                - expected_absorption_time: cantidad esperada de rondas hasta entrar en una clase cerrada.
+                - stationary_distribution: distribución límite (promedio en el tiempo) de los estados.
+                - metrics: métricas esperadas bajo esa distribución (media a largo plazo de cada ronda).
+        """
+        n_classes, labels = csgraph.connected_components(self.T, directed=True, connection="strong")
+        T = self.T.tocoo()
+        leaving = np.unique(labels[T.row[labels[T.row] != labels[T.col]]])
+        closed = [c for c in range(n_classes) if c not in set(leaving)]
+        recurrent = np.isin(labels, closed)
+        transient = np.flatnonzero(~recurrent)
+
+        # Visitas esperadas a los estados transitorios y probabilidad de entrar en cada estado recurrente.
+        entering = self.initial * recurrent
+        visits = np.zeros(0)
+        if len(transient) > 0:
+            Q = self.T[transient][:, transient]
+            identity = sparse.identity(len(transient), format="csc")
+            visits = np.atleast_1d(linalg.spsolve((identity - Q).T.tocsc(), self.initial[transient]))
+            entering = entering + (self.T[transient].T @ visits) * recurrent
+
+        # Distribución estacionaria de cada clase cerrada, ponderada por la probabilidad de absorción.
+        distribution = np.zeros(self.n_states)
+        classes, absorption = [], []
+        for c in closed:
+            states = np.flatnonzero(labels == c)
+            probability = entering[states].sum()
+            distribution[states] = probability * self._get_class_stationary_distribution(states)
+            classes.append(states.tolist())
+            absorption.append(float(probability))
+        return {"closed_classes": classes,
+                "absorption_probabilities": absorption,
+                "expected_absorption_time": float(visits.sum()),
+                "stationary_distribution": distribution,
+                "metrics": dict(zip(METRICS, distribution @ self.metrics))}
+
+    def get_hitting_times(self, targets):
+        """
+            Devuelve la cantidad esperada de rondas hasta llegar a alguno de los estados 'targets'
+                (índices o máscara) desde cada estado, e infinito si existe probabilidad de no llegar nunca.
+        """
+        target = np.zeros(self.n_states, dtype=bool)
+        target[targets] = True
+        adjacency = (self.T != 0).astype(float)
+
+        # Estados desde los que se puede no llegar nunca (no alcanzan los objetivos, o alcanzan esos estados).
+        never = ~self._get_reaching_states(adjacency, target, ~target)
+        never = self._get_reaching_states(adjacency, never, ~target) & ~target
+        times = np.full(self.n_states, np.inf)
+        times[target] = 0
+        states = np.flatnonzero(~target & ~never)
+        if len(states) > 0:
+            identity = sparse.identity(len(states), format="csc")
+            times[states] = linalg.spsolve((identity - self.T[states][:, states]).tocsc(), np.ones(len(states)))
+        return times
+
+    def get_state(self, s):
+        """ Devuelve el estado 's' como (caminos de la ronda anterior, caminos de las estrategias). """
+        return self.states[s]
+
+    def _build(self, initial_states):
+        """ Construye la cadena (estados alcanzables, matriz de transición y métricas esperadas de cada estado). """
+        self.states, self.state_idxs = [], {}
+        rows, cols, probs, metrics = [], [], [], []
+        pending = [self._get_state_idx(state) for state in initial_states]
+        self.initial = np.zeros(len(pending))
+        self.initial[pending] = 1 / len(pending)
+        s = 0
+        while s < len(self.states):
+            state_metrics, transitions = self._get_transitions(*self.states[s])
+            metrics.append(state_metrics)
+            for next_state, prob in transitions.items():
+                rows.append(s)
+                cols.append(self._get_state_idx(next_state))
+                probs.append(prob)
+            s += 1
+        self.n_states = len(self.states)
+        self.initial = np.pad(self.initial, (0, self.n_states - len(self.initial)))
+        self.T = sparse.csr_matrix((probs, (rows, cols)), shape=(self.n_states, self.n_states))
+        self.metrics = np.array(metrics)
+
+    def _get_state_idx(self, state):
+        """ Devuelve el índice del estado, agregándolo si es nuevo. """
+        if state not in self.state_idxs:
+            self.state_idxs[state] = len(self.states)
+            self.states.append(state)
+        return self.state_idxs[state]
+
+    def _get_transitions(self, old_paths, params):
+        """ Devuelve las métricas esperadas de la ronda que comienza en el estado y la distribución del estado siguiente. """
+        expected_metrics = np.zeros(len(METRICS))
+        transitions = {}
+        for prob, selected, penalties in self._get_selections(params):
+            round_metrics, options = self._play_round(old_paths, params, selected, penalties)
+            expected_metrics += prob * np.array(round_metrics)
+            for choice in itertools.product(*options):
+                next_params = tuple(q for q, _ in choice)
+                next_state = (selected, next_params)
+                transitions[next_state] = transitions.get(next_state, 0) + prob * np.prod([p for _, p in choice])
+        return expected_metrics, transitions
+
+    def _get_selections(self, params):
+        """ Devuelve la distribución de (probabilidad, caminos elegidos, penalizaciones) dadas las estrategias. """
+        if not self.quantum:
+            return [(1.0, params, (False,) * self.n_packets)]
+        if params not in self.outcomes:
+            for strategy, param in zip(self.strategies, params):
+                strategy.params = param
+            outcome_probs = np.asarray(self.probs_qnode(self.strategies))
+            n_paths = len(self.possible_paths)
+            n_qubits = self.protocol.n_qubits_per_packet
+            selections = {}
+            for outcome in np.flatnonzero(outcome_probs > self.MIN_OUTCOME_PROB):
+                # Caminos de cada paquete (uniformes con penalización si el resultado es inválido).
+                options = []
+                for bits in lu.group(math.int_to_bitlist(int(outcome), len(outcome_probs).bit_length() - 1), n_qubits):
+                    path_idx = math.bitlist_to_int(bits)
+                    options.append([(path_idx, False, 1)] if path_idx < n_paths else
+                                   [(q, True, 1 / n_paths) for q in range(n_paths)])
+                for choice in itertools.product(*options):
+                    key = (tuple(q for q, _, _ in choice), tuple(penalty for _, penalty, _ in choice))
+                    selections[key] = selections.get(key, 0) + outcome_probs[outcome] * np.prod([p for _, _, p in choice])
+            total = sum(selections.values())
+            self.outcomes[params] = [(prob / total, selected, penalties) for (selected, penalties), prob in selections.items()]
+        return self.outcomes[params]
+
+    def _play_round(self, old_paths, params, selected, penalties):
+        """
+            Juega una ronda con los caminos elegidos (ver RoutingGame._play_round) y devuelve sus métricas
+                y, por paquete, las opciones (camino, probabilidad) de su estrategia siguiente.
+        """
+        # C.2. Actualización del flujo de la red (que parte de los caminos anteriores) y latencia de paquetes (en orden).
+        flows = {edge: 0 for edge in self.latencies}
+        for old_path in old_paths:
+            for edge in self.path_edges[old_path] if old_path >= 0 else []:
+                flows[edge] += 1
+        packet_latencies = []
+        for old_path, new_path in zip(old_paths, selected):
+            if old_path >= 0:
+                for edge in self.path_edges[old_path]:
+                    flows[edge] -= 1
+            for edge in self.path_edges[new_path]:
+                flows[edge] += 1
+            packet_latencies.append(self._get_path_latency(new_path, flows))
+
+        # Latencia esperada y caminos de mínima latencia (ver Network).
+        total_latency = total_flow = 0
+        min_latency, min_latency_path_idxs = np.inf, []
+        for q in range(len(self.possible_paths)):
+            path_latency = self._get_path_latency(q, flows)
+            path_flow = min(flows[edge] for edge in self.path_edges[q])
+            total_latency += path_latency * path_flow
+            total_flow += path_flow
+            if path_latency <= min_latency:
+                min_latency_path_idxs.append(q)
+                min_latency = path_latency
+        expected_latency = total_latency / total_flow
+
+        # C.3. Actualización de estrategias (ver PureStrategy.update).
+        options = []
+        for param, latency, penalty in zip(params, packet_latencies, penalties):
+            payoff = RoutingProtocol.PENALTY_PAYOFF if penalty else np.sign(expected_latency - latency)
+            if payoff < 0:
+                options.append([(q, 1 / len(min_latency_path_idxs)) for q in min_latency_path_idxs])
+            else:
+                options.append([(param, 1)])
+
+        # C.4. Métricas.
+        total_cost = sum((a + b*flows[edge]) * flows[edge] for edge, (a, b) in self.latencies.items())
+        round_metrics = [total_cost, max(flows.values()), max(packet_latencies), expected_latency]
+        return round_metrics, options
+
+    def _get_path_latency(self, q, flows):
+        """ Latencia del camino 'q' con los flujos dados (ver Network.get_path_latency). """
+        return sum(self.latencies[edge][0] + self.latencies[edge][1] * flows[edge] for edge in self.path_edges[q])
+
+    def _get_class_stationary_distribution(self, states):
+        """ Distribución estacionaria de una clase cerrada (irreducible) de la cadena. """
+        if len(states) == 1:
+            return np.ones(1)
+        system = (self.T[states][:, states].T - sparse.identity(len(states))).tolil()
+        system[-1, :] = 1
+        rhs = np.zeros(len(states))
+        rhs[-1] = 1
+        return linalg.spsolve(system.tocsc(), rhs)
+
+    def _get_reaching_states(self, adjacency, sources, allowed):
+        """ Estados que alcanzan alguno de 'sources' pasando sólo por estados 'allowed' (recorrido hacia atrás). """
+        reached = sources.copy()
+        frontier = sources.copy()
+        while frontier.any():
+            frontier = (adjacency @ frontier > 0) & allowed & ~reached
+            reached |= frontier
+        return reached
@@ -12,10 +12,14 @@ class ClassicalRoutingProtocol(RoutingProtocol):
         Clase que modela los protocolos de enrutamiento clásicos.
     """
 
-    def init(self, N, packets, possible_paths):
+    def init(self, N, packets, possible_paths, seed = None):
         """ Inicializa las estrategias de los paquetes en base al generador de estrategias. """
+        self.add_packets(N, packets, possible_paths)
+
+    def add_packets(self, N, packets, possible_paths):
+        """ Inicializa las estrategias de los paquetes nuevos en base al generador de estrategias. """
         for packet in packets:
-            packet.strategy = self.strategy_provider(n_paths = len(possible_paths))
+            packet.strategy = self.strategy_provider(n_paths = len(possible_paths), rng = packet.rng)
 
     def select_paths(self, _, packets, possible_paths):
         """ 
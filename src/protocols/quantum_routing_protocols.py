@@ -4,13 +4,17 @@
 
 from .routing_protocols import RoutingProtocol
 
+from utils.lazy import lazy_import
 import utils.lists as lu
 import utils.math as math
 from utils.network import Packet
 import utils.quantum as qu
+import utils.rng as ru
 
-import numpy as np
-import pennylane as qml
+import copy
+import time
+
+qml = lazy_import("pennylane")
 
 
 class QuantumRoutingProtocol(RoutingProtocol):
@@ -18,6 +22,9 @@ class QuantumRoutingProtocol(RoutingProtocol):
         Clase que modela los protocolos de enrutamiento cuánticos.
     """
 
+    # Simuladores reutilizables entre juegos sin semilla, por cantidad de qubits (ver 'enable_device_cache').
+    device_cache = None
+
     def __init__(self, 
                  name = None,
                  strategy_provider = None,
@@ -27,7 +34,7 @@ class QuantumRoutingProtocol(RoutingProtocol):
         self.gamma = gamma
         self.has_disentanglement = has_disentanglement
 
-    def init(self, _, packets, possible_paths):
+    def init(self, N, packets, possible_paths, seed = None):
         """ 
             Inicializa el protocolo, esto inclute:
                 - inicializar el circuito cuántico del protocolo.
@@ -35,14 +42,87 @@ class QuantumRoutingProtocol(RoutingProtocol):
         """
         self.n_possible_paths = len(possible_paths)
         self.n_qubits_per_packet = math.ceil_log2(self.n_possible_paths)
-        self.qubits = range(len(packets) * self.n_qubits_per_packet)
-        self.dev = qml.device("default.qubit", wires=len(self.qubits), shots=1)
-        self.qnode = qml.QNode(self._circuit, self.dev)
+        self.seed = seed
+        self.circuits = {}
+        self.n_initial_packets = len(packets)
+        self._set_batch_size(len(packets))
+        self.add_packets(N, packets, possible_paths)
+
+    @classmethod
+    def enable_device_cache(cls):
+        """ 
+            Habilita la reutilización de los simuladores entre juegos (por ejemplo en un servicio persistente).
+                Sólo se reutilizan en juegos sin semilla, ya que los juegos con semilla requieren
+                un simulador con su propio generador aleatorio.
+        """
+        if cls.device_cache is None:
+            cls.device_cache = {}
+
+    def add_packets(self, N, packets, possible_paths):
+        """ Inicializa las estrategias de los paquetes nuevos en base al generador de estrategias. """
         for packet in packets:
-            packet.strategy = self.strategy_provider(n_paths = self.n_possible_paths, n_qubits = self.n_qubits_per_packet)
+            packet.strategy = self.strategy_provider(n_paths = self.n_possible_paths, n_qubits = self.n_qubits_per_packet, rng = packet.rng)
+
+    def _set_batch_size(self, n_packets):
+        """ 
+            Prepara el circuito para una ronda de 'n_packets' paquetes. Los simuladores de cada
+                tamaño se crean una única vez por juego (la población de un juego en streaming varía).
+        """
+        self.batch_size = n_packets
+        if n_packets == 0:
+            return
+        if n_packets not in self.circuits:
+            dev = self._get_device(n_packets)
+            self.circuits[n_packets] = (dev, qml.QNode(self._circuit, dev), qml.QNode(self._profiled_circuit, dev))
+        self.qubits = range(n_packets * self.n_qubits_per_packet)
+        self.dev, self.qnode, self.profiled_qnode = self.circuits[n_packets]
+
+    def get_state(self):
+        """ 
+            Retorna una copia del estado de los generadores aleatorios de los simuladores de cada
+                tamaño de circuito creado, junto con el tamaño actual y el inicial (que define sus semillas).
+        """
+        return {"batch_size": self.batch_size,
+                "n_initial_packets": self.n_initial_packets,
+                "devices": {n: copy.deepcopy(dev._rng.bit_generator.state) for n, (dev, _, _) in self.circuits.items()}}
+
+    def set_state(self, state):
+        """ 
+            Restaura el estado obtenido con 'get_state'. Los simuladores de tamaños que no existían en
+                el estado guardado se descartan (se recrean con su semilla original al usarse).
+        """
+        self.n_initial_packets = state["n_initial_packets"]
+        for n in [n for n in self.circuits if n not in state["devices"]]:
+            del self.circuits[n]
+        for n, device_state in state["devices"].items():
+            self._set_batch_size(n)
+            self.dev._rng.bit_generator.state = copy.deepcopy(device_state)
+        self._set_batch_size(state["batch_size"])
+
+    def _get_device(self, n_packets):
+        """ Obtiene el simulador para un circuito de 'n_packets' paquetes (de la caché si corresponde). """
+        wires = n_packets * self.n_qubits_per_packet
+        if self.seed is None and self.device_cache is not None:
+            if wires not in self.device_cache:
+                self.device_cache[wires] = qml.device("default.qubit", wires=wires, shots=1, seed=ru.circuit_seed(None))
+            return self.device_cache[wires]
+        circuit_seed = ru.circuit_seed(self.seed) if n_packets == self.n_initial_packets else ru.circuit_seed(self.seed, n_packets)
+        return qml.device("default.qubit", wires=wires, shots=1, seed=circuit_seed)
 
     def _circuit(self, strategies):
         """ Circuito cuántico del protocolo. """
+        self._apply_gates(strategies)
+
+        # Devuelve el resultado de 1 shot.
+        return qml.sample(wires=self.qubits)
+
+    def _probs_circuit(self, strategies):
+        """ Circuito cuántico del protocolo que devuelve la distribución exacta de sus resultados (ver src.markov_chains). """
+        self._apply_gates(strategies)
+        return qml.probs(wires=self.qubits)
+
+    def _apply_gates(self, strategies):
+        """ Aplica las puertas del circuito del protocolo. """
         
         # Puerta de entrelazamiento J.
         qu.J(self.gamma, self.qubits)
@@ -63,8 +143,12 @@ class QuantumRoutingProtocol(RoutingProtocol):
 
         qml.Barrier(wires = self.qubits)
 
-        # Devuelve el resultado de 1 shot.
-        return qml.sample(wires=self.qubits)
+    def _profiled_circuit(self, strategies):
+        """ Circuito cuántico del protocolo, midiendo el tiempo de su construcción. """
+        start = time.perf_counter()
+        result = self._circuit(strategies)
+        self._build_time += time.perf_counter() - start
+        return result
 
     def select_paths(self, _, packets, possible_paths):
         """ 
@@ -73,24 +157,50 @@ class QuantumRoutingProtocol(RoutingProtocol):
                 Asigna una penalización al paquete si no obtuvo un camino válido
                 tras la medición del circuito.
         """
-        output = self.qnode([packet.strategy for packet in packets])
+        self._set_batch_size(len(packets))
+        strategies = [packet.strategy for packet in packets]
+        if self.profiler:
+            return self._select_paths_profiled(packets, possible_paths, strategies)
+        output = self.qnode(strategies)
+        return self._decode_paths(packets, possible_paths, output)
+
+    def _select_paths_profiled(self, packets, possible_paths, strategies):
+        """ 
+            Selecciona los caminos como 'select_paths' midiendo por separado la construcción
+                del circuito, su ejecución y la decodificación del resultado.
+        """
+        profiler = self.profiler
+        self._build_time = 0
+        t = profiler.tic()
+        output = self.profiled_qnode(strategies)
+        t = profiler.toc("circuit_execution", t)
+        profiler.add("circuit_execution", -self._build_time)
+        profiler.add("circuit_build", self._build_time)
+        profiler.count("circuit_executions")
+        paths = self._decode_paths(packets, possible_paths, output)
+        profiler.toc("decode", t)
+        profiler.count("invalid_outcome_penalties", sum(packet.penalty for packet in packets))
+        return paths
+
+    def _decode_paths(self, packets, possible_paths, output):
+        """ Convierte el output del circuito en los caminos elegidos por cada paquete. """
         paths = []
         for packet, o in zip(packets, lu.group(output, self.n_qubits_per_packet)):
-            path_idx, penalty = self._circuit_output_to_path(o)
+            path_idx, penalty = self._circuit_output_to_path(o, packet.rng)
             paths.append(possible_paths[path_idx])
             packet.penalty = penalty
         return paths
 
-    def _circuit_output_to_path(self, output):
+    def _circuit_output_to_path(self, output, rng):
         """ 
             Convierte el output del circuito en un índice de camino 
                 Retorna una penalización al paquete si el índice de camino no es válido
-                y le asigna uno válido aleatoriamente.
+                y le asigna uno válido aleatoriamente (usando el generador 'rng').
         """
         path_idx = math.bitlist_to_int(output)
         penalty = False
         if path_idx >= self.n_possible_paths:
-            path_idx = np.random.choice(range(self.n_possible_paths))
+            path_idx = rng.integers(self.n_possible_paths)
             penalty = True
         return (path_idx, penalty)
 
@@ -14,13 +14,32 @@ class RoutingProtocol:
     def __init__(self, name=None, strategy_provider=None):
         self.name = name
         self.strategy_provider = strategy_provider
+        self.profiler = None
 
     def get_name(self):
         """ Devuelve el nombre del protocolo. """
         return self.name
 
-    def init(self, N, packets, possible_paths):
-        """ [Abstracto] Inicializa el protocolo. """
+    def init(self, N, packets, possible_paths, seed = None):
+        """ 
+            [Abstracto] Inicializa el protocolo. 
+                seed: semilla de los números aleatorios propios del protocolo (None para usar el generador global).
+        """
+        pass
+
+    def add_packets(self, N, packets, possible_paths):
+        """ 
+            [Abstracto] Incorpora paquetes nuevos a un juego ya inicializado (juegos en streaming),
+                inicializando sus estrategias.
+        """
+        pass
+
+    def get_state(self):
+        """ Retorna una copia del estado aleatorio propio del protocolo (None si no tiene). """
+        return None
+
+    def set_state(self, state):
+        """ Restaura el estado obtenido con 'get_state'. """
         pass
 
     def select_paths(self, N, packets, possible_paths):
@@ -2,10 +2,14 @@
 # Estrategias utilizadas por los protocolos de enrutamiento. #
 ##############################################################
 
+from utils.lazy import lazy_import
 import utils.math as math
+import utils.rng as ru
 
+import copy
 import numpy as np
-import pennylane as qml
+
+qml = lazy_import("pennylane")
 
 
 class Strategy:
@@ -23,6 +27,14 @@ class Strategy:
         """ Retorna los parámetros de la estrategia. """
         return self.params
 
+    def get_state(self):
+        """ Retorna una copia del estado de la estrategia (sin su generador aleatorio). """
+        return {k: copy.deepcopy(v) for k, v in vars(self).items() if k != "rng"}
+
+    def set_state(self, state):
+        """ Restaura el estado obtenido con 'get_state' (copiándolo, para poder reutilizarlo). """
+        self.__dict__.update(copy.deepcopy(state))
+
     def get_classical_pure_strategy(self):
         """ 
             Obtiene la estrategia clásica pura (índice de camino elegido) en
@@ -49,9 +61,10 @@ class Strategy:
 
 class PureStrategy(Strategy):
 
-    def __init__(self, n_qubits, n_paths):
+    def __init__(self, n_qubits, n_paths, rng = None):
         self.n_qubits = n_qubits
-        self.params = np.random.choice(range(n_paths))
+        self.rng = rng if rng is not None else ru.BlockRandom()
+        self.params = self.rng.integers(n_paths)
 
     def update(self, N, _, payoff):
         """ 
@@ -64,7 +77,8 @@ class PureStrategy(Strategy):
 
     def _get_min_latency_path_idx(self, N):
         """ Obtiene alguno de los caminos de mínima latencia de la red. """
-        return np.random.choice(N.get_min_latency_path_idxs())
+        min_latency_path_idxs = N.get_min_latency_path_idxs()
+        return min_latency_path_idxs[self.rng.integers(len(min_latency_path_idxs))]
 
     def get_classical_pure_strategy(self):
         """ Función trivial, esta estrategia ya es una estrategia pura. """
@@ -82,10 +96,11 @@ class PureStrategy(Strategy):
 class MixedStrategy(Strategy):
     """ Clase que modela las estrategias mixtas. """
 
-    def __init__(self, alpha, n_qubits, n_paths):
+    def __init__(self, alpha, n_qubits, n_paths, rng = None):
         self.alpha = alpha
         self.n_qubits = n_qubits
-        self.params = np.random.dirichlet(np.ones(n_paths))
+        self.rng = rng if rng is not None else ru.BlockRandom()
+        self.params = self.rng.dirichlet(np.ones(n_paths))
 
     def update(self, _, selected_path_idx, payoff):
         """ 
@@ -111,7 +126,7 @@ class MixedStrategy(Strategy):
             Devuelve una estrategia clásica pura obtenida como muestra de la 
                 distribución de probabilidad de la estrategia mixta.
         """
-        return np.random.choice(range(len(self.params)), p=self.params)
+        return self.rng.categorical(self.params)
 
     def apply_to_quantum_circuit(self, base_qubit):
         """ 
@@ -119,17 +134,18 @@ class MixedStrategy(Strategy):
                 de la estrategia mixta y la aplica como operaciones I y X en el circuito
                 del protocolo.
         """
-        selected_path_idx = np.random.choice(range(len(self.params)), p = self.params)
+        selected_path_idx = self.rng.categorical(self.params)
         self._apply_quantum_int_codification(base_qubit, selected_path_idx)
 
 
 class RotationsBasedStrategy(Strategy):
     """ Clase que modela las estrategias basadas en rotaciones de qubits. """
 
-    def __init__(self, alpha, sigma, n_qubits, n_params_per_qubit):
+    def __init__(self, alpha, sigma, n_qubits, n_params_per_qubit, rng = None):
         self.alpha = alpha
         self.sigma = sigma
-        self.params = [[np.random.uniform(0, 2 * np.pi) for _ in range(n_params_per_qubit)] for _ in range(n_qubits)]
+        self.rng = rng if rng is not None else ru.BlockRandom()
+        self.params = [[self.rng.uniform(0, 2 * np.pi) for _ in range(n_params_per_qubit)] for _ in range(n_qubits)]
         self.perturbations = [[self._sample_perturbation() for _ in range(n_params_per_qubit)] for _ in range(n_qubits)]
 
     def update(self, _, __, payoff):
@@ -155,7 +171,7 @@ class RotationsBasedStrategy(Strategy):
     
     def _sample_perturbation(self):
         """ Obtiene una perturbación aleatoria basada en la distribución normal. """
-        return np.random.normal(0, self.sigma)
+        return self.rng.normal(0, self.sigma)
 
     def apply_to_quantum_circuit(self, base_qubit):
         """ 
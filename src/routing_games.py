@@ -2,64 +2,323 @@
 # Clases principales de los juegos de enrutamiento. #
 #####################################################
 
+from utils.lazy import lazy_import
 import utils.metric as mu
 from utils.network import Packet
+import utils.rng as ru
 
-import cvxpy as cp
+import copy
+import itertools
 import numpy as np
 
+cp = lazy_import("cvxpy")
+optimize = lazy_import("scipy.optimize")
+
 
 class RoutingGame:
     """ 
         Clase que modela el juego de enrutamiento.
     """
 
-    def __init__(self, N, packets_to_send, rounds=1, protocol=None):
+    def __init__(self, N, packets_to_send, rounds=1, protocol=None, seed=None, profiler=None, path_policy=None, engine=None):
         self.N = N
+        if path_policy is not None:
+            self.N.set_path_policy(path_policy)
+        self.paths_cached = len(self.N.possible_paths) > 0
         self.possible_paths = self.N.get_all_possible_paths()
         self.packets = [Packet() for _ in range(packets_to_send)]
         self.rounds = rounds
         self.protocol = protocol
+        self.seed = seed
+        self.profiler = profiler
+        self.engine = engine
 
     def play(self):
         """ 
             Ejecuta el juego de enrutamiento con los parámetros del constructor.
+                Si el juego tiene un motor (ver src.engines), éste ejecuta todas las rondas.
+        """
+        if self.engine is not None:
+            return self.engine.play(self)
+        self.start()
+        metrics = self.play_rounds(self.rounds)
+        if self.profiler:
+            self.profiler.end_game()
+
+        # D. Retorno de la red actualizada y las métricas.
+        return self.N, metrics
+
+    def start(self):
+        """ 
+            Inicializa el juego (red, generadores aleatorios y protocolo) sin jugar rondas.
+                Junto con 'play_rounds' permite jugar el juego por partes (ver 'snapshot').
         """
         
-        # A. Reinicialización de la red.
+        # A. Reinicialización de la red (y de las mediciones si corresponde).
         self.N.reset_flow()
+        self.protocol.profiler = self.profiler
+        if self.profiler:
+            self._start_profiling()
+
+        # B. Inicialización de los generadores aleatorios de los paquetes y del protocolo.
+        self.game_seed = ru.game_seed(self.seed)
+        for packet, rng in zip(self.packets, ru.packet_generators(self.game_seed, len(self.packets))):
+            packet.rng = rng
+        self.protocol.init(self.N, self.packets, self.possible_paths, self.seed)
+        self.round = 0
 
-        # B. Inicialización del protocolo.
-        self.protocol.init(self.N, self.packets, self.possible_paths)
+    def play_rounds(self, rounds):
+        """ 
+            Juega 'rounds' rondas a partir del estado actual del juego.
+                Retorna las métricas de cada ronda jugada.
+        """
         
         # C. Ejecución de las rondas (actualización de red y métricas).
         metrics = []
-        for _ in range(self.rounds):
+        for _ in range(rounds):
             round_metrics = self._play_round()
             metrics.append(round_metrics)
+        return metrics
 
-        # D. Retorno de la red actualizada y las métricas.
-        return self.N, metrics
+    def snapshot(self):
+        """ 
+            Guarda el estado completo del juego en la ronda actual: flujos de la red, caminos,
+                latencias y estrategias de los paquetes, y estado de los generadores aleatorios.
+                El snapshot no se modifica al seguir jugando, por lo que puede restaurarse
+                (ver 'restore' y 'fork') tantas veces como se quiera.
+        """
+        return GameSnapshot(self)
+
+    def restore(self, snapshot):
+        """ Vuelve el juego al estado guardado en 'snapshot' (de este juego o de uno idéntico). """
+        snapshot.apply(self)
+
+    def fork(self, snapshot = None):
+        """ 
+            Crea una continuación independiente del juego a partir de 'snapshot' (por defecto, del
+                estado actual), con su propia copia de la red, paquetes y protocolo.
+                Las continuaciones no comparten generadores aleatorios, salvo los simuladores de la
+                caché de QuantumRoutingProtocol (ver 'enable_device_cache') en juegos sin semilla.
+        """
+        snapshot = snapshot if snapshot is not None else self.snapshot()
+        N = self.N.copy()
+        N.possible_paths = self.possible_paths
+        N.path_policy = self.N.path_policy
+        game = copy.copy(self)
+        game.N = N
+        game.packets = [Packet() for _ in self.packets]
+        game.protocol = copy.copy(self.protocol)
+        game.profiler = None
+        game.start()
+        game.restore(snapshot)
+        return game
 
     def _play_round(self):
         """ 
             Ejecuta una ronda del juego de enrutamiento.
+                Si el juego tiene un profiler, mide el tiempo de cada fase.
         """
-        
+        profiler = self.profiler
+        if profiler:
+            t = profiler.tic()
+
         # C.1. Cálculo de caminos efectivamente elegidos.
         selected_paths = self.protocol.select_paths(self.N, self.packets, self.possible_paths)
+        if profiler:
+            t = profiler.toc("path_selection", t)
 
         # C.2. Actualización del flujo de la red y latencia de paquetes.
         for packet, selected_path in zip(self.packets, selected_paths):
             self.N.move_flow_unit(packet.path, selected_path)
             packet.path = selected_path
             packet.latency = self.N.get_path_latency(selected_path)
+        if profiler:
+            t = profiler.toc("flow_update", t)
 
         # C.3. Actualización de estrategias.
         self.protocol.update_strategies(self.N, self.packets, self.possible_paths)
+        if profiler:
+            t = profiler.toc("strategy_update", t)
 
         # C.4. Cálculo de métricas.
-        return mu.calculate_protocol_execution_metrics(self.N, self.packets)
+        round_metrics = mu.calculate_protocol_execution_metrics(self.N, self.packets)
+        if profiler:
+            profiler.toc("metrics", t)
+        self.round += 1
+        return round_metrics
+
+    def _start_profiling(self):
+        """ Inicia las mediciones del juego. """
+        self.profiler.start_game()
+        self.profiler.count("path_cache_hits" if self.paths_cached else "path_cache_misses")
+        self.paths_cached = True
+
+
+class StreamingRoutingGame(RoutingGame):
+    """ 
+        Clase que modela un juego de enrutamiento en línea, donde los paquetes llegan y salen de la red
+            de acuerdo a un proceso de llegadas (ver src.arrival_processes). Sólo se mantienen en memoria
+            los paquetes activos: los objetos Packet de los que salen se reutilizan para las llegadas.
+            max_packets: si se indica, limita la población activa (las llegadas excedentes se descartan).
+    """
+
+    def __init__(self, N, arrival_process, rounds=1, protocol=None, seed=None, profiler=None, path_policy=None, max_packets=None):
+        super().__init__(N, 0, rounds, protocol, seed, profiler, path_policy)
+        self.arrival_process = arrival_process
+        self.max_packets = max_packets
+
+    def start(self):
+        """ Inicializa el juego con la red vacía (sin paquetes activos). """
+        super().start()
+        self.arrivals_rng = ru.arrivals_generator(self.game_seed)
+        self.departure_rounds = []
+        self.free_packets = []
+        self.n_arrived = 0
+
+    def play_stream(self):
+        """ 
+            Generador que juega rondas indefinidamente y devuelve las métricas de cada una.
+                La memoria y el costo por ronda dependen sólo de la población activa.
+        """
+        while True:
+            yield self._play_streaming_round()
+
+    def play_rounds(self, rounds):
+        """ Juega 'rounds' rondas del juego en streaming y retorna las métricas de cada una. """
+        return list(itertools.islice(self.play_stream(), rounds))
+
+    def snapshot(self):
+        """ 
+            Guarda el estado completo del juego en la ronda actual (ver RoutingGame.snapshot), incluyendo
+                los paquetes activos, sus rondas de salida y el generador del proceso de llegadas.
+        """
+        return StreamingGameSnapshot(self)
+
+    def _play_streaming_round(self):
+        """ 
+            Ejecuta una ronda del juego en streaming: salidas de los paquetes cuya permanencia
+                terminó, llegadas de paquetes nuevos y la ronda del juego con los paquetes activos.
+        """
+        departures = self._remove_departed_packets()
+        arrivals, dropped = self._add_arrived_packets()
+        if len(self.packets) > 0:
+            round_metrics = self._play_round()
+        else:
+            round_metrics = mu.calculate_protocol_execution_metrics(self.N)
+            self.round += 1
+        round_metrics.update({"active_packets": len(self.packets), "arrivals": arrivals,
+                              "departures": departures, "dropped": dropped})
+        return round_metrics
+
+    def _remove_departed_packets(self):
+        """ Quita de la red los paquetes cuya permanencia terminó y libera sus objetos. """
+        packets = []
+        departure_rounds = []
+        departures = 0
+        for packet, departure_round in zip(self.packets, self.departure_rounds):
+            if departure_round > self.round:
+                packets.append(packet)
+                departure_rounds.append(departure_round)
+                continue
+            if packet.path is not None:
+                self.N.update_path_flow(packet.path, -1)
+            self.free_packets.append(packet)
+            departures += 1
+        self.packets = packets
+        self.departure_rounds = departure_rounds
+        return departures
+
+    def _add_arrived_packets(self):
+        """ Incorpora los paquetes que llegan en la ronda (reutilizando paquetes liberados). """
+        arrivals = self.arrival_process.get_arrivals(self.round, self.arrivals_rng)
+        accepted = arrivals if self.max_packets is None else min(arrivals, self.max_packets - len(self.packets))
+        new_packets = []
+        for _ in range(accepted):
+            packet = self.free_packets.pop() if len(self.free_packets) > 0 else Packet()
+            packet.latency = 0
+            packet.path = None
+            packet.penalty = False
+            packet.rng = ru.packet_generator(self.game_seed, self.n_arrived)
+            self.n_arrived += 1
+            new_packets.append(packet)
+            self.departure_rounds.append(self.round + max(1, self.arrival_process.get_lifetime(self.arrivals_rng)))
+        self.protocol.add_packets(self.N, new_packets, self.possible_paths)
+        self.packets += new_packets
+        return arrivals, arrivals - accepted
+
+
+class GameSnapshot:
+    """ 
+        Clase que almacena el estado de un juego de enrutamiento en una ronda (ver RoutingGame.snapshot).
+            Los flujos, caminos y latencias se guardan como arreglos de solo lectura compartidos por
+            todas las continuaciones; las estrategias y generadores aleatorios se copian al restaurar.
+    """
+
+    def __init__(self, game):
+        self.game_seed = game.game_seed
+        self.round = game.round
+        self.flows = _read_only([d["flow"] for _, _, d in game.N.edges(data = True)])
+        self.path_idxs = _read_only([-1 if p.path is None else game.possible_paths.index(p.path) for p in game.packets], int)
+        self.latencies = _read_only([p.latency for p in game.packets])
+        self.penalties = _read_only([p.penalty for p in game.packets], bool)
+        self.strategies = [p.strategy.get_state() for p in game.packets]
+        self.packet_rng_states = [p.rng.get_state() for p in game.packets]
+        self.protocol_state = game.protocol.get_state()
+
+    def apply(self, game):
+        """ Restaura el estado guardado en el juego 'game'. """
+        game.game_seed = self.game_seed
+        game.round = self.round
+        for (_, _, d), flow in zip(game.N.edges(data = True), self.flows):
+            d["flow"] = flow.item()
+        for i, packet in enumerate(game.packets):
+            path_idx = self.path_idxs[i]
+            packet.path = None if path_idx < 0 else game.possible_paths[path_idx]
+            packet.latency = self.latencies[i].item()
+            packet.penalty = bool(self.penalties[i])
+            packet.strategy.set_state(self.strategies[i])
+            packet.rng.set_state(self.packet_rng_states[i])
+        game.protocol.set_state(self.protocol_state)
+
+
+class StreamingGameSnapshot(GameSnapshot):
+    """ 
+        Clase que almacena el estado de un juego en streaming (ver StreamingRoutingGame.snapshot).
+            Además del estado de GameSnapshot guarda las rondas de salida de los paquetes activos, la
+            cantidad de llegadas y el estado del generador del proceso de llegadas. Al restaurar se
+            ajusta la población activa (reutilizando los paquetes liberados del juego).
+    """
+
+    def __init__(self, game):
+        super().__init__(game)
+        self.departure_rounds = tuple(game.departure_rounds)
+        self.n_arrived = game.n_arrived
+        self.arrivals_rng_state = copy.deepcopy(game.arrivals_rng.bit_generator.state)
+
+    def apply(self, game):
+        """ Restaura el estado guardado en el juego en streaming 'game'. """
+        # La semilla del juego define los generadores de las llegadas siguientes (ver _add_arrived_packets).
+        game.game_seed = self.game_seed
+        packets = game.packets + game.free_packets
+        new_packets = [Packet() for _ in range(len(self.path_idxs) - len(packets))]
+        for p, packet in enumerate(new_packets):
+            # Generador y estrategia provisorios: se reemplazan por los del estado guardado.
+            packet.rng = ru.packet_generator(game.game_seed, p)
+        game.protocol.add_packets(game.N, new_packets, game.possible_paths)
+        packets += new_packets
+        game.packets = packets[:len(self.path_idxs)]
+        game.free_packets = packets[len(self.path_idxs):]
+        super().apply(game)
+        game.departure_rounds = list(self.departure_rounds)
+        game.n_arrived = self.n_arrived
+        game.arrivals_rng.bit_generator.state = copy.deepcopy(self.arrivals_rng_state)
+
+
+def _read_only(values, dtype = None):
+    """ Convierte los valores en un arreglo de solo lectura. """
+    array = np.array(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
 
 
 class OptimalFlowRoutingGame(RoutingGame):
@@ -67,6 +326,9 @@ class OptimalFlowRoutingGame(RoutingGame):
         Clase que modela un juego de enrutamiento que calcula manualmente el flujo óptimo.
     """
 
+    # Indica si los flujos de los caminos deben ser enteros.
+    integer = True
+
     def play(self):
         """ 
             Ejecuta el algoritmo de optimización que permite calcular el flujo óptimo.
@@ -76,7 +338,7 @@ class OptimalFlowRoutingGame(RoutingGame):
         self.N.reset_flow()
         
         # B. Definir las variables a minimizar y sus constraints.
-        path_vars = [cp.Variable(integer=True) for _ in self.possible_paths]
+        path_vars = [cp.Variable(integer=self.integer) for _ in self.possible_paths]
         constraints = [cp.sum(path_vars) == len(self.packets)]
         for var in path_vars:
             constraints.append(var >= 0)
@@ -91,16 +353,178 @@ class OptimalFlowRoutingGame(RoutingGame):
                         edge_flow += path_vars[i]
                         break
             a,b = d['latency']
-            total_cost_expr += (a * edge_flow + b * edge_flow**2)
+            total_cost_expr += self._get_edge_objective(a, b, edge_flow)
         problem = cp.Problem(cp.Minimize(total_cost_expr), constraints)
-        problem.solve(solver=cp.ECOS_BB)
+        problem.solve(solver=cp.ECOS_BB if self.integer else cp.ECOS)
     
         # D. Actualizar red con el flujo óptimo.
+        self.path_flows = []
         for i, path in enumerate(self.possible_paths):
-            path_flow = np.round(path_vars[i].value)
+            path_flow = np.round(path_vars[i].value) if self.integer else max(path_vars[i].value, 0)
+            self.path_flows.append(path_flow)
             for j in range(len(path)-1):
                 self.N[path[j]][path[j+1]]["flow"] += path_flow
 
         # E. Retorno de la red actualizada y las métricas.
         metrics = mu.calculate_protocol_execution_metrics(self.N)
         return self.N, metrics
+
+    def _get_edge_objective(self, a, b, edge_flow):
+        """ Término de la arista en la función a minimizar: su costo (a + b*f) * f. """
+        return a * edge_flow + b * edge_flow**2
+
+
+class EquilibriumFlowRoutingGame(OptimalFlowRoutingGame):
+    """ 
+        Clase que modela un juego de enrutamiento que calcula directamente el flujo de equilibrio
+            (Wardrop/Nash) minimizando la función potencial del juego, en lugar de simularlo.
+            - Entero: potencial de Rosenthal sum_e sum_{k=1}^{f_e} (a + b*k), cuyo mínimo es un
+              equilibrio de Nash puro del juego atómico.
+            - Continuo: potencial de Beckmann sum_e integral_0^{f_e} (a + b*x) dx, cuyo mínimo es
+              el equilibrio de Wardrop.
+    """
+
+    def __init__(self, N, packets_to_send, integer=True, path_policy=None):
+        super().__init__(N, packets_to_send, path_policy=path_policy)
+        self.integer = integer
+
+    def _get_edge_objective(self, a, b, edge_flow):
+        """ Término de la arista en la función potencial (Rosenthal o Beckmann). """
+        if self.integer:
+            return a * edge_flow + b * (edge_flow**2 + edge_flow) / 2
+        return a * edge_flow + b * edge_flow**2 / 2
+
+
+class OptimalFlowRangeRoutingGame(RoutingGame):
+    """ 
+        Clase que modela un juego que calcula los flujos óptimos enteros para 1, 2, ..., 'max_packets'
+            paquetes en una sola pasada incremental, en lugar de resolver un problema por cada cantidad.
+            - Cada paquete nuevo se agrega por el camino de menor costo marginal.
+            - Luego se repara la solución moviendo paquetes de a uno entre caminos mientras el costo baje.
+            - Cada solución se certifica con una cota inferior del óptimo: la relajación lineal del problema
+              con el costo de cada arista interpolado linealmente entre flujos enteros (coincide con el costo
+              en las soluciones enteras y, con todos los caminos de una red acíclica, es exacta). Si las
+              latencias son enteras el costo también lo es, y basta con no superar la cota redondeada hacia arriba.
+            Con 'exact' las soluciones no certificadas se resuelven con OptimalFlowRoutingGame, y la pasada
+            continúa desde la solución exacta.
+    """
+
+    # Tolerancia numérica de las comparaciones de costos.
+    TOLERANCE = 1e-7
+
+    def __init__(self, N, max_packets, path_policy=None, exact=False):
+        super().__init__(N, max_packets, path_policy=path_policy)
+        self.max_packets = max_packets
+        self.exact = exact
+
+    def play(self):
+        """ 
+            Calcula los flujos óptimos para cada cantidad de paquetes.
+                Retorna la red con el flujo óptimo de 'max_packets' paquetes y la lista de métricas de cada
+                cantidad (las de n paquetes en la posición n-1). Los flujos de los caminos quedan en
+                'path_flows' y los certificados (cota inferior, si se certificó y si se usó el solver exacto)
+                en 'certificates'.
+        """
+
+        # A. Matriz de incidencia arista-camino y términos de las latencias.
+        edges = list(self.N.edges())
+        edge_idxs = {edge: e for e, edge in enumerate(edges)}
+        self.A = np.zeros((len(edges), len(self.possible_paths)))
+        for i, path in enumerate(self.possible_paths):
+            for j in range(len(path)-1):
+                self.A[edge_idxs[(path[j], path[j+1])], i] = 1
+        self.a = np.array([self.N[u][v]["latency"][0] for u, v in edges], dtype=float)
+        self.b = np.array([self.N[u][v]["latency"][1] for u, v in edges], dtype=float)
+        self.integral = np.all(self.a == np.round(self.a)) and np.all(self.b == np.round(self.b))
+        # Ahorro de los tramos compartidos al mover un paquete entre dos caminos.
+        self.shared = self.A.T @ (2 * self.b[:, None] * self.A)
+
+        # B. Pasada incremental.
+        x = np.zeros(len(self.possible_paths), dtype=int)
+        self.path_flows, self.certificates, metrics = [], [], []
+        for n in range(1, self.max_packets + 1):
+            # B.1. Agregado del paquete por el camino de menor costo marginal y reparación.
+            f = self.A @ x
+            x[np.argmin(self.A.T @ (self.a + self.b * (2*f + 1)))] += 1
+            self._repair(x)
+
+            # B.2. Certificación (y solución exacta si corresponde).
+            lower_bound = self._get_lower_bound(n)
+            certified = self._is_certified(self._get_cost(x), lower_bound)
+            exact = False
+            if not certified and self.exact:
+                exact_x = self._get_exact_path_flows(n)
+                if self._get_cost(exact_x) < self._get_cost(x) - self.TOLERANCE:
+                    x = exact_x
+                certified = exact = True
+
+            # B.3. Flujo y métricas de la red.
+            self._set_network_flow(x)
+            self.path_flows.append(x.copy())
+            self.certificates.append({"lower_bound": float(lower_bound), "certified": bool(certified), "exact": exact})
+            metrics.append(mu.calculate_protocol_execution_metrics(self.N))
+
+        # C. Retorno de la red y las métricas de cada cantidad de paquetes.
+        return self.N, metrics
+
+    def _repair(self, x):
+        """ 
+            Mueve paquetes de a uno (el movimiento que más reduce el costo) hasta que ningún
+                movimiento entre dos caminos reduzca el costo.
+        """
+        while True:
+            f = self.A @ x
+            add = self.A.T @ (self.a + self.b * (2*f + 1))
+            remove = self.A.T @ (self.a + self.b * (2*f - 1))
+            delta = add[None, :] - remove[:, None] - self.shared
+            delta[x == 0, :] = np.inf
+            source, target = np.unravel_index(np.argmin(delta), delta.shape)
+            if delta[source, target] >= -self.TOLERANCE:
+                return
+            x[source] -= 1
+            x[target] += 1
+
+    def _get_lower_bound(self, n):
+        """ 
+            Resuelve la relajación lineal con 'n' paquetes. Las variables son los flujos de los caminos
+                y, por arista, n tramos unitarios de flujo con costo marginal a + b*(2k+1) (crecientes,
+                por lo que se llenan en orden).
+        """
+        n_edges, n_paths = self.A.shape
+        k = np.arange(n)
+        costs = np.concatenate([np.zeros(n_paths), (self.a[:, None] + self.b[:, None] * (2*k + 1)).ravel()])
+        A_eq = np.zeros((n_edges + 1, n_paths + n_edges * n))
+        A_eq[:n_edges, :n_paths] = self.A
+        for e in range(n_edges):
+            A_eq[e, n_paths + e*n : n_paths + (e+1)*n] = -1
+        A_eq[n_edges, :n_paths] = 1
+        b_eq = np.zeros(n_edges + 1)
+        b_eq[n_edges] = n
+        bounds = [(0, None)] * n_paths + [(0, 1)] * (n_edges * n)
+        result = optimize.linprog(costs, A_eq=A_eq, b_eq=b_eq, bounds=bounds, method="highs")
+        return result.fun if result.status == 0 else -np.inf
+
+    def _is_certified(self, cost, lower_bound):
+        """ Indica si la cota inferior prueba que el costo entero es óptimo. """
+        if self.integral:
+            return cost <= np.ceil(lower_bound - self.TOLERANCE) + self.TOLERANCE
+        return cost - lower_bound <= self.TOLERANCE * max(1, cost)
+
+    def _get_exact_path_flows(self, n):
+        """ Resuelve el problema con 'n' paquetes con OptimalFlowRoutingGame y devuelve los flujos de los caminos. """
+        N = self.N.copy()
+        N.possible_paths = self.possible_paths
+        N.path_policy = self.N.path_policy
+        game = OptimalFlowRoutingGame(N, n)
+        game.play()
+        return np.array(game.path_flows, dtype=int)
+
+    def _get_cost(self, x):
+        """ Costo total de la red con flujos de caminos 'x'. """
+        f = self.A @ x
+        return (self.a + self.b * f) @ f
+
+    def _set_network_flow(self, x):
+        """ Asigna a la red los flujos de aristas correspondientes a los flujos de caminos 'x'. """
+        for (u, v), flow in zip(self.N.edges(), self.A @ x):
+            self.N[u][v]["flow"] = int(flow)
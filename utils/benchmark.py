@@ -0,0 +1,297 @@
+##########################################################################
+# Suite de benchmarks de performance de los juegos (ejecutable por CLI). #
+##########################################################################
+#
+# Uso:
+#   python -m utils.benchmark --output results.json
+#   python -m utils.benchmark --save-baseline baseline.json
+#   python -m utils.benchmark --baseline baseline.json --threshold 0.25
+#   python -m utils.benchmark --only "qubits/CM|opt/" --repeat 3 --quick
+#   python -m utils.benchmark --check-imports --import-budget 1.0
+
+import src.game_builder as gb
+
+from . import tests as test
+from .network import NetworkGenerator
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+import numpy as np
+
+
+#----------------- Constantes ---------------------------------
+
+
+# Semilla utilizada para generar las redes de los benchmarks.
+BENCHMARK_SEED = 1234
+
+# Protocolos a medir (nombre, constructor).
+PROTOCOLS = [("CP", gb.cp), ("CM", gb.cm), ("MWP", gb.mwp), ("MWM", gb.mwm), ("EWL", gb.ewl)]
+
+# Tamaños de las curvas de escalado (completo, rápido).
+SIZES = {
+    "qubits": ([2, 4, 8, 12], [2, 4]),
+    "packets": ([2, 8, 32, 128], [2, 8]),
+    "paths": ([2, 4, 8, 16], [2, 4]),
+    "rounds": ([10, 50, 200], [10, 50]),
+    "opt": ([2, 8, 16], [2, 8]),
+    "enumeration": ([10, 20, 40], [10, 20]),
+}
+
+# Rondas utilizadas por defecto en las curvas que no escalan en rondas.
+BASE_ROUNDS = 20
+
+# Módulos pesados que no deben importarse al ejecutar juegos clásicos.
+HEAVY_MODULES = ["pennylane", "cvxpy", "matplotlib", "scipy"]
+
+# Script que importa y ejecuta un juego clásico, reportando el tiempo de importación y los módulos cargados.
+CLASSICAL_IMPORT_SCRIPT = """
+import json, sys, time
+start_time = time.perf_counter()
+import src.game_builder as gb
+import utils.tests
+from utils.network import NetworkGenerator
+import_seconds = time.perf_counter() - start_time
+gb.game(NetworkGenerator().generate_random_with_paths(3), 4, 5, gb.cm()).play()
+gb.game(NetworkGenerator().generate_random_with_paths(3), 4, 5, gb.cp()).play()
+print(json.dumps({"import_seconds": import_seconds,
+                  "loaded": [m for m in %r if m in sys.modules]}))
+""" % HEAVY_MODULES
+
+
+#----------------- Definición de benchmarks -----------------------
+
+
+class Benchmark:
+    """
+        Clase que modela un benchmark: un punto (x) de una curva de escalado (group/label).
+            setup: función que prepara los datos y no se mide.
+            run: función que recibe el resultado de setup y se mide.
+    """
+
+    def __init__(self, group, label, x, setup, run):
+        self.group = group
+        self.label = label
+        self.x = x
+        self.setup = setup
+        self.run = run
+
+    def get_name(self):
+        """ Devuelve el nombre único del benchmark. """
+        return f"{self.group}/{self.label}/{self.x}"
+
+
+def get_benchmarks(quick = False):
+    """ Obtiene la lista completa de benchmarks. """
+    size_idx = 1 if quick else 0
+    benchmarks = []
+
+    # Escalado de cada protocolo en qubits (n paquetes, 2 caminos => n qubits), paquetes, caminos y rondas.
+    for label, provider in PROTOCOLS:
+        quantum = label not in ["CP", "CM"]
+        for n in SIZES["qubits"][size_idx]:
+            benchmarks.append(_game_benchmark("qubits", label, n, provider, n, 2, BASE_ROUNDS))
+        if not quantum:
+            for n in SIZES["packets"][size_idx]:
+                benchmarks.append(_game_benchmark("packets", label, n, provider, n, 4, BASE_ROUNDS))
+        for m in SIZES["paths"][size_idx]:
+            benchmarks.append(_game_benchmark("paths", label, m, provider, 2, m, BASE_ROUNDS))
+        for r in SIZES["rounds"][size_idx]:
+            benchmarks.append(_game_benchmark("rounds", label, r, provider, 4, 4, r))
+
+    # Tiempo de resolución del flujo óptimo.
+    for n in SIZES["opt"][size_idx]:
+        benchmarks.append(Benchmark("opt", "ECOS_BB", n,
+                                    lambda n=n: _seeded(lambda: (NetworkGenerator().generate_random_with_paths(4), n)),
+                                    lambda args: gb.opt(args[0], args[1]).play()))
+
+    # Enumeración de caminos posibles.
+    for n_nodes in SIZES["enumeration"][size_idx]:
+        benchmarks.append(Benchmark("enumeration", "all_simple_paths", n_nodes,
+                                    lambda n_nodes=n_nodes: _seeded(lambda: NetworkGenerator().generate_random(n_nodes)),
+                                    _enumerate_paths))
+
+    # Throughput de un barrido completo (juegos clásicos y cuánticos sobre varios casos).
+    benchmarks.append(Benchmark("sweep", "regular", 4,
+                                lambda: _seeded(lambda: [test.get_specific_test_case(n, m) for n, m in [(2, 2), (3, 4), (4, 3), (2, 8)]]),
+                                lambda test_cases: [test.execute_regular_test(BASE_ROUNDS, tc, [p() for _, p in PROTOCOLS]) for tc in test_cases]))
+    return benchmarks
+
+
+#----------------- Ejecución -------------------------------------
+
+
+def run_benchmarks(benchmarks, repeat = 5, warmup = 1):
+    """
+        Ejecuta los benchmarks 'repeat' veces (más 'warmup' ejecuciones descartadas).
+            Retorna un diccionario {nombre: resultado} serializable en JSON.
+    """
+    results = {}
+    for benchmark in benchmarks:
+        name = benchmark.get_name()
+        result = {"group": benchmark.group, "label": benchmark.label, "x": benchmark.x}
+        try:
+            args = benchmark.setup()
+            for _ in range(warmup):
+                benchmark.run(args)
+            times = []
+            for _ in range(repeat):
+                start_time = time.perf_counter()
+                benchmark.run(args)
+                times.append(time.perf_counter() - start_time)
+            result.update(_get_time_stats(times))
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        results[name] = result
+        print(_format_result(name, result), file=sys.stderr)
+    return results
+
+def check_import_budget(budget):
+    """
+        Verifica que el camino clásico (importar los juegos y jugar CP/CM) sea liviano:
+            se ejecuta en un proceso nuevo y falla si la importación tarda más de 'budget'
+            segundos o si se cargó alguno de los HEAVY_MODULES.
+            Retorna el resultado de la verificación y la lista de errores.
+    """
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", CLASSICAL_IMPORT_SCRIPT], cwd=repo_root,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    errors = []
+    if result["import_seconds"] > budget:
+        errors.append(f"importación de {result['import_seconds']:.3f}s supera el presupuesto de {budget}s")
+    for module in result["loaded"]:
+        errors.append(f"el camino clásico importó '{module}'")
+    return result, errors
+
+def compare_to_baseline(results, baseline, threshold):
+    """
+        Compara la mediana de cada benchmark con la del baseline.
+            Retorna la lista de regresiones (benchmarks cuya mediana superó al
+            baseline en más de un factor 'threshold', o que fallaron).
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline or "median" not in baseline[name]:
+            continue
+        if "error" in result:
+            regressions.append({"name": name, "error": result["error"]})
+            continue
+        ratio = result["median"] / baseline[name]["median"]
+        if ratio > 1 + threshold:
+            regressions.append({"name": name, "ratio": ratio,
+                                "median": result["median"], "baseline_median": baseline[name]["median"]})
+    return regressions
+
+
+#----------------- CLI -------------------------------------------
+
+
+def main(argv = None):
+    """ Punto de entrada de la línea de comandos. """
+    parser = argparse.ArgumentParser(description="Suite de benchmarks de los juegos de enrutamiento.")
+    parser.add_argument("--output", help="archivo JSON donde guardar los resultados (por defecto stdout)")
+    parser.add_argument("--only", help="expresión regular para filtrar benchmarks por nombre")
+    parser.add_argument("--repeat", type=int, default=5, help="cantidad de ejecuciones medidas por benchmark")
+    parser.add_argument("--warmup", type=int, default=1, help="cantidad de ejecuciones de calentamiento")
+    parser.add_argument("--quick", action="store_true", help="usa tamaños reducidos")
+    parser.add_argument("--baseline", help="archivo JSON de baseline contra el cual comparar")
+    parser.add_argument("--threshold", type=float, default=0.25, help="regresión relativa máxima tolerada")
+    parser.add_argument("--save-baseline", help="guarda los resultados como nuevo baseline")
+    parser.add_argument("--check-imports", action="store_true", help="sólo verifica el presupuesto de importación del camino clásico")
+    parser.add_argument("--import-budget", type=float, default=1.0, help="tiempo máximo de importación del camino clásico (segundos)")
+    args = parser.parse_args(argv)
+
+    if args.check_imports:
+        result, errors = check_import_budget(args.import_budget)
+        _write_json({"imports": result, "errors": errors}, args.output)
+        for error in errors:
+            print("ERROR:", error, file=sys.stderr)
+        return 1 if errors else 0
+
+    benchmarks = get_benchmarks(args.quick)
+    if args.only:
+        benchmarks = [b for b in benchmarks if re.search(args.only, b.get_name())]
+    results = run_benchmarks(benchmarks, args.repeat, args.warmup)
+
+    report = {"meta": _get_meta(args), "results": results}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        report["regressions"] = compare_to_baseline(results, baseline, args.threshold)
+
+    _write_json(report, args.output)
+    if args.save_baseline:
+        _write_json(report, args.save_baseline)
+
+    if report.get("regressions"):
+        for regression in report["regressions"]:
+            print("REGRESIÓN:", regression, file=sys.stderr)
+        return 1
+    # Un benchmark que falló hace fallar la ejecución aunque no haya baseline con qué compararlo.
+    if any("error" in result for result in results.values()):
+        return 1
+    return 0
+
+
+#----------------- Auxiliares -------------------------
+
+
+def _game_benchmark(group, label, x, provider, n, m, rounds):
+    """ Construye un benchmark de un juego de n paquetes y m caminos. """
+    return Benchmark(group, label, x,
+                     lambda: _seeded(lambda: NetworkGenerator().generate_random_with_paths(m)),
+                     lambda N: gb.game(N, n, rounds, provider()).play())
+
+def _enumerate_paths(N):
+    """ Enumera los caminos posibles de la red descartando los ya calculados. """
+    N.possible_paths = []
+    return N.get_all_possible_paths()
+
+def _seeded(f):
+    """ Ejecuta 'f' con los generadores aleatorios globales inicializados con BENCHMARK_SEED. """
+    np.random.seed(BENCHMARK_SEED)
+    random.seed(BENCHMARK_SEED)
+    return f()
+
+def _get_time_stats(times):
+    """ Obtiene las estadísticas de los tiempos medidos. """
+    return {"times": times,
+            "min": float(np.min(times)),
+            "median": float(np.median(times)),
+            "mean": float(np.mean(times)),
+            "std": float(np.std(times))}
+
+def _get_meta(args):
+    """ Obtiene la información de contexto de la ejecución. """
+    return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "quick": args.quick}
+
+def _format_result(name, result):
+    """ Formatea el resultado de un benchmark para mostrar el progreso. """
+    if "error" in result:
+        return f"{name}: ERROR {result['error']}"
+    return f"{name}: mediana {result['median']:.4f}s (min {result['min']:.4f}s)"
+
+def _write_json(report, path):
+    """ Escribe el reporte en 'path' (o stdout si es None). """
+    if path is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
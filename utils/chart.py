@@ -2,13 +2,23 @@
 # Utilidades para generar los gráficos de los experimentos. #
 #############################################################
 
-from matplotlib.colors import BoundaryNorm, ListedColormap
-from matplotlib.patches import Patch
-import matplotlib.pyplot as plt
+from .lazy import lazy_import
+from .results import ResultsTensor
+
+import multiprocessing as mp
 import numpy as np
 
+mpl = lazy_import("matplotlib")
+mcolors = lazy_import("matplotlib.colors")
+mfigure = lazy_import("matplotlib.figure")
+mpatches = lazy_import("matplotlib.patches")
+plt = lazy_import("matplotlib.pyplot")
+
+
+#----------------- Gráficos ---------------------------------
 
-def series(x, ys, labels, titles, window = 1, optimal = None, show_mins = False, figsize = (12, 4)):   
+
+def series(x, ys, labels, titles, window = 1, optimal = None, show_mins = False, figsize = (12, 4), max_points = None, output = None):   
     """ 
         Muestra N series de tiempo (x, ys) en el mismo gráfico.
             labels y titles: son las etiquetas de cada serie y del gráfico en general.
@@ -16,66 +26,76 @@ def series(x, ys, labels, titles, window = 1, optimal = None, show_mins = False,
             optimal: muestra una línea punteada con el valor óptimo si existe.
             show_mins: muestra el punto mínimo de cada serie.
             figsize: el tamaño de la figura.
+            max_points: si se indica, cada serie se reduce a esa cantidad de puntos (LTTB) antes de graficar.
+            output: si se indica, guarda la figura en ese archivo sin usar un backend interactivo.
     """
     # Tamaño de figura
-    plt.figure(figsize=figsize)
+    fig = _new_figure(figsize, output)
+    ax = fig.add_subplot()
 
     # Plot de las series.
+    x = np.asarray(x)
     for i in range(len(ys)):
-        y = ys[i]
+        y = np.asarray(ys[i], dtype=float)
         if (window > 1):
-            yy = np.convolve(y, np.ones(window)/window, mode='same')
             plot_x = x[window:-window]
-            plot_y = yy[window:-window]
+            plot_y = moving_average(y, window)[window:-window]
         else:
             plot_x = x
             plot_y = y
-        plt.plot(plot_x, plot_y, label=labels[i])
 
-        # Plot de los mínimos
+        # Cálculo de los mínimos (sobre la serie completa, antes de reducirla).
         if show_mins:
             min_idx = np.argmin(plot_y)
-            plt.scatter(plot_x[min_idx], plot_y[min_idx], 
-                        facecolors='none', edgecolors='black', s=80, linewidths=2,
-                        zorder=5)
-            plt.annotate(titles[0] + "=" + str(round(plot_x[min_idx], 2)), (plot_x[min_idx], plot_y[min_idx]), 
-                         xytext=(7, 7), textcoords='offset points')
+            min_x, min_y = plot_x[min_idx], plot_y[min_idx]
+
+        if max_points is not None:
+            plot_x, plot_y = lttb(plot_x, plot_y, max_points)
+        ax.plot(plot_x, plot_y, label=labels[i])
+
+        # Plot de los mínimos
+        if show_mins:
+            ax.scatter(min_x, min_y, 
+                       facecolors='none', edgecolors='black', s=80, linewidths=2,
+                       zorder=5)
+            ax.annotate(titles[0] + "=" + str(round(min_x, 2)), (min_x, min_y), 
+                        xytext=(7, 7), textcoords='offset points')
 
     # Plot del óptimo
     if (optimal is not None):
-        plt.axhline(y=optimal, linestyle='--', color='gray', label='Óptimo') 
+        ax.axhline(y=optimal, linestyle='--', color='gray', label='Óptimo') 
 
     # Plot de labels/títulos.
-    plt.xlabel(titles[0])
-    plt.ylabel(titles[1])
-    plt.legend()
+    ax.set_xlabel(titles[0])
+    ax.set_ylabel(titles[1])
+    ax.legend()
     
-    plt.show()
+    _show_figure(fig, output)
 
-def heatmap(matrix, metric, labels, titles):
+def heatmap(matrix, metric, labels, titles, output = None):
     """ 
         Muestra un mapa de calor con los valores de la mariz matrix.
+            matrix: un ResultsTensor con ejes protocol, n, m y metric (y opcionalmente replicate y round),
+                o la matriz anidada [n][m][protocolo] devuelta por execute_matrix_test.
             metric: la métrica particular de matrix a usar para mostrar el mapa de calor.
             labels y titles: son las etiquetas de cada serie y del gráfico en general.
+            output: si se indica, guarda la figura en ese archivo sin usar un backend interactivo.
     """
-    # Cálculo de la información del mapa de calor.
-    n_rows = len(matrix)
-    n_cols = max([len(row) for row in matrix])
-    heatmap_data = np.full((n_rows, n_cols), np.nan)
+    # Cálculo de la información del mapa de calor (protocolo ganador de cada celda n x m).
+    if not isinstance(matrix, ResultsTensor):
+        matrix = ResultsTensor.from_nested(matrix, ("n", "m", "protocol"),
+                                           {"n": range(2, len(matrix)+2), "m": range(2, max([len(row) for row in matrix])+2)})
+    winners = matrix.collapse("protocol", "n", "m", "metric").winner(metric).transpose("n", "m")
+    heatmap_data = winners.data
+    n_rows, n_cols = heatmap_data.shape
 
     # Generación de colores del mapa de color.
-    fig, ax = plt.subplots()
-    base_cmap = plt.get_cmap("tab10")
+    fig = _new_figure(None, output)
+    ax = fig.add_subplot()
+    base_cmap = mpl.colormaps["tab10"]
     colors = base_cmap.colors[:len(labels)] 
-    cmap = ListedColormap(colors)
-    norm = BoundaryNorm(range(len(labels)+1), cmap.N)
-
-    # Cálculo de colores.
-    for n in range(n_rows):
-        for m in range(len(matrix[n])):
-            cell_metrics = matrix[n][m]
-            min_idx = np.argmin([cm[metric] for cm in cell_metrics])
-            heatmap_data[n][m] = min_idx
+    cmap = mcolors.ListedColormap(colors)
+    norm = mcolors.BoundaryNorm(range(len(labels)+1), cmap.N)
 
     # Plot de los colores del mapa de calor.
     im = ax.imshow(heatmap_data, cmap=cmap, norm=norm)
@@ -84,36 +104,40 @@ def heatmap(matrix, metric, labels, titles):
     # Definición de los tamaños y posicionamiento de la matriz.
     ax.set_xticks(range(n_cols))
     ax.set_yticks(range(n_rows))
-    ax.set_xticklabels(range(2, n_cols+2))
-    ax.set_yticklabels(range(2, n_rows+2))
+    ax.set_xticklabels(winners.labels["m"])
+    ax.set_yticklabels(winners.labels["n"])
     ax.invert_yaxis()
 
     # Plot de labels/títulos.
-    plt.xlabel(titles[0])
-    plt.ylabel(titles[1])
-    plt.title(titles[2])
+    ax.set_xlabel(titles[0])
+    ax.set_ylabel(titles[1])
+    ax.set_title(titles[2])
 
     # Plot de leyenda de colores.
-    legend_handles = [Patch(facecolor=colors[i], label=labels[i]) for i in range(len(labels))]
+    legend_handles = [mpatches.Patch(facecolor=colors[i], label=labels[i]) for i in range(len(labels))]
     ax.legend(handles=legend_handles, bbox_to_anchor=(1.05, 1), loc="upper left")
     
-    plt.show()
+    _show_figure(fig, output)
 
 
-def pie(execution_metrics, metric, labels, title):
+def pie(execution_metrics, metric, labels, title, output = None):
     """ 
         Muestra un gráfico de torta con las execution_metrics separadas por cada protocolo.
+            execution_metrics: un ResultsTensor con ejes protocol y metric (y cualquier otro eje de casos),
+                o la lista [caso][protocolo] devuelta por execute_combinations_test.
             metric: la métrica particular de matrix a usar para mostrar el mapa de calor.
             labels y title: son las etiquetas de cada conjunto y del gráfico en general.
+            output: si se indica, guarda la figura en ese archivo sin usar un backend interactivo.
     """
-    # Cálculo de valores.
-    results = [0] * len(labels)
-    for test_metrics in execution_metrics:
-        min_idx = np.argmin([m[metric] for m in test_metrics])
-        results[min_idx] += 1
+    # Cálculo de valores (cantidad de casos ganados por cada protocolo).
+    if not isinstance(execution_metrics, ResultsTensor):
+        execution_metrics = ResultsTensor.from_nested(execution_metrics, ("case", "protocol"))
+    results = execution_metrics.win_counts(metric)
 
     # Plot del gráfico.
-    plt.pie(
+    fig = _new_figure(None, output)
+    ax = fig.add_subplot()
+    ax.pie(
         results, 
         labels=labels,         # labels on slices
         autopct="%1.1f%%",     # show percentages
@@ -121,8 +145,8 @@ def pie(execution_metrics, metric, labels, title):
     )
 
     # Seteo de título y presentación.
-    plt.title(title)
-    plt.show()
+    ax.set_title(title)
+    _show_figure(fig, output)
 
 def plot_3d():
     # Define function q(n,p)
@@ -148,4 +172,93 @@ def plot_3d():
     ax.set_zlabel("q(C)")
     ax.set_title(r"$q(C) = n \cdot \lceil \log_2 |\mathcal{P}| \rceil$")
 
-    plt.show()
\ No newline at end of file
+    plt.show()
+
+
+#----------------- Exportación ---------------------------------
+
+
+def export_figures(jobs, workers = None):
+    """ 
+        Genera en paralelo las figuras de un barrido directamente a archivos (sin backend interactivo).
+            jobs: lista de tuplas (función, args, kwargs), donde la función es un gráfico de este
+                módulo (series, heatmap, pie) y kwargs incluye 'output'.
+            workers: cantidad de procesos (por defecto, uno por CPU). Con 1 se generan en serie.
+            Retorna la lista de archivos generados.
+    """
+    if workers == 1:
+        return [_render_job(job) for job in jobs]
+    with mp.Pool(workers) as pool:
+        return pool.map(_render_job, jobs)
+
+
+#----------------- Reducción de series ---------------------------------
+
+
+def moving_average(y, window):
+    """ 
+        Media móvil de 'y' (equivalente a np.convolve(y, np.ones(window)/window, mode='same'))
+            calculada en O(n) con sumas acumuladas, independientemente del tamaño de la ventana.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    cumsum = np.concatenate(([0.0], np.cumsum(y)))
+    ends = np.arange(n) + (window - 1) // 2 + 1
+    starts = ends - window
+    return (cumsum[np.clip(ends, 0, n)] - cumsum[np.clip(starts, 0, n)]) / window
+
+def lttb(x, y, n_out):
+    """ 
+        Reduce la serie (x, y) a 'n_out' puntos con Largest-Triangle-Three-Buckets,
+            que conserva la forma visual (picos y valles) de la serie.
+            Siempre conserva el primer y el último punto.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    # Límites de los baldes intermedios (el primero y el último punto son fijos).
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    idxs = np.empty(n_out, dtype=int)
+    idxs[0], idxs[-1] = 0, n - 1
+    xf = x.astype(float)
+
+    # Por cada balde se elige el punto que forma el triángulo de mayor área con el punto
+    # elegido anteriormente y el promedio del balde siguiente.
+    for b in range(n_out - 2):
+        start, end = edges[b], edges[b + 1]
+        next_start, next_end = edges[b + 1], edges[b + 2] if b + 2 < len(edges) else n
+        avg_x = xf[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        ax, ay = xf[idxs[b]], y[idxs[b]]
+        areas = np.abs((ax - avg_x) * (y[start:end] - ay) - (ax - xf[start:end]) * (avg_y - ay))
+        idxs[b + 1] = start + np.argmax(areas)
+    return x[idxs], y[idxs]
+
+
+#----------------- Auxiliares -------------------------
+
+
+def _new_figure(figsize, output):
+    """ 
+        Crea la figura: con pyplot si se va a mostrar, o una figura independiente
+            (backend Agg, sin pyplot) si se va a guardar en 'output'.
+    """
+    if output is None:
+        return plt.figure(figsize=figsize)
+    return mfigure.Figure(figsize=figsize)
+
+def _show_figure(fig, output):
+    """ Muestra la figura o la guarda en 'output'. """
+    if output is None:
+        plt.show()
+    else:
+        fig.savefig(output, bbox_inches="tight")
+
+def _render_job(job):
+    """ Genera una figura de export_figures. """
+    f, args, kwargs = job
+    f(*args, **kwargs)
+    return kwargs["output"]
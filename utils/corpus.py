@@ -0,0 +1,286 @@
+###################################################################
+# Corpus binario de casos de prueba con carga por memory mapping. #
+###################################################################
+#
+# Formato del archivo:
+#   - 8 bytes: MAGIC.
+#   - 8 bytes: largo del encabezado (uint64, little endian).
+#   - Encabezado JSON: cantidad de casos, nombres de las métricas óptimas y,
+#     para cada arreglo, su dtype, shape y offset dentro del archivo.
+#   - Arreglos planos alineados a ALIGNMENT bytes:
+#       case_n, case_m:          paquetes y caminos de cada caso.
+#       case_node_ptr, nodes:    nodos de cada caso (en el orden de la red).
+#       case_edge_ptr, edges:    aristas (u, v) de cada caso (en el orden de la red).
+#       latency:                 coeficientes (a, b) de la latencia de cada arista.
+#       case_path_ptr:           primer camino de cada caso.
+#       path_ptr, path_edges:    incidencia camino x arista en CSR (índices locales
+#                                de aristas del caso, en el orden del camino).
+#       opt:                     métricas del flujo óptimo de cada caso.
+#
+# Construcción en paralelo de un corpus de matriz n x m (reanudable):
+#   python -m utils.corpus corpus.bin --tests-per-size 10 --seed 1 --workers 8
+
+from .network import Network
+from . import rng as ru
+from . import tests as test
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import struct
+import sys
+import time
+import numpy as np
+
+
+#----------------- Constantes ---------------------------------
+
+
+MAGIC = b"QRGCORP1"
+ALIGNMENT = 64
+
+# Corpus abiertos por el proceso actual (ver open_corpus).
+_OPEN_CORPORA = {}
+
+
+#----------------- Escritura ---------------------------------
+
+
+def save_corpus(path, test_cases):
+    """
+        Guarda los casos de prueba (N, n, m, opt) en un único archivo binario.
+            test_cases: lista de casos de prueba (por ejemplo, de utils.tests.get_test_cases).
+    """
+    metric_names = sorted({name for (_, _, _, opt) in test_cases for name in opt})
+    arrays = _pack(test_cases, metric_names)
+
+    # Cálculo de offsets de cada arreglo.
+    header = {"n_cases": len(test_cases), "metrics": metric_names, "arrays": {}}
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _align(offset + array.nbytes)
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header_bytes))
+
+    # Escritura de encabezado y arreglos (en un archivo nuevo, sin alterar los corpus ya abiertos
+    # de la misma ruta, que se mapean en memoria).
+    with open(path + ".tmp", "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + header["arrays"][name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(path + ".tmp", path)
+    for key in [key for key in _OPEN_CORPORA if key[0] == os.path.abspath(path)]:
+        del _OPEN_CORPORA[key]
+
+def _pack(test_cases, metric_names):
+    """ Convierte los casos de prueba en arreglos planos. """
+    case_n, case_m, nodes, edges, latency, opt = [], [], [], [], [], []
+    case_node_ptr, case_edge_ptr, case_path_ptr, path_ptr, path_edges = [0], [0], [0], [0], []
+    for (N, n, m, optimal) in test_cases:
+        case_n.append(n)
+        case_m.append(m)
+        nodes.extend(N.nodes())
+        case_node_ptr.append(len(nodes))
+        edge_idx = {}
+        for u, v, d in N.edges(data = True):
+            edge_idx[(u, v)] = len(edge_idx)
+            edges.append((u, v))
+            latency.append(d["latency"])
+        case_edge_ptr.append(len(edges))
+        for path in N.get_all_possible_paths():
+            path_edges.extend(edge_idx[(path[i], path[i+1])] for i in range(len(path)-1))
+            path_ptr.append(len(path_edges))
+        case_path_ptr.append(len(path_ptr) - 1)
+        opt.append([optimal.get(name, np.nan) for name in metric_names])
+    return {"case_n": np.array(case_n, dtype=np.int64),
+            "case_m": np.array(case_m, dtype=np.int64),
+            "case_node_ptr": np.array(case_node_ptr, dtype=np.int64),
+            "nodes": np.array(nodes, dtype=np.int64),
+            "case_edge_ptr": np.array(case_edge_ptr, dtype=np.int64),
+            "edges": np.array(edges, dtype=np.int64).reshape(-1, 2),
+            "latency": np.array(latency).reshape(-1, 2),
+            "case_path_ptr": np.array(case_path_ptr, dtype=np.int64),
+            "path_ptr": np.array(path_ptr, dtype=np.int64),
+            "path_edges": np.array(path_edges, dtype=np.int64),
+            "opt": np.array(opt, dtype=np.float64).reshape(len(test_cases), len(metric_names))}
+
+
+#----------------- Lectura ---------------------------------
+
+
+class Corpus:
+    """
+        Clase que permite leer un corpus de casos de prueba sin copiarlo en memoria.
+            El archivo se abre con memory mapping, por lo que varios procesos que abren
+            el mismo corpus comparten sus páginas. Los casos se reconstruyen por índice.
+            Al serializarse (por ejemplo, al enviarse a un worker) sólo se envía la ruta.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self.buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"El archivo {path} no es un corpus de casos de prueba.")
+        header_length = struct.unpack("<Q", bytes(self.buffer[len(MAGIC):len(MAGIC)+8]))[0]
+        header_end = len(MAGIC) + 8 + header_length
+        self.header = json.loads(bytes(self.buffer[len(MAGIC)+8:header_end]).decode("utf-8"))
+        data_start = _align(header_end)
+        self.metrics = self.header["metrics"]
+        self.arrays = {}
+        for name, info in self.header["arrays"].items():
+            dtype = np.dtype(info["dtype"])
+            start = data_start + info["offset"]
+            n_bytes = int(np.prod(info["shape"])) * dtype.itemsize
+            self.arrays[name] = self.buffer[start:start+n_bytes].view(dtype).reshape(info["shape"])
+
+    def __len__(self):
+        return self.header["n_cases"]
+
+    def __getitem__(self, i):
+        """ Reconstruye el caso de prueba 'i' como (N, n, m, opt). """
+        return (self.get_network(i), int(self.arrays["case_n"][i]), int(self.arrays["case_m"][i]), self.get_optimal(i))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __reduce__(self):
+        return (open_corpus, (self.path,))
+
+    def get_network(self, i):
+        """ Reconstruye la red del caso 'i' (con sus caminos posibles ya calculados). """
+        a = self.arrays
+        edges = a["edges"][a["case_edge_ptr"][i]:a["case_edge_ptr"][i+1]].tolist()
+        latencies = a["latency"][a["case_edge_ptr"][i]:a["case_edge_ptr"][i+1]].tolist()
+        N = Network()
+        N.add_nodes_from(a["nodes"][a["case_node_ptr"][i]:a["case_node_ptr"][i+1]].tolist())
+        N.add_edges_from((u, v, {"latency": tuple(l)}) for (u, v), l in zip(edges, latencies))
+        indptr, indices = self.get_incidence(i)
+        N.possible_paths = [[edges[indices[indptr[p]]][0]] + [edges[e][1] for e in indices[indptr[p]:indptr[p+1]]]
+                            for p in range(len(indptr) - 1)]
+        return N
+
+    def get_incidence(self, i):
+        """
+            Devuelve la incidencia camino x arista del caso 'i' en formato CSR (indptr, indices).
+                Los índices de aristas son locales al caso y se leen del archivo sin copiarse.
+        """
+        a = self.arrays
+        first, last = a["case_path_ptr"][i], a["case_path_ptr"][i+1]
+        indptr = a["path_ptr"][first:last+1]
+        return indptr - indptr[0], a["path_edges"][indptr[0]:indptr[-1]]
+
+    def get_optimal(self, i):
+        """ Devuelve las métricas del flujo óptimo del caso 'i'. """
+        return {name: value for name, value in zip(self.metrics, self.arrays["opt"][i].astype(np.float64)) if not np.isnan(value)}
+
+    def get_matrix_test_cases(self):
+        """ Agrupa los casos por n y m con la misma estructura que utils.tests.get_matrix_test_cases. """
+        case_n, case_m = self.arrays["case_n"], self.arrays["case_m"]
+        test_cases = []
+        for n in np.unique(case_n):
+            test_cases_n = []
+            for m in np.unique(case_m[case_n == n]):
+                test_cases_n.append([self[i] for i in np.flatnonzero((case_n == n) & (case_m == m))])
+            test_cases.append(test_cases_n)
+        return test_cases
+
+
+#----------------- Construcción en paralelo ---------------------------------
+
+
+def build_matrix_corpus(path, n_tests_per_size, seed, workers = 1, progress = True):
+    """
+        Construye en paralelo el corpus de la matriz de casos de prueba (ver utils.tests.get_matrix_test_cases).
+            Cada celda (n, m) se genera y resuelve en un worker con su propia semilla derivada de 'seed',
+            por lo que el resultado no depende de la cantidad de workers ni del orden de ejecución.
+            Cada celda terminada se guarda en el directorio '<path>.parts'; si la construcción se
+            interrumpe, al volver a ejecutarla sólo se generan las celdas faltantes.
+            Al final se unen todas las celdas en el corpus 'path'.
+    """
+    parts_dir = path + ".parts"
+    os.makedirs(parts_dir, exist_ok=True)
+    cells = [(n, m) for n in range(2, test.QUBITS_LIMIT+1) for m in range(2, test.QUBITS_LIMIT+1) if test._valid_game_size(n, m)]
+    pending = [(parts_dir, n, m, n_tests_per_size, seed) for (n, m) in cells if not os.path.exists(_part_path(parts_dir, n, m))]
+
+    # Generación de las celdas faltantes.
+    start_time = time.perf_counter()
+    done = len(cells) - len(pending)
+    with mp.Pool(workers) as pool:
+        for n, m in pool.imap_unordered(_build_cell, pending):
+            done += 1
+            if progress:
+                print(f"[{done}/{len(cells)}] n={n} m={m} ({time.perf_counter() - start_time:.1f}s)", file=sys.stderr)
+
+    # Unión de las celdas en el orden de la matriz.
+    test_cases = [tc for (n, m) in cells for tc in Corpus(_part_path(parts_dir, n, m))]
+    save_corpus(path, test_cases)
+    return open_corpus(path)
+
+def _build_cell(args):
+    """ Genera y resuelve los casos de prueba de una celda (n, m) y los guarda en su archivo parcial. """
+    parts_dir, n, m, n_tests_per_size, seed = args
+    cell_seed = ru.seed_sequence(seed, n, m).generate_state(1)[0]
+    np.random.seed(cell_seed)
+    random.seed(int(cell_seed))
+    test_cases = [test.get_specific_test_case(n, m) for _ in range(n_tests_per_size)]
+    save_corpus(_part_path(parts_dir, n, m), test_cases)
+    return n, m
+
+def _part_path(parts_dir, n, m):
+    """ Ruta del archivo parcial de la celda (n, m). """
+    return os.path.join(parts_dir, f"cell_{n}_{m}.bin")
+
+
+#----------------- Apertura ---------------------------------
+
+
+def open_corpus(path):
+    """ 
+        Abre el corpus 'path', reutilizando el ya abierto por este proceso si existe. Los corpus se
+            identifican por su ruta absoluta, fecha de modificación y tamaño, por lo que un archivo
+            reescrito se vuelve a abrir.
+    """
+    key = _get_corpus_key(path)
+    if key not in _OPEN_CORPORA:
+        _OPEN_CORPORA[key] = Corpus(path)
+    return _OPEN_CORPORA[key]
+
+
+#----------------- Auxiliares -------------------------
+
+
+def _get_corpus_key(path):
+    """ Clave de un corpus abierto (ver 'open_corpus'). """
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+def _align(offset):
+    """ Redondea 'offset' hacia arriba al múltiplo de ALIGNMENT más cercano. """
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+#----------------- CLI ---------------------------------
+
+
+def main(argv = None):
+    """ Punto de entrada de la línea de comandos: construye un corpus de matriz n x m. """
+    parser = argparse.ArgumentParser(description="Construye en paralelo un corpus de casos de prueba n x m.")
+    parser.add_argument("path", help="archivo del corpus a generar")
+    parser.add_argument("--tests-per-size", type=int, default=10, help="casos de prueba por cada celda (n, m)")
+    parser.add_argument("--seed", type=int, default=0, help="semilla de la que se derivan las semillas de cada celda")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="cantidad de procesos en paralelo")
+    args = parser.parse_args(argv)
+    corpus = build_matrix_corpus(args.path, args.tests_per_size, args.seed, args.workers)
+    print(f"{len(corpus)} casos en {args.path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
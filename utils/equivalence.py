@@ -0,0 +1,298 @@
+##############################################################################################
+# Validación de motores rápidos contra la implementación de referencia (ejecutable por CLI). #
+##############################################################################################
+#
+# Uso:
+#   python -m utils.equivalence --output report.json
+#   python -m utils.equivalence --only "numba/" --rounds 200 --quick
+#   python -m utils.equivalence --corpus corpus.qrg --mode distribution --replicates 50
+#
+# Cada candidato registrado (ver 'register') se ejecuta junto a su referencia sobre los mismos casos:
+#   exact:        mismas semillas; las métricas de cada ronda (y los caminos finales de los paquetes)
+#                 deben coincidir exactamente (o con la tolerancia del candidato).
+#   distribution: semillas independientes; por caso, test KS de cada métrica de la última ronda y
+#                 test chi-cuadrado de los caminos elegidos, con corrección de Bonferroni.
+# El reporte indica si cada candidato pasó y la aceleración medida (tiempo de referencia / candidato).
+
+import src.game_builder as gb
+from src.engines.classical_engine import NumbaClassicalEngine
+
+from .corpus import open_corpus
+from .lazy import lazy_import
+from . import rng as ru
+from . import tests as test
+
+import argparse
+import json
+import platform
+import random
+import re
+import sys
+import time
+import numpy as np
+
+stats = lazy_import("scipy.stats")
+
+
+#----------------- Constantes ---------------------------------
+
+
+# Semilla utilizada para generar los casos y los juegos de la validación.
+EQUIVALENCE_SEED = 1234
+
+# Tamaños (n, m) de los casos de prueba (completo, rápido).
+SIZES = ([(2, 2), (4, 3), (8, 4), (16, 6), (32, 8)], [(2, 2), (4, 3), (8, 4)])
+
+# Nivel de significación de cada candidato en el modo distribution (se reparte entre sus tests).
+ALPHA = 0.01
+
+# Candidatos registrados {nombre: Candidate}.
+CANDIDATES = {}
+
+
+#----------------- Registro de candidatos -----------------------
+
+
+class Candidate:
+    """
+        Clase que modela un motor rápido a validar contra su implementación de referencia.
+            reference, candidate: funciones (test_case, seed) -> (métricas de cada ronda, índices de los
+                caminos finales de los paquetes o None) de la referencia y del motor rápido.
+            exact: si es True la dinámica es determinista dada la semilla y se valida por igualdad
+                (modo exact); si no, por distribución (modo distribution).
+            metrics: métricas a comparar (por defecto todas las de la referencia).
+            tolerance: tolerancia relativa de las comparaciones del modo exact (0 exige igualdad).
+    """
+
+    def __init__(self, name, reference, candidate, exact = True, metrics = None, tolerance = 0.0):
+        self.name = name
+        self.reference = reference
+        self.candidate = candidate
+        self.exact = exact
+        self.metrics = metrics
+        self.tolerance = tolerance
+
+
+def register(candidate):
+    """ Registra un candidato (reemplaza al registrado con el mismo nombre). """
+    CANDIDATES[candidate.name] = candidate
+    return candidate
+
+def game_runner(protocol_provider, rounds, engine = None):
+    """ Función que ejecuta un juego de 'rounds' rondas con el protocolo y motor indicados (ver Candidate). """
+    def run(test_case, seed):
+        N, n, _, _ = test_case
+        game = gb.game(_copy_network(N), n, rounds, protocol_provider(), seed, engine = engine)
+        _, metrics = game.play()
+        return metrics, [game.possible_paths.index(packet.path) for packet in game.packets]
+    return run
+
+def register_defaults(rounds):
+    """ Registra los motores rápidos del repositorio con juegos de 'rounds' rondas. """
+    for label, provider in [("CP", gb.cp), ("CM", gb.cm)]:
+        register(Candidate(f"numba/{label}", game_runner(provider, rounds),
+                           game_runner(provider, rounds, NumbaClassicalEngine())))
+    # Los flujos óptimos pueden diferir entre óptimos alternativos: se compara sólo el costo.
+    register(Candidate("opt_range", _opt_reference, _opt_range, metrics = ["total_cost"], tolerance = 1e-6))
+
+
+#----------------- Validación -------------------------------------
+
+
+def get_test_cases(quick = False, corpus = None):
+    """ Obtiene los casos de prueba de la validación: los de un corpus o casos generados con EQUIVALENCE_SEED. """
+    if corpus is not None:
+        return list(open_corpus(corpus))
+    np.random.seed(EQUIVALENCE_SEED)
+    random.seed(EQUIVALENCE_SEED)
+    return [test.get_specific_test_case(n, m) for n, m in SIZES[1 if quick else 0]]
+
+def validate(candidate, test_cases, mode = None, replicates = 30, alpha = ALPHA, warmup = 1, seed = EQUIVALENCE_SEED):
+    """
+        Valida un candidato sobre los casos de prueba.
+            mode: "exact" o "distribution" (por defecto, según el candidato).
+            replicates: repeticiones por caso del modo distribution.
+            warmup: ejecuciones del candidato descartadas antes de medir (por ejemplo, compilación).
+            Retorna el resultado (serializable en JSON) con el veredicto, las fallas y la aceleración.
+    """
+    mode = mode or ("exact" if candidate.exact else "distribution")
+    for _ in range(warmup):
+        candidate.candidate(test_cases[0], ru.seed_sequence(seed))
+
+    times = {"reference": 0.0, "candidate": 0.0}
+    failures, tests = [], []
+    for c, test_case in enumerate(test_cases):
+        if mode == "exact":
+            game_seed = ru.seed_sequence(seed, c)
+            reference = _timed(candidate.reference, test_case, game_seed, times, "reference")
+            result = _timed(candidate.candidate, test_case, game_seed, times, "candidate")
+            failures += [{"case": c, **failure} for failure in _compare_exact(candidate, reference, result)]
+        else:
+            reference = [_timed(candidate.reference, test_case, ru.seed_sequence(seed, 0, c, k), times, "reference")
+                         for k in range(replicates)]
+            result = [_timed(candidate.candidate, test_case, ru.seed_sequence(seed, 1, c, k), times, "candidate")
+                      for k in range(replicates)]
+            tests += [{"case": c, **t} for t in _distribution_tests(candidate, reference, result)]
+
+    # Corrección de Bonferroni: el candidato falla con probabilidad a lo sumo 'alpha' si es equivalente.
+    for t in tests:
+        if t["p_value"] < alpha / len(tests):
+            failures.append(t)
+    return {"mode": mode,
+            "passed": not failures,
+            "cases": len(test_cases),
+            "failures": failures,
+            "tests": len(tests) if mode == "distribution" else None,
+            "min_p_value": min((t["p_value"] for t in tests), default=None),
+            "reference_seconds": times["reference"],
+            "candidate_seconds": times["candidate"],
+            "speedup": times["reference"] / times["candidate"] if times["candidate"] > 0 else float("inf")}
+
+def run_validation(candidates, test_cases, **kwargs):
+    """ Valida cada candidato (ver 'validate'). Retorna un diccionario {nombre: resultado}. """
+    results = {}
+    for candidate in candidates:
+        try:
+            result = validate(candidate, test_cases, **kwargs)
+        except Exception as e:
+            result = {"passed": False, "error": f"{type(e).__name__}: {e}"}
+        results[candidate.name] = result
+        print(_format_result(candidate.name, result), file=sys.stderr)
+    return results
+
+
+#----------------- CLI -------------------------------------------
+
+
+def main(argv = None):
+    """ Punto de entrada de la línea de comandos. """
+    parser = argparse.ArgumentParser(description="Validación de motores rápidos contra la implementación de referencia.")
+    parser.add_argument("--output", help="archivo JSON donde guardar el reporte (por defecto stdout)")
+    parser.add_argument("--only", help="expresión regular para filtrar candidatos por nombre")
+    parser.add_argument("--corpus", help="corpus de casos de prueba (ver utils.corpus); por defecto se generan")
+    parser.add_argument("--quick", action="store_true", help="usa casos de prueba reducidos")
+    parser.add_argument("--rounds", type=int, default=100, help="rondas de los juegos")
+    parser.add_argument("--mode", choices=["exact", "distribution"], help="fuerza el modo de validación de todos los candidatos")
+    parser.add_argument("--replicates", type=int, default=30, help="repeticiones por caso del modo distribution")
+    parser.add_argument("--alpha", type=float, default=ALPHA, help="nivel de significación por candidato")
+    parser.add_argument("--seed", type=int, default=EQUIVALENCE_SEED, help="semilla de los juegos")
+    args = parser.parse_args(argv)
+
+    register_defaults(args.rounds)
+    candidates = [c for name, c in CANDIDATES.items() if not args.only or re.search(args.only, name)]
+    test_cases = get_test_cases(args.quick, args.corpus)
+    results = run_validation(candidates, test_cases, mode=args.mode, replicates=args.replicates,
+                             alpha=args.alpha, seed=args.seed)
+
+    report = {"meta": _get_meta(args, len(test_cases)), "results": results}
+    _write_json(report, args.output)
+    return 0 if all(result["passed"] for result in results.values()) else 1
+
+
+#----------------- Auxiliares -------------------------
+
+
+def _opt_reference(test_case, _):
+    """ Flujos óptimos para 1..n paquetes resolviendo un problema por cantidad (OptimalFlowRoutingGame). """
+    N, n, _, _ = test_case
+    return [gb.opt(_copy_network(N), k).play()[1] for k in range(1, n + 1)], None
+
+def _opt_range(test_case, _):
+    """ Flujos óptimos para 1..n paquetes en una sola pasada (OptimalFlowRangeRoutingGame). """
+    N, n, _, _ = test_case
+    return gb.opt_range(_copy_network(N), n).play()[1], None
+
+def _copy_network(N):
+    """ Copia la red (con sus caminos posibles) para que la referencia y el candidato no la compartan. """
+    copy = N.copy()
+    copy.possible_paths = N.get_all_possible_paths()
+    copy.path_policy = N.path_policy
+    return copy
+
+def _timed(f, test_case, seed, times, key):
+    """ Ejecuta f(test_case, seed) acumulando su tiempo en times[key]. """
+    start_time = time.perf_counter()
+    result = f(test_case, seed)
+    times[key] += time.perf_counter() - start_time
+    return result
+
+def _compare_exact(candidate, reference, result):
+    """ Compara las métricas de cada ronda y los caminos finales. Retorna la lista de diferencias. """
+    (reference_metrics, reference_paths), (metrics, paths) = reference, result
+    if len(reference_metrics) != len(metrics):
+        return [{"reason": "rondas", "reference": len(reference_metrics), "candidate": len(metrics)}]
+    failures = []
+    for r, (expected, actual) in enumerate(zip(reference_metrics, metrics)):
+        for name in candidate.metrics or expected:
+            if not _equal(expected[name], actual.get(name), candidate.tolerance):
+                failures.append({"reason": "métrica", "round": r, "metric": name,
+                                 "reference": float(expected[name]), "candidate": _to_float(actual.get(name))})
+                break
+        if failures:
+            break
+    if reference_paths is not None and paths is not None and list(reference_paths) != list(paths):
+        failures.append({"reason": "caminos", "reference": list(reference_paths), "candidate": list(paths)})
+    return failures
+
+def _distribution_tests(candidate, reference, result):
+    """ Tests KS de cada métrica de la última ronda y test chi-cuadrado de los caminos finales. """
+    tests = []
+    for name in candidate.metrics or reference[0][0][-1]:
+        x = [metrics[-1][name] for metrics, _ in reference]
+        y = [metrics[-1][name] for metrics, _ in result]
+        if np.ptp(np.concatenate([x, y])) == 0:
+            continue
+        tests.append({"reason": "ks", "metric": name, "p_value": float(stats.ks_2samp(x, y).pvalue)})
+    if reference[0][1] is not None and result[0][1] is not None:
+        n_paths = 1 + max(max(paths) for _, paths in reference + result)
+        counts = np.array([np.bincount(np.concatenate([paths for _, paths in runs]), minlength=n_paths)
+                           for runs in [reference, result]])
+        counts = counts[:, counts.sum(axis=0) > 0]
+        if counts.shape[1] > 1:
+            tests.append({"reason": "chi2", "metric": "paths",
+                          "p_value": float(stats.chi2_contingency(counts).pvalue)})
+    return tests
+
+def _equal(expected, actual, tolerance):
+    """ Igualdad exacta (tolerance = 0) o relativa de dos valores. """
+    if actual is None:
+        return False
+    if tolerance == 0:
+        return expected == actual
+    return bool(np.isclose(expected, actual, rtol=tolerance, atol=tolerance))
+
+def _to_float(value):
+    """ Convierte el valor a float (None si no existe). """
+    return None if value is None else float(value)
+
+def _get_meta(args, n_cases):
+    """ Obtiene la información de contexto de la ejecución. """
+    return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rounds": args.rounds,
+            "cases": n_cases,
+            "mode": args.mode,
+            "replicates": args.replicates,
+            "alpha": args.alpha,
+            "seed": args.seed}
+
+def _format_result(name, result):
+    """ Formatea el resultado de un candidato para mostrar el progreso. """
+    if "error" in result:
+        return f"{name}: ERROR {result['error']}"
+    verdict = "PASA" if result["passed"] else f"FALLA ({len(result['failures'])} diferencias)"
+    return f"{name} [{result['mode']}]: {verdict}, aceleración x{result['speedup']:.2f}"
+
+def _write_json(report, path):
+    """ Escribe el reporte en 'path' (o stdout si es None). """
+    if path is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+##########################################################
+# Utilidades para importar módulos pesados bajo demanda. #
+##########################################################
+
+import importlib
+
+
+#----------------- Importación diferida ---------------------------------
+
+
+class LazyModule:
+    """ 
+        Clase que representa un módulo que se importa recién al acceder 
+            a alguno de sus atributos por primera vez.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = "cargado" if self._module is not None else "no cargado"
+        return f"<módulo diferido '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    """ 
+        Devuelve el módulo 'name' importado de forma diferida.
+            Se utiliza para PennyLane, cvxpy, scipy y matplotlib, de forma que los
+            juegos clásicos no paguen su tiempo de importación.
+    """
+    return LazyModule(name)
@@ -2,11 +2,16 @@
 # Utilidades para redes. #
 ##########################
 
-import matplotlib.pyplot as plt
+from .lazy import lazy_import
+
+import itertools
 import networkx as nx
 import numpy as np
 import random
 
+mcollections = lazy_import("matplotlib.collections")
+plt = lazy_import("matplotlib.pyplot")
+
 
 #----------------- Red ---------------------------------
 
@@ -20,15 +25,20 @@ class Network(nx.DiGraph):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.possible_paths = []
+        self.path_policy = None
 
     def get_precedence_layers(self):
         """ 
             Obtiene los nodos de la red agrupados en capas de acuerdo
                 al tamaño del camino mínimo de los nodos precendentes.
         """
+        # Un único BFS desde el origen (la capa es la cantidad de nodos del camino mínimo).
+        distances = nx.single_source_shortest_path_length(self, 0)
         layers = {}
         for n in self.nodes():
-            predecesors = len(nx.shortest_path(self, source=0, target=n))
+            if n not in distances:
+                raise nx.NetworkXNoPath(f"El nodo {n} no es alcanzable desde el origen.")
+            predecesors = distances[n] + 1
             if predecesors in layers:
                 layers[predecesors].append(n)
             else:
@@ -36,11 +46,25 @@ class Network(nx.DiGraph):
         return layers
 
     def get_all_possible_paths(self):
-        """ Devuelve los caminos posibles desde el nodo origen al destino. """
+        """ 
+            Devuelve los caminos posibles desde el nodo origen al destino.
+                Por defecto son todos los caminos simples; si la red tiene una política
+                de caminos (ver 'set_path_policy'), sólo los que ésta selecciona.
+        """
         if len(self.possible_paths) == 0:
-            self.possible_paths = list(nx.all_simple_paths(self, source=0, target=len(self.nodes())-1))
+            policy = self.path_policy if self.path_policy is not None else AllPathsPolicy()
+            self.possible_paths = policy.get_paths(self, 0, len(self.nodes())-1)
         return self.possible_paths
 
+    def set_path_policy(self, policy):
+        """ 
+            Define la política que restringe los caminos posibles de la red
+                y descarta los caminos ya calculados si la política cambió.
+        """
+        if policy != self.path_policy:
+            self.path_policy = policy
+            self.possible_paths = []
+
     def get_edge_flows(self):
         """ Devuelve una lista con los flujos de todas las aristas. """
         return [d["flow"] for _,_,d in self.edges(data = True)]
@@ -112,6 +136,87 @@ class Network(nx.DiGraph):
         return sum(self.get_edge_cost(u, v) for u, v in self.edges())
     
 
+#----------------- Políticas de caminos -------------------------
+
+
+class PathPolicy:
+    """ Clase base de las políticas que definen los caminos posibles de una red. """
+
+    def get_paths(self, N, source, target):
+        """ [Abstracto] Devuelve la lista de caminos posibles de 'source' a 'target'. """
+        pass
+
+    def __eq__(self, other):
+        return type(self) == type(other) and vars(self) == vars(other)
+
+    def __hash__(self):
+        return hash((type(self), tuple(sorted(vars(self).items()))))
+
+
+class AllPathsPolicy(PathPolicy):
+    """ Todos los caminos simples (enumeración exponencial en redes grandes). """
+
+    def get_paths(self, N, source, target):
+        return list(nx.all_simple_paths(N, source=source, target=target))
+
+
+class KShortestPathsPolicy(PathPolicy):
+    """ Los 'k' caminos simples de menor latencia en flujo libre (término constante de la latencia). """
+
+    def __init__(self, k):
+        self.k = k
+
+    def get_paths(self, N, source, target):
+        paths = nx.shortest_simple_paths(N, source, target, weight=_free_flow_latency)
+        return list(itertools.islice(paths, self.k))
+
+
+class BoundedHopsPolicy(PathPolicy):
+    """ 
+        Los caminos simples con a lo sumo 'max_hops' aristas (y a lo sumo 'k' caminos si se indica).
+            La búsqueda descarta los nodos desde los que no se llega al destino
+            con los saltos restantes.
+    """
+
+    def __init__(self, max_hops, k = None):
+        self.max_hops = max_hops
+        self.k = k
+
+    def get_paths(self, N, source, target):
+        hops_to_target = nx.single_source_shortest_path_length(N.reverse(copy=False), target, cutoff=self.max_hops)
+        if source not in hops_to_target:
+            return []
+        return list(itertools.islice(self._extend([source], {source}, N, target, hops_to_target), self.k))
+
+    def _extend(self, path, visited, N, target, hops_to_target):
+        """ Extiende el camino 'path' en profundidad devolviendo los caminos que llegan al destino. """
+        if path[-1] == target:
+            yield list(path)
+            return
+        for v in N.successors(path[-1]):
+            if v not in visited and v in hops_to_target and len(path) + hops_to_target[v] <= self.max_hops:
+                path.append(v)
+                visited.add(v)
+                yield from self._extend(path, visited, N, target, hops_to_target)
+                visited.remove(v)
+                path.pop()
+
+
+class EdgeDisjointPathsPolicy(PathPolicy):
+    """ Un conjunto de caminos sin aristas en común (a lo sumo 'k' si se indica). """
+
+    def __init__(self, k = None):
+        self.k = k
+
+    def get_paths(self, N, source, target):
+        return list(nx.edge_disjoint_paths(N, source, target, cutoff=self.k))
+
+
+def _free_flow_latency(u, v, d):
+    """ Latencia de la arista sin flujo, utilizada como peso de los caminos mínimos. """
+    return d["latency"][0]
+
+
 #----------------- Generación de redes -------------------------
 
 
@@ -135,9 +240,7 @@ class NetworkGenerator:
             N.add_edge(random.choice(nodes[:n]), n)
 
         # Funciones de latencia aleatorias.
-        for u, v in N.edges():
-            N[u][v]["latency"] = (random.randint(1,5), 
-                                  random.randint(0,5))
+        self._set_random_latencies(N)
         
         return N
 
@@ -157,6 +260,63 @@ class NetworkGenerator:
         N.add_nodes_from(range(n_nodes))
         N.add_edges_from(edges_info)
         return N
+
+    def generate_grid(self, rows, cols):
+        """ 
+            Genera una red grilla de rows x cols con aristas hacia la derecha y hacia abajo.
+                El origen es la esquina superior izquierda y el destino la inferior derecha.
+        """
+        N = Network()
+        N.add_nodes_from(range(rows * cols))
+        for r in range(rows):
+            for c in range(cols):
+                n = r * cols + c
+                if c + 1 < cols:
+                    N.add_edge(n, n + 1)
+                if r + 1 < rows:
+                    N.add_edge(n, n + cols)
+        self._set_random_latencies(N)
+        return N
+
+    def generate_layered(self, n_layers, width, density = 0.5):
+        """ 
+            Genera una red en capas: origen, 'n_layers' capas de 'width' nodos y destino.
+                Cada nodo se conecta con cada nodo de la capa siguiente con probabilidad 'density'
+                (y al menos con uno), y cada nodo recibe al menos una arista de la capa anterior.
+        """
+        N = Network()
+        layers = [[0]] + [list(range(1 + l * width, 1 + (l + 1) * width)) for l in range(n_layers)] + [[1 + n_layers * width]]
+        N.add_nodes_from(range(1 + n_layers * width + 1))
+        for layer, next_layer in zip(layers[:-1], layers[1:]):
+            for u in layer:
+                targets = [v for v in next_layer if random.random() < density]
+                N.add_edges_from((u, v) for v in (targets if len(targets) > 0 else [random.choice(next_layer)]))
+            for v in next_layer:
+                if N.in_degree(v) == 0:
+                    N.add_edge(random.choice(layer), v)
+        self._set_random_latencies(N)
+        return N
+
+    def generate_isp_like(self, n_nodes, links_per_node = 2):
+        """ 
+            Genera una red similar a la de un proveedor de internet: grafo de Barabási-Albert
+                (pocos nodos muy conectados) con enlaces bidireccionales. El origen es el nodo 0
+                y el destino el nodo 'n_nodes' - 1.
+        """
+        G = nx.barabasi_albert_graph(n_nodes, links_per_node, seed=random.randrange(2**32))
+        N = Network()
+        N.add_nodes_from(range(n_nodes))
+        for u, v in G.edges():
+            N.add_edge(u, v)
+            N.add_edge(v, u)
+        self._set_random_latencies(N)
+        return N
+
+    def _set_random_latencies(self, N):
+        """ Asigna funciones de latencia aleatorias a las aristas de la red. """
+        for u, v in N.edges():
+            N[u][v]["latency"] = (random.randint(1,5), 
+                                  random.randint(0,5))
     
 
 #----------------- Gráfico de redes -------------------------
@@ -165,49 +325,83 @@ class NetworkGenerator:
 class NetworkDrawer:
     """ 
         Clase que permite graficar redes.
+            Las posiciones se calculan una única vez por topología (nodos y aristas). Las redes con más de
+            LARGE_NETWORK_NODES nodos se dibujan con las aristas en una única colección de líneas y sólo
+            con algunas etiquetas de nodos y aristas.
     """
 
-    # 
+    # Cantidad de nodos a partir de la cual se usa el dibujo para redes grandes.
+    LARGE_NETWORK_NODES = 100
+
+    # Cantidad máxima de etiquetas de nodos y de aristas en redes grandes.
+    MAX_LABELS = 40
+
+    def __init__(self):
+        self.layouts = {}
+
     def draw(self, N, attribute_to_draw):    
         """ 
             Dibuja la red mostrando en las aristas el atributo dado.
         """
         # Cálculo de posiciones.
-        layers = N.get_precedence_layers()
-        layers_x_pos = sorted(layers.keys())
-        pos = { n: self._get_node_position(n, layers, layers_x_pos) for n in N.nodes() }
+        pos = self.get_layout(N)
 
         # Colores especiales para nodos origen y destino.
         special_nodes = {0, len(N.nodes())-1}
         node_colors = [ 'orange' if node in special_nodes else 'skyblue' for node in N.nodes() ]
 
         # Dibujo de la red.
-        nx.draw(N, pos, with_labels=True, node_color=node_colors, node_size=1500, arrows=True)
+        if len(N.nodes()) > self.LARGE_NETWORK_NODES:
+            self._draw_large(N, pos, attribute_to_draw, special_nodes, node_colors)
+        else:
+            nx.draw(N, pos, with_labels=True, node_color=node_colors, node_size=1500, arrows=True)
 
-        # Gráfico de las etiquetas en las aristas.
-        edge_labels = { 
-            (u,v): d[attribute_to_draw] for u, v, d in N.edges(data=True)
-        }
-        nx.draw_networkx_edge_labels(N, pos, edge_labels=edge_labels, font_size=10)
+            # Gráfico de las etiquetas en las aristas.
+            edge_labels = { 
+                (u,v): d[attribute_to_draw] for u, v, d in N.edges(data=True)
+            }
+            nx.draw_networkx_edge_labels(N, pos, edge_labels=edge_labels, font_size=10)
 
         # Título.
         plt.title("Red")
         
         plt.show()
-    
-    def _get_node_position(self, n, layers, layers_x_pos):
+
+    def get_layout(self, N):
         """ 
-            Obtiene un par (x,y) para graficar el nodo en función de su capa.
+            Obtiene las posiciones (x,y) de los nodos: x es el índice de su capa (ver 
+                Network.get_precedence_layers) e y su posición dentro de la capa, centrada.
         """
-        layer = -1
-        nodes_in_layer = []
-        for l, nodes in layers.items():
-            if n in nodes:
-                layer = l
-                nodes_in_layer = nodes
-        x = layers_x_pos.index(layer)
-        y = nodes_in_layer.index(n) - len(nodes_in_layer)/2
-        return (x,y)
+        key = (tuple(N.nodes()), tuple(N.edges()))
+        if key not in self.layouts:
+            layers = N.get_precedence_layers()
+            layers_x_pos = {layer: x for x, layer in enumerate(sorted(layers.keys()))}
+            pos = {}
+            for layer, nodes in layers.items():
+                for i, n in enumerate(nodes):
+                    pos[n] = (layers_x_pos[layer], i - len(nodes)/2)
+            self.layouts[key] = {n: pos[n] for n in N.nodes()}
+        return self.layouts[key]
+
+    def _draw_large(self, N, pos, attribute_to_draw, special_nodes, node_colors):
+        """ Dibuja una red grande: aristas en una colección de líneas y etiquetas espaciadas. """
+        ax = plt.gca()
+        edges = list(N.edges(data=True))
+        segments = [(pos[u], pos[v]) for u, v, _ in edges]
+        ax.add_collection(mcollections.LineCollection(segments, colors="gray", linewidths=0.5, alpha=0.6))
+        xy = np.array([pos[n] for n in N.nodes()])
+        ax.scatter(xy[:, 0], xy[:, 1], c=node_colors, s=20, zorder=2)
+
+        # Etiquetas de los nodos especiales y de algunos nodos y aristas equiespaciados.
+        nodes = list(N.nodes())
+        labeled_nodes = set(special_nodes) | set(nodes[::max(1, len(nodes) // self.MAX_LABELS)])
+        for n in labeled_nodes:
+            ax.annotate(str(n), pos[n], fontsize=7, ha="center", va="bottom")
+        for u, v, d in edges[::max(1, len(edges) // self.MAX_LABELS)]:
+            (x_u, y_u), (x_v, y_v) = pos[u], pos[v]
+            ax.annotate(str(d[attribute_to_draw]), ((x_u + x_v)/2, (y_u + y_v)/2), fontsize=6, color="dimgray", ha="center")
+        ax.autoscale_view()
+        ax.set_axis_off()
 
 
 #----------------- Paquetes -------------------------
@@ -223,3 +417,4 @@ class Packet:
         self.path = None
         self.strategy = None
         self.penalty = False
+        self.rng = None
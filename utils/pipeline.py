@@ -0,0 +1,185 @@
+######################################################################################
+# Pipeline productor/consumidor: generación de casos, óptimos y ejecución de juegos. #
+######################################################################################
+#
+# Uso:
+#   for record in pipeline.run_pipeline(config, {"generate": 1, "solve": 2, "play": 8}):
+#       ...
+#   python -m utils.runner config.json --output results.jsonl --pipeline 1,2,8
+#
+# Etapas (procesos concurrentes, unidas por colas acotadas):
+#   casos -> [generate] -> redes -> [solve] -> tareas -> [play] -> registros -> agregación (proceso principal)
+#
+#   generate: genera la red de cada caso (con su propia semilla, por lo que los casos no dependen
+#             del orden de ejecución ni de la cantidad de workers).
+#   solve:    calcula el flujo óptimo y divide el caso en tareas (ver utils.runner.get_case_tasks).
+#   play:     ejecuta los juegos de las tareas (ver utils.runner.run_task).
+#
+# Cuando una cola se llena, la etapa anterior se bloquea (backpressure): la memoria queda acotada
+# y el tiempo total se aproxima al de la etapa más lenta en lugar de la suma de las etapas.
+
+import src.game_builder as gb
+
+from . import rng as ru
+from . import runner
+from . import tests as test
+
+import multiprocessing as mp
+import os
+import random
+import threading
+import traceback
+import numpy as np
+
+
+#----------------- Constantes ---------------------------------
+
+
+# Etapas del pipeline, en orden.
+STAGES = ["generate", "solve", "play"]
+
+# Capacidad por defecto de cada cola entre etapas.
+QUEUE_SIZE = 64
+
+# Clave de las semillas de los casos (fuera del rango de las claves (caso, repetición) de los juegos).
+CASE_SEED_KEY = 2**32
+
+# Marcas de fin de un worker y de error en la cola de resultados.
+_DONE = "done"
+_ERROR = "error"
+
+
+#----------------- Pipeline ---------------------------------
+
+
+def run_pipeline(config, stage_workers = None, queue_size = QUEUE_SIZE):
+    """
+        Ejecuta el experimento de la configuración (ver utils.runner) como un pipeline y devuelve
+            (generador) cada registro de resultados a medida que se obtiene.
+            stage_workers: cantidad de procesos por etapa (por defecto 1 para generate y solve, y
+            la cantidad de CPUs para play).
+            Lanza RuntimeError si algún worker falla.
+    """
+    config = runner.resolve_seed({**runner.DEFAULT_CONFIG, **config})
+    workers = {"generate": 1, "solve": 1, "play": os.cpu_count() or 1}
+    workers.update(stage_workers or {})
+    specs = get_case_specs(config["test_cases"])
+
+    # Colas acotadas entre etapas (la de resultados la consume el proceso principal).
+    queues = [mp.Queue(queue_size) for _ in STAGES]
+    results = mp.Queue(queue_size)
+    targets = {"generate": _generate_worker, "solve": _solve_worker, "play": _play_worker}
+    processes = {stage: [mp.Process(target=targets[stage], args=(queues[s], queues[s+1] if s+1 < len(STAGES) else results,
+                                                                  results, config), daemon=True)
+                         for _ in range(workers[stage])]
+                 for s, stage in enumerate(STAGES)}
+    for stage_processes in processes.values():
+        for process in stage_processes:
+            process.start()
+
+    # Hilos que alimentan la primera etapa y cierran cada etapa cuando terminan todos los workers de la anterior.
+    def feed():
+        for c, spec in enumerate(specs):
+            queues[0].put((c, spec))
+        _close(queues[0], workers["generate"])
+
+    def close_after(stage, queue, n_workers):
+        for process in processes[stage]:
+            process.join()
+        _close(queue, n_workers)
+
+    threads = [threading.Thread(target=feed, daemon=True),
+               threading.Thread(target=close_after, args=("generate", queues[1], workers["solve"]), daemon=True),
+               threading.Thread(target=close_after, args=("solve", queues[2], workers["play"]), daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    # Agregación: registros hasta que terminen todos los workers de la última etapa.
+    finished = 0
+    try:
+        while finished < workers["play"]:
+            message = results.get()
+            if message == _DONE:
+                finished += 1
+            elif isinstance(message, tuple) and message[0] == _ERROR:
+                raise RuntimeError(f"Falló un worker del pipeline:\n{message[1]}")
+            else:
+                yield message
+    finally:
+        for stage_processes in processes.values():
+            for process in stage_processes:
+                if process.is_alive():
+                    process.terminate()
+
+def get_case_specs(spec):
+    """
+        Obtiene la especificación de cada caso de prueba (tamaño o topología) sin generarlo.
+            Admite los tipos "random", "specific", "matrix" y "topology" de utils.runner.
+    """
+    kind = spec["type"]
+    if kind == "random":
+        return [{"type": "random"} for _ in range(spec["n_cases"])]
+    if kind == "specific":
+        return [{"type": "specific", "n": n, "m": m} for n, m in spec["sizes"]]
+    if kind == "matrix":
+        return [{"type": "specific", "n": n, "m": m}
+                for n, m in test.get_matrix_game_sizes() for _ in range(spec["n_tests_per_size"])]
+    if kind == "topology":
+        return [{**spec, "type": "topology"} for _ in range(spec.get("n_cases", 1))]
+    raise ValueError(f"Tipo de casos de prueba no admitido por el pipeline: {kind}")
+
+
+#----------------- Workers ---------------------------------
+
+
+def _generate_worker(cases, networks, results, config):
+    """ Etapa generate: genera la red de cada caso. """
+    def generate(item):
+        c, spec = item
+        _seed_case(config["seed"], c)
+        if spec["type"] == "topology":
+            N = runner.build_topology_network(spec)
+            n = spec["packets"]
+            return [(c, N, n, len(N.get_all_possible_paths()))]
+        n, m = test.get_random_game_size() if spec["type"] == "random" else (spec["n"], spec["m"])
+        return [(c, test.NETWORK_GENERATOR.generate_random_with_paths(m), n, m)]
+    _run_worker(cases, networks, results, generate)
+
+def _solve_worker(networks, tasks, results, config):
+    """ Etapa solve: calcula el flujo óptimo de cada caso y lo divide en tareas. """
+    def solve(item):
+        c, N, n, m = item
+        optimal = gb.opt(N, n).play()[1]
+        return runner.get_case_tasks(config, c, (N, n, m, optimal), n, m)
+    _run_worker(networks, tasks, results, solve)
+
+def _play_worker(tasks, records, results, config):
+    """ Etapa play: ejecuta el juego de cada tarea. """
+    _run_worker(tasks, records, results, lambda task: [runner.run_task(task)])
+    results.put(_DONE)
+
+def _run_worker(inputs, outputs, results, process):
+    """ Procesa elementos de 'inputs' hasta recibir None, enviando los resultados a 'outputs' (errores a 'results'). """
+    try:
+        for item in iter(inputs.get, None):
+            for output in process(item):
+                outputs.put(output)
+    except Exception:
+        results.put((_ERROR, traceback.format_exc()))
+
+
+#----------------- Auxiliares -------------------------
+
+
+def _close(queue, n_workers):
+    """ Envía una marca de fin (None) por cada worker que consume la cola. """
+    for _ in range(n_workers):
+        queue.put(None)
+
+def _seed_case(seed, c):
+    """ Inicializa los generadores globales con la semilla propia del caso 'c' (si hay semilla). """
+    case_seed = ru.seed_sequence(seed, CASE_SEED_KEY, c)
+    if case_seed is not None:
+        state = case_seed.generate_state(1)[0]
+        np.random.seed(state)
+        random.seed(int(state))
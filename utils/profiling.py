@@ -0,0 +1,88 @@
+###############################################################
+# Utilidades para medir el tiempo de las fases de los juegos. #
+###############################################################
+
+from collections import defaultdict
+import time
+
+
+#----------------- Constantes ---------------------------------
+
+
+# Fases medidas en cada ronda del juego.
+#   circuit_build, circuit_execution y decode son subfases de path_selection
+#   en los protocolos cuánticos.
+PHASES = ["path_selection", "circuit_build", "circuit_execution", "decode",
+          "flow_update", "strategy_update", "metrics"]
+
+
+#----------------- Profiler -------------------------------------
+
+
+class Profiler:
+    """
+        Clase que acumula los tiempos por fase y los contadores de eventos
+            de los juegos, por juego y en total (por barrido).
+            Se activa pasándolo a los juegos (gb.game(..., profiler=p)) o a las
+            funciones execute_* de utils.tests; si no se pasa, no tiene costo.
+    """
+
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.games = []
+        self._game_times = defaultdict(float)
+        self._game_counts = defaultdict(int)
+
+    def tic(self):
+        """ Devuelve el instante actual para iniciar una medición. """
+        return time.perf_counter()
+
+    def toc(self, phase, start):
+        """
+            Acumula en 'phase' el tiempo transcurrido desde 'start'.
+                Devuelve el instante actual para encadenar mediciones.
+        """
+        now = time.perf_counter()
+        self._game_times[phase] += now - start
+        return now
+
+    def add(self, phase, seconds):
+        """ Acumula 'seconds' segundos en la fase 'phase'. """
+        self._game_times[phase] += seconds
+
+    def count(self, name, k = 1):
+        """ Incrementa el contador 'name' en 'k'. """
+        self._game_counts[name] += k
+
+    def start_game(self):
+        """ Inicia las mediciones de un nuevo juego. """
+        self._game_times = defaultdict(float)
+        self._game_counts = defaultdict(int)
+
+    def end_game(self):
+        """ Cierra las mediciones del juego actual y las agrega al total. """
+        self.games.append({"times": dict(self._game_times), "counts": dict(self._game_counts)})
+        for phase, seconds in self._game_times.items():
+            self.times[phase] += seconds
+        for name, k in self._game_counts.items():
+            self.counts[name] += k
+
+    def report(self):
+        """ Devuelve el resumen de las mediciones: totales y por juego. """
+        return {"times": dict(self.times),
+                "counts": dict(self.counts),
+                "n_games": len(self.games),
+                "games": self.games}
+
+    def summary(self):
+        """ Devuelve un texto con el tiempo total y el porcentaje de cada fase. """
+        total = sum(self.times[phase] for phase in ["path_selection", "flow_update", "strategy_update", "metrics"])
+        lines = [f"{len(self.games)} juegos, {total:.4f}s"]
+        for phase in PHASES:
+            if phase in self.times:
+                share = 100 * self.times[phase] / total if total > 0 else 0
+                lines.append(f"  {phase}: {self.times[phase]:.4f}s ({share:.1f}%)")
+        for name, k in sorted(self.counts.items()):
+            lines.append(f"  {name}: {k}")
+        return "\n".join(lines)
@@ -2,10 +2,13 @@
 # Utilidades para algoritmos cuánticos. #
 #########################################
 
+from .lazy import lazy_import
+
 import numpy as np
-import pennylane as qml
 import random
 
+qml = lazy_import("pennylane")
+
 
 def J(gamma, wires):
     """ 
@@ -0,0 +1,150 @@
+#################################################################
+# Tensor etiquetado de resultados de experimentos y reducciones. #
+#################################################################
+
+from statistics import NormalDist
+import warnings
+import numpy as np
+
+
+#----------------- Tensor de resultados ---------------------------------
+
+
+class ResultsTensor:
+    """
+        Clase que almacena los resultados de un barrido en un único ndarray con ejes etiquetados
+            (por ejemplo protocol x n x m x replicate x metric, y round si se registran las rondas).
+            Las celdas sin resultados (por ejemplo tamaños n x m inválidos) valen NaN.
+            data: el ndarray de resultados.
+            axes: los nombres de cada eje de 'data'.
+            labels: diccionario {eje: lista de etiquetas de ese eje}.
+    """
+
+    def __init__(self, data, axes, labels):
+        self.data = np.asarray(data, dtype=float)
+        self.axes = tuple(axes)
+        self.labels = {axis: list(labels[axis]) if axis in labels else list(range(self.data.shape[i]))
+                       for i, axis in enumerate(self.axes)}
+
+    def axis(self, name):
+        """ Devuelve la posición del eje 'name'. """
+        return self.axes.index(name)
+
+    def has_axis(self, name):
+        """ Indica si el tensor tiene el eje 'name'. """
+        return name in self.axes
+
+    def sel(self, **selection):
+        """
+            Selecciona por etiqueta los valores de uno o más ejes, eliminando esos ejes.
+                Por ejemplo: tensor.sel(metric="mean_poa", protocol="CM").
+        """
+        data = self.data
+        axes = list(self.axes)
+        for axis, label in selection.items():
+            data = np.take(data, self.labels[axis].index(label), axis=axes.index(axis))
+            axes.remove(axis)
+        return ResultsTensor(data, axes, self.labels)
+
+    def transpose(self, *axes):
+        """ Reordena los ejes del tensor. """
+        return ResultsTensor(np.transpose(self.data, [self.axis(a) for a in axes]), axes, self.labels)
+
+    def mean(self, axis):
+        """ Media (ignorando NaN) sobre el eje 'axis', eliminándolo. """
+        return self._reduce(np.nanmean, axis)
+
+    def std(self, axis):
+        """ Desvío estándar muestral (ignorando NaN) sobre el eje 'axis', eliminándolo. """
+        return self._reduce(lambda x, axis: np.nanstd(x, axis=axis, ddof=1), axis)
+
+    def ci(self, axis, level = 0.95):
+        """
+            Intervalo de confianza de la media sobre el eje 'axis' (aproximación normal).
+                Devuelve los tensores (inferior, superior).
+        """
+        z = NormalDist().inv_cdf(0.5 + level / 2)
+        mean = self.mean(axis).data
+        with np.errstate(invalid="ignore", divide="ignore"):
+            count = np.sum(~np.isnan(self.data), axis=self.axis(axis))
+            half_width = z * self.std(axis).data / np.sqrt(count)
+        axes = [a for a in self.axes if a != axis]
+        return ResultsTensor(mean - half_width, axes, self.labels), ResultsTensor(mean + half_width, axes, self.labels)
+
+    def collapse(self, *keep):
+        """ Media (ignorando NaN) sobre todos los ejes salvo los indicados en 'keep'. """
+        tensor = self
+        for axis in self.axes:
+            if axis not in keep:
+                tensor = tensor.mean(axis)
+        return tensor
+
+    def winner(self, metric, axis = "protocol"):
+        """
+            Índice del elemento de 'axis' (por defecto, el protocolo) con menor valor de 'metric'
+                en cada celda. Si hay eje 'replicate', se comparan las medias de las repeticiones.
+                Las celdas sin resultados valen NaN.
+        """
+        tensor = self.mean("replicate") if self.has_axis("replicate") else self
+        values = tensor.sel(metric=metric)
+        data = values.data
+        all_nan = np.all(np.isnan(data), axis=values.axis(axis))
+        winners = np.argmin(np.where(np.isnan(data), np.inf, data), axis=values.axis(axis)).astype(float)
+        winners[all_nan] = np.nan
+        return ResultsTensor(winners, [a for a in values.axes if a != axis], self.labels)
+
+    def win_counts(self, metric, axis = "protocol"):
+        """ Cantidad de celdas ganadas (ver 'winner') por cada elemento de 'axis'. """
+        winners = self.winner(metric, axis).data
+        return np.bincount(winners[~np.isnan(winners)].astype(int), minlength=len(self.labels[axis]))
+
+    def _reduce(self, f, axis):
+        """ Aplica la reducción 'f' sobre el eje 'axis'. """
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            data = f(self.data, axis=self.axis(axis))
+        return ResultsTensor(data, [a for a in self.axes if a != axis], self.labels)
+
+    @staticmethod
+    def from_nested(nested, axes, labels = {}):
+        """
+            Construye el tensor a partir de listas anidadas (posiblemente irregulares) de diccionarios
+                de métricas, como las devueltas por las funciones execute_* de utils.tests.
+                axes: los nombres de los niveles de anidamiento (se agrega el eje 'metric' al final).
+                Por ejemplo, para execute_matrix_test: axes = ("n", "m", "protocol").
+        """
+        shape = _nested_shape(nested, len(axes))
+        metrics = _nested_metrics(nested, len(axes))
+        data = np.full(shape + [len(metrics)], np.nan)
+        _fill_nested(data, nested, len(axes), (), metrics)
+        return ResultsTensor(data, list(axes) + ["metric"], {**labels, "metric": metrics})
+
+
+#----------------- Auxiliares -------------------------
+
+
+def _nested_shape(nested, depth):
+    """ Obtiene la forma máxima de las listas anidadas hasta 'depth' niveles. """
+    if depth == 0:
+        return []
+    inner = [_nested_shape(item, depth - 1) for item in nested]
+    return [len(nested)] + [max(s[i] for s in inner) if len(inner) > 0 else 0 for i in range(depth - 1)]
+
+def _nested_metrics(nested, depth):
+    """ Obtiene los nombres de las métricas de los diccionarios de las listas anidadas. """
+    if depth == 0:
+        return list(nested.keys())
+    metrics = []
+    for item in nested:
+        metrics += [m for m in _nested_metrics(item, depth - 1) if m not in metrics]
+    return metrics
+
+def _fill_nested(data, nested, depth, idx, metrics):
+    """ Copia los valores de las listas anidadas en 'data'. """
+    if depth == 0:
+        for k, metric in enumerate(metrics):
+            if metric in nested:
+                data[idx + (k,)] = nested[metric]
+        return
+    for i, item in enumerate(nested):
+        _fill_nested(data, item, depth - 1, idx + (i,), metrics)
@@ -0,0 +1,211 @@
+#####################################################################
+# Utilidades para los generadores de números aleatorios (semillas). #
+#####################################################################
+
+import numpy as np
+
+
+#----------------- Constantes ---------------------------------
+
+
+# Cantidad de números aleatorios que BlockRandom genera por bloque.
+BLOCK_SIZE = 512
+
+# Tamaño del primer bloque de los generadores de un BlockPool (se duplica en cada bloque hasta BLOCK_SIZE),
+# para que los juegos cortos con muchos paquetes no generen números que no usan.
+FIRST_BLOCK_SIZE = 16
+
+# Índice de cada tipo de bloque en las claves de las semillas de un BlockPool.
+BLOCK_KINDS = {"uniform": 0, "normal": 1}
+
+
+#----------------- Semillas ---------------------------------
+
+
+def seed_sequence(seed, *key):
+    """ 
+        Obtiene la subsecuencia de semillas identificada por 'key' a partir de 'seed'.
+            Las subsecuencias son independientes entre sí y reproducibles, por lo que
+            dos juegos con la misma semilla leen los mismos números aleatorios.
+            Si 'seed' es None retorna None (se usa el generador global).
+    """
+    if seed is None:
+        return None
+    if isinstance(seed, np.random.SeedSequence):
+        return np.random.SeedSequence(seed.entropy, spawn_key=tuple(seed.spawn_key) + tuple(key))
+    return np.random.SeedSequence(seed, spawn_key=tuple(key))
+
+def game_seed(seed):
+    """ 
+        Obtiene la semilla de un juego. Si 'seed' es None se deriva del generador global de numpy,
+            por lo que los juegos sin semilla siguen siendo reproducibles con np.random.seed.
+    """
+    if seed is None:
+        return np.random.SeedSequence(int(np.random.randint(0, 2**63 - 1, dtype=np.int64)))
+    return seed
+
+def packet_generators(seed, n_packets):
+    """ 
+        Obtiene un generador aleatorio independiente para cada uno de los 'n_packets' paquetes.
+            Los bloques de números de todos los paquetes se generan juntos (ver BlockPool), por lo que
+            crear los generadores no requiere una semilla ni un np.random.Generator por paquete.
+            Si 'seed' es None, la semilla se deriva del generador global de numpy.
+    """
+    pool = BlockPool(seed, n_packets)
+    return [BlockRandom(pool = pool, row = p) for p in range(n_packets)]
+
+def packet_generator(seed, p):
+    """ 
+        Obtiene un generador aleatorio propio para el paquete 'p' (por ejemplo, para los paquetes que
+            llegan a un juego en streaming), independiente de los de 'packet_generators'.
+    """
+    return BlockRandom(seed_sequence(game_seed(seed), 0, p))
+
+def circuit_seed(seed, *key):
+    """ 
+        Obtiene la semilla del simulador del circuito cuántico (identificado por 'key' si
+            el protocolo usa más de un simulador).
+            Si 'seed' es None, el simulador usa el generador global de numpy.
+    """
+    if seed is None:
+        return "global"
+    return int(seed_sequence(seed, 1, *key).generate_state(1)[0])
+
+def arrivals_generator(seed):
+    """ 
+        Obtiene el generador aleatorio del proceso de llegadas de un juego en streaming.
+            Si 'seed' es None, la semilla se deriva del generador global de numpy.
+    """
+    return np.random.default_rng(seed_sequence(game_seed(seed), 2))
+
+
+#----------------- Generadores ---------------------------------
+
+
+class BlockRandom:
+    """ 
+        Generador aleatorio de un juego (o paquete) que entrega números uniformes y normales
+            a partir de bloques generados de antemano, evitando el costo de una llamada a numpy por
+            cada número. El muestreo categórico se resuelve con sumas acumuladas en lugar de np.random.choice.
+            seed: semilla del generador (si es None, se deriva del generador global de numpy).
+            pool, row: si se indican, los bloques son la fila 'row' de los bloques de 'pool' (ver BlockPool)
+                y el np.random.Generator propio sólo se crea si se usa (ver 'dirichlet').
+    """
+
+    def __init__(self, seed = None, pool = None, row = None):
+        self.pool = pool
+        self.row = row
+        self.generator = np.random.default_rng(game_seed(seed)) if pool is None else None
+        self.uniforms = []
+        self.uniform_idx = 0
+        self.normals = []
+        self.normal_idx = 0
+        self.blocks = {"uniform": 0, "normal": 0}
+
+    def random(self):
+        """ Devuelve un número uniforme en [0, 1). """
+        if self.uniform_idx == len(self.uniforms):
+            self.uniforms = self.next_block("uniform")
+            self.uniform_idx = 0
+        self.uniform_idx += 1
+        return self.uniforms[self.uniform_idx - 1]
+
+    def standard_normal(self):
+        """ Devuelve un número con distribución normal estándar. """
+        if self.normal_idx == len(self.normals):
+            self.normals = self.next_block("normal")
+            self.normal_idx = 0
+        self.normal_idx += 1
+        return self.normals[self.normal_idx - 1]
+
+    def next_block(self, kind):
+        """ Genera el siguiente bloque de números de tipo 'kind' ("uniform" o "normal"). """
+        k = self.blocks[kind]
+        self.blocks[kind] += 1
+        if self.pool is not None:
+            return self.pool.get_block(kind, k, self.row)
+        if kind == "uniform":
+            return self.generator.random(BLOCK_SIZE).tolist()
+        return self.generator.standard_normal(BLOCK_SIZE).tolist()
+
+    def uniform(self, low = 0.0, high = 1.0):
+        """ Devuelve un número uniforme en [low, high). """
+        return low + (high - low) * self.random()
+
+    def normal(self, loc = 0.0, scale = 1.0):
+        """ Devuelve un número con distribución normal N(loc, scale). """
+        return loc + scale * self.standard_normal()
+
+    def integers(self, n):
+        """ Devuelve un entero uniforme en [0, n). """
+        return min(int(self.random() * n), n - 1)
+
+    def categorical(self, p):
+        """ Devuelve un índice con probabilidades 'p' (por búsqueda en sus sumas acumuladas). """
+        cumulative = np.cumsum(p)
+        return min(int(np.searchsorted(cumulative, self.random() * cumulative[-1], side="right")), len(cumulative) - 1)
+
+    def dirichlet(self, alpha):
+        """ 
+            Devuelve una muestra de la distribución de Dirichlet. Con todos los parámetros iguales a 1
+                (estrategias mixtas iniciales) se obtiene normalizando exponenciales de los números uniformes;
+                en otro caso se usa el np.random.Generator propio (poco frecuente).
+        """
+        alpha = np.asarray(alpha, dtype=float)
+        if self.pool is not None and np.all(alpha == 1):
+            x = -np.log1p(-np.array([self.random() for _ in range(len(alpha))]))
+            return x / x.sum()
+        return self._get_generator().dirichlet(alpha)
+
+    def get_state(self):
+        """ Devuelve una copia del estado del generador (incluyendo los bloques pendientes). """
+        return {"pool": self.pool, "row": self.row, "blocks": dict(self.blocks),
+                "generator": None if self.generator is None else self.generator.bit_generator.state,
+                "uniforms": self.uniforms[self.uniform_idx:], "normals": self.normals[self.normal_idx:]}
+
+    def set_state(self, state):
+        """ Restaura el estado obtenido con 'get_state'. """
+        self.pool, self.row, self.blocks = state["pool"], state["row"], dict(state["blocks"])
+        if state["generator"] is None:
+            self.generator = None
+        else:
+            self._get_generator().bit_generator.state = state["generator"]
+        self.uniforms, self.uniform_idx = list(state["uniforms"]), 0
+        self.normals, self.normal_idx = list(state["normals"]), 0
+
+    def _get_generator(self):
+        """ Obtiene el np.random.Generator propio (creándolo la primera vez si los bloques son de un BlockPool). """
+        if self.generator is None:
+            seed = seed_sequence(self.pool.seed, 0, self.row) if self.pool is not None else None
+            self.generator = np.random.default_rng(seed)
+        return self.generator
+
+
+class BlockPool:
+    """ 
+        Clase que genera los bloques de números aleatorios de 'n_rows' generadores (paquetes) a la vez:
+            el bloque k de cada tipo es una matriz (una fila por generador) obtenida con su propia semilla,
+            por lo que la secuencia de cada generador no depende del orden en que se consumen.
+            Los bloques empiezan con FIRST_BLOCK_SIZE números y se duplican hasta BLOCK_SIZE. Cada bloque
+            se descarta cuando todas sus filas fueron entregadas (y se regenera si se vuelve a pedir).
+            seed: semilla del juego (si es None, se deriva del generador global de numpy).
+    """
+
+    def __init__(self, seed, n_rows):
+        self.seed = game_seed(seed)
+        self.n_rows = n_rows
+        self.blocks = {}
+
+    def get_block(self, kind, k, row):
+        """ Devuelve la fila 'row' del bloque 'k' de tipo 'kind' ("uniform" o "normal"). """
+        key = (kind, k)
+        if key not in self.blocks:
+            size = min(BLOCK_SIZE, FIRST_BLOCK_SIZE * 2**min(k, 16))
+            generator = np.random.default_rng(seed_sequence(self.seed, 3, BLOCK_KINDS[kind], k))
+            values = generator.random((self.n_rows, size)) if kind == "uniform" else generator.standard_normal((self.n_rows, size))
+            self.blocks[key] = (values, set())
+        values, delivered = self.blocks[key]
+        delivered.add(row)
+        if len(delivered) == self.n_rows:
+            del self.blocks[key]
+        return values[row].tolist()
@@ -0,0 +1,309 @@
+#############################################################################
+# Ejecución headless de experimentos a partir de archivos de configuración. #
+#############################################################################
+#
+# Uso:
+#   python -m utils.runner configs/comparison-general.json --output results.jsonl --workers 4
+#
+# Formato de la configuración (JSON):
+#   {
+#     "seed": 4333,
+#     "rounds": 100,
+#     "replicates": 5,
+#     "crn": true,
+#     "record_rounds": false,
+#     "test_cases": {"type": "random", "n_cases": 10},
+#     "protocols": [{"name": "cm", "params": {"alpha": 0.35}}, {"name": "ewl", "params": {"n_params_per_qubit": 3}}],
+#     "cost_model": "cost_model.json",
+#     "memory_budget": 8000000000
+#   }
+#
+# Si "seed" es null se sortea una semilla raíz, que se guarda en cada registro ("seed").
+#
+# Si se indica "cost_model" (ver utils.scheduler.CostModel.save), las tareas se planifican con
+# utils.scheduler.schedule: se ejecutan de mayor a menor tiempo estimado para balancear la carga
+# de los workers y se informa el tiempo estimado antes de empezar. El modelo debe incluir todos
+# los protocolos de la configuración (clásicos y cuánticos, ver CostModel.calibrate).
+# Si además se indica "memory_budget" (en bytes), las tareas cuya memoria estimada lo supera no
+# se ejecutan y se informan por stderr. No se aplica al ejecutar como pipeline.
+#
+# Tipos de casos de prueba:
+#   {"type": "random", "n_cases": k}
+#   {"type": "specific", "sizes": [[n, m], ...]}
+#   {"type": "matrix", "n_tests_per_size": k}
+#   {"type": "combinations", "nodes": 3 | 4 | 5, "packets": n}
+#   {"type": "corpus", "path": "corpus.bin"}                  (ver utils.corpus)
+#   {"type": "topology", "generator": "grid", "params": {"rows": 10, "cols": 10},
+#    "packets": n, "n_cases": k, "path_policy": {"type": "k_shortest", "k": 8}}
+#       generator: grid | layered | isp_like | random (ver utils.network.NetworkGenerator).
+#       path_policy: k_shortest {k} | bounded_hops {max_hops, k} | edge_disjoint {k}.
+
+import src.game_builder as gb
+
+from .corpus import Corpus, open_corpus
+from .lazy import lazy_import
+from . import metric as mu
+from .network import BoundedHopsPolicy, EdgeDisjointPathsPolicy, KShortestPathsPolicy
+from . import rng as ru
+from . import scheduler
+from . import tests as test
+
+import argparse
+from contextlib import contextmanager
+import csv
+import json
+import multiprocessing as mp
+import random
+import sys
+import time
+import numpy as np
+
+pipeline = lazy_import("utils.pipeline")
+
+
+#----------------- Constantes ---------------------------------
+
+
+# Protocolos que pueden construirse desde una configuración.
+PROTOCOL_BUILDERS = {"cp": gb.cp, "cm": gb.cm, "mwp": gb.mwp, "mwm": gb.mwm, "ewl": gb.ewl}
+
+# Políticas de caminos que pueden construirse desde una configuración.
+PATH_POLICY_BUILDERS = {"k_shortest": KShortestPathsPolicy, "bounded_hops": BoundedHopsPolicy, "edge_disjoint": EdgeDisjointPathsPolicy}
+
+# Valores por defecto de la configuración.
+DEFAULT_CONFIG = {"seed": None, "rounds": 100, "replicates": 1, "crn": True, "record_rounds": False}
+
+
+#----------------- Construcción de experimentos ----------------------
+
+
+def build_protocol(spec):
+    """ Construye un protocolo a partir de su especificación {"name": ..., "params": {...}}. """
+    name = spec["name"].lower()
+    if name not in PROTOCOL_BUILDERS:
+        raise ValueError(f"Protocolo desconocido: {spec['name']}")
+    return PROTOCOL_BUILDERS[name](**spec.get("params", {}))
+
+def build_test_cases(spec):
+    """ Construye la lista plana de casos de prueba a partir de su especificación. """
+    kind = spec["type"]
+    if kind == "random":
+        return test.get_test_cases(spec["n_cases"])
+    if kind == "specific":
+        return [test.get_specific_test_case(n, m) for n, m in spec["sizes"]]
+    if kind == "matrix":
+        return [tc for row in test.get_matrix_test_cases(spec["n_tests_per_size"]) for cell in row for tc in cell]
+    if kind == "combinations":
+        generators = {3: test.combinations_test_cases_3, 4: test.combinations_test_cases_4, 5: test.combinations_test_cases_5}
+        return generators[spec["nodes"]](spec["packets"])
+    if kind == "corpus":
+        return open_corpus(spec["path"])
+    if kind == "topology":
+        return [_build_topology_test_case(spec) for _ in range(spec.get("n_cases", 1))]
+    raise ValueError(f"Tipo de casos de prueba desconocido: {kind}")
+
+def build_topology_network(spec):
+    """ Genera la red de un caso de prueba de tipo "topology" (con su política de caminos, si se indica). """
+    N = getattr(test.NETWORK_GENERATOR, "generate_" + spec["generator"])(**spec.get("params", {}))
+    if "path_policy" in spec:
+        policy_spec = dict(spec["path_policy"])
+        N.set_path_policy(PATH_POLICY_BUILDERS[policy_spec.pop("type")](**policy_spec))
+    return N
+
+def resolve_seed(config):
+    """ 
+        Devuelve la configuración con una semilla raíz: la indicada o, si es None, una nueva obtenida de la
+            entropía del sistema. Así las semillas de todas las tareas se derivan de la raíz (los workers no
+            dependen del generador global heredado, que es el mismo en todos los procesos) y el experimento
+            puede reproducirse con la semilla de los registros.
+    """
+    if config["seed"] is not None:
+        return config
+    return {**config, "seed": int(np.random.SeedSequence().generate_state(1)[0])}
+
+def load_config(path):
+    """ Carga una configuración de experimento completando los valores por defecto. """
+    with open(path) as f:
+        config = json.load(f)
+    return {**DEFAULT_CONFIG, **config}
+
+def get_tasks(config, test_cases):
+    """
+        Obtiene las tareas del experimento: una por cada (caso, protocolo, repetición).
+            Si 'crn' está activo, todos los protocolos de una misma (caso, repetición) usan
+            la misma semilla (números aleatorios comunes).
+    """
+    tasks = []
+    for c in range(len(test_cases)):
+        # Los casos de un corpus se envían como (corpus, índice) y se reconstruyen en el worker.
+        if isinstance(test_cases, Corpus):
+            test_case, n, m = (test_cases, c), test_cases.arrays["case_n"][c], test_cases.arrays["case_m"][c]
+        else:
+            test_case, n, m = test_cases[c], test_cases[c][1], test_cases[c][2]
+        tasks.extend(get_case_tasks(config, c, test_case, n, m))
+    return tasks
+
+def get_case_tasks(config, c, test_case, n, m):
+    """ Obtiene las tareas del caso 'c' (ver 'get_tasks'). """
+    tasks = []
+    for p, spec in enumerate(config["protocols"]):
+        for r in range(config["replicates"]):
+            key = (c, r) if config["crn"] else (c, r, p)
+            seed = ru.seed_sequence(config["seed"], *key)
+            tasks.append({"case": c, "n": int(n), "m": int(m), "protocol_idx": p, "protocol": spec, "replicate": r,
+                          "test_case": test_case, "rounds": config["rounds"], "seed": seed,
+                          "record_rounds": config["record_rounds"], "experiment_seed": config["seed"]})
+    return tasks
+
+
+#----------------- Ejecución ---------------------------------
+
+
+def run_task(task):
+    """ Ejecuta un juego de una tarea y devuelve el registro de resultados. """
+    if isinstance(task["test_case"][0], Corpus):
+        corpus, c = task["test_case"]
+        N, n, m, optimal = corpus[c]
+    else:
+        N, n, m, optimal = task["test_case"]
+    protocol = build_protocol(task["protocol"])
+    start_time = time.perf_counter()
+    _, metrics = gb.game(N, n, task["rounds"], protocol, task["seed"]).play()
+    record = {"case": task["case"], "n": n, "m": m,
+              "protocol": protocol.get_name(), "protocol_idx": task["protocol_idx"],
+              "params": task["protocol"].get("params", {}), "replicate": task["replicate"], "seed": task["experiment_seed"],
+              "seconds": time.perf_counter() - start_time}
+    record.update(mu.get_single_test_metrics(metrics, optimal))
+    if task["record_rounds"]:
+        record["rounds"] = mu.get_game_metrics(metrics, optimal)
+    return _to_json_types(record)
+
+def run_experiment(config, output, workers = 1, stage_workers = None):
+    """
+        Ejecuta el experimento y escribe cada resultado en 'output' a medida que se obtiene.
+            output: archivo .jsonl (un registro por línea) o .csv (sin métricas por ronda).
+            workers: cantidad de procesos que ejecutan los juegos en paralelo.
+            stage_workers: si se indica ({"generate": g, "solve": s, "play": p}), los casos se generan,
+            resuelven y juegan en paralelo como un pipeline (ver utils.pipeline).
+            Sin semilla, se sortea una (ver 'resolve_seed') que queda en cada registro.
+            Retorna la cantidad de juegos ejecutados.
+    """
+    config = resolve_seed(config)
+    if stage_workers is not None:
+        n_games = 0
+        with _open_writer(output) as write:
+            for record in pipeline.run_pipeline(config, stage_workers):
+                write(record)
+                n_games += 1
+        return n_games
+    if config["seed"] is not None:
+        np.random.seed(config["seed"])
+        random.seed(config["seed"])
+    test_cases = build_test_cases(config["test_cases"])
+    tasks = get_tasks(config, test_cases)
+    if config.get("cost_model"):
+        tasks = _schedule_tasks(config, tasks, workers)
+    elif config.get("memory_budget") is not None:
+        raise ValueError("El presupuesto de memoria requiere un modelo de costo (\"cost_model\").")
+
+    with _open_writer(output) as write:
+        if workers > 1:
+            with mp.Pool(workers) as pool:
+                for record in pool.imap_unordered(run_task, tasks):
+                    write(record)
+        else:
+            for task in tasks:
+                write(run_task(task))
+    return len(tasks)
+
+
+#----------------- CLI ---------------------------------
+
+
+def main(argv = None):
+    """ Punto de entrada de la línea de comandos. """
+    parser = argparse.ArgumentParser(description="Ejecuta un experimento de juegos de enrutamiento.")
+    parser.add_argument("config", help="archivo JSON con la configuración del experimento")
+    parser.add_argument("--output", help="archivo de resultados (.jsonl o .csv), por defecto stdout")
+    parser.add_argument("--workers", type=int, default=1, help="cantidad de procesos en paralelo")
+    parser.add_argument("--pipeline", help="ejecutar como pipeline con G,S,P procesos de generación, óptimos y juegos")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    stage_workers = None
+    if args.pipeline:
+        stage_workers = dict(zip(["generate", "solve", "play"], map(int, args.pipeline.split(","))))
+    start_time = time.perf_counter()
+    n_games = run_experiment(config, args.output, args.workers, stage_workers)
+    print(f"{n_games} juegos en {time.perf_counter() - start_time:.1f}s", file=sys.stderr)
+    return 0
+
+
+#----------------- Auxiliares -------------------------
+
+
+def _build_topology_test_case(spec):
+    """ Genera un caso de prueba sobre una topología con la política de caminos indicada. """
+    N = build_topology_network(spec)
+    n = spec["packets"]
+    return (N, n, len(N.get_all_possible_paths()), gb.opt(N, n).play()[1])
+
+@contextmanager
+def _open_writer(path):
+    """ Contexto que devuelve una función que escribe registros en JSONL, CSV o stdout, volcando cada uno al disco. """
+    file = sys.stdout if path is None else open(path, "w", newline="")
+    csv_writer = None
+
+    def write(record):
+        nonlocal csv_writer
+        if path is not None and path.endswith(".csv"):
+            record = {k: (json.dumps(v) if isinstance(v, dict) else v) for k, v in record.items() if k != "rounds"}
+            if csv_writer is None:
+                csv_writer = csv.DictWriter(file, fieldnames=list(record.keys()))
+                csv_writer.writeheader()
+            csv_writer.writerow(record)
+        else:
+            file.write(json.dumps(record) + "\n")
+        file.flush()
+
+    try:
+        yield write
+    finally:
+        if file is not sys.stdout:
+            file.close()
+
+def _schedule_tasks(config, tasks, workers):
+    """
+        Planifica las tareas con el modelo de costo de la configuración (ver utils.scheduler.schedule),
+            informa por stderr el tiempo estimado y las tareas rechazadas por memoria, y devuelve las
+            tareas aceptadas de mayor a menor tiempo estimado (el pool las reparte en ese orden).
+    """
+    model = scheduler.CostModel.load(config["cost_model"])
+    names = [build_protocol(spec).get_name() for spec in config["protocols"]]
+    missing = sorted(set(names) - set(model.quantum))
+    if len(missing) > 0:
+        raise ValueError(f"El modelo de costo no incluye los protocolos: {', '.join(missing)}")
+    schedule_tasks = [scheduler.Task(k, names[task["protocol_idx"]], task["n"], task["m"], task["rounds"])
+                      for k, task in enumerate(tasks)]
+    plan = scheduler.schedule(schedule_tasks, model, workers, config.get("memory_budget"))
+    for rejected in plan.rejected:
+        task = tasks[rejected.key]
+        print(f"Rechazada por memoria: caso {task['case']} (n={task['n']}, m={task['m']}) "
+              f"{rejected.protocol_name} réplica {task['replicate']}, "
+              f"{rejected.predicted_memory / 1e9:.2f} GB estimados", file=sys.stderr)
+    print(plan.describe(), file=sys.stderr)
+    return [tasks[t.key] for t in plan.order]
+
+def _to_json_types(value):
+    """ Convierte recursivamente los tipos de numpy a tipos nativos serializables en JSON. """
+    if isinstance(value, dict):
+        return {k: _to_json_types(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json_types(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+##############################################################################
+# Modelo de costo y planificación de tareas de los barridos de juegos n x m. #
+##############################################################################
+
+import src.game_builder as gb
+from src.protocols.quantum_routing_protocols import QuantumRoutingProtocol
+
+from .lazy import lazy_import
+from . import math as math
+from .network import NetworkGenerator
+
+import heapq
+import json
+import time
+import tracemalloc
+import numpy as np
+
+optimize = lazy_import("scipy.optimize")
+
+
+#----------------- Constantes ---------------------------------
+
+
+# Tamaños (n, m) utilizados por defecto para calibrar el modelo de costo.
+CALIBRATION_SIZES = [(2, 2), (4, 2), (2, 4), (4, 4), (8, 2), (3, 8), (6, 4), (10, 2), (12, 2)]
+
+# Bytes por amplitud del vector de estado (complex128).
+AMPLITUDE_BYTES = 16
+
+
+#----------------- Modelo de costo ---------------------------------
+
+
+class CostModel:
+    """
+        Clase que modela el tiempo y la memoria pico de un juego en función
+            de (protocolo, n, m, rondas). Se calibra a partir de ejecuciones medidas:
+            - tiempo = rondas * (c0 + c1 * n + c2 * x), con x = 2^q (cuánticos) o n * m (clásicos).
+            - memoria = k0 + k1 * x, con x = 2^q * AMPLITUDE_BYTES (cuánticos) o n * m (clásicos).
+            Donde q = n * ceil_log2(m) es la cantidad de qubits del circuito.
+    """
+
+    def __init__(self):
+        self.observations = []
+        self.quantum = {}
+        self.time_coefs = {}
+        self.memory_coefs = {}
+
+    def add_observation(self, protocol_name, quantum, n, m, rounds, seconds, peak_bytes):
+        """ Agrega una ejecución medida al modelo (se requiere 'fit' para actualizarlo). """
+        self.quantum[protocol_name] = quantum
+        self.observations.append({"protocol": protocol_name, "n": n, "m": m, "rounds": rounds,
+                                  "seconds": seconds, "peak_bytes": peak_bytes})
+
+    def calibrate(self, protocols, sizes = CALIBRATION_SIZES, rounds = 10, qubits_limit = 16):
+        """
+            Mide la ejecución de cada protocolo para cada tamaño (n, m) y ajusta el modelo.
+                protocols: funciones que devuelven los protocolos a medir (por ejemplo gb.cm).
+                qubits_limit: se omiten los tamaños que superan esta cantidad de qubits.
+        """
+        generator = NetworkGenerator()
+        for n, m in sizes:
+            if n * math.ceil_log2(m) > qubits_limit:
+                continue
+            N = generator.generate_random_with_paths(m)
+            for protocol_provider in protocols:
+                protocol = protocol_provider()
+                tracemalloc.start()
+                start_time = time.perf_counter()
+                gb.game(N, n, rounds, protocol).play()
+                seconds = time.perf_counter() - start_time
+                _, peak_bytes = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.add_observation(protocol.get_name(), isinstance(protocol, QuantumRoutingProtocol),
+                                     n, m, rounds, seconds, peak_bytes)
+        return self.fit()
+
+    def fit(self):
+        """ Ajusta los coeficientes (no negativos) de cada protocolo con las observaciones. """
+        for protocol_name, quantum in self.quantum.items():
+            observations = [o for o in self.observations if o["protocol"] == protocol_name]
+            time_features = np.array([self._time_features(quantum, o["n"], o["m"], o["rounds"]) for o in observations])
+            memory_features = np.array([self._memory_features(quantum, o["n"], o["m"]) for o in observations])
+            self.time_coefs[protocol_name] = optimize.nnls(time_features, np.array([o["seconds"] for o in observations]))[0]
+            self.memory_coefs[protocol_name] = optimize.nnls(memory_features, np.array([o["peak_bytes"] for o in observations], dtype=float))[0]
+        return self
+
+    def predict_time(self, protocol_name, n, m, rounds):
+        """ Predice el tiempo (en segundos) de un juego. """
+        features = self._time_features(self.quantum[protocol_name], n, m, rounds)
+        return float(np.dot(self.time_coefs[protocol_name], features))
+
+    def predict_memory(self, protocol_name, n, m):
+        """ Predice la memoria pico (en bytes) de un juego. """
+        features = self._memory_features(self.quantum[protocol_name], n, m)
+        return float(np.dot(self.memory_coefs[protocol_name], features))
+
+    def save(self, path):
+        """ Guarda las observaciones del modelo en un archivo JSON. """
+        with open(path, "w") as f:
+            json.dump({"quantum": self.quantum, "observations": self.observations}, f, indent=2)
+
+    @staticmethod
+    def load(path):
+        """ Carga un modelo guardado con 'save' y lo ajusta. """
+        with open(path) as f:
+            data = json.load(f)
+        model = CostModel()
+        model.quantum = data["quantum"]
+        model.observations = data["observations"]
+        return model.fit()
+
+    def _time_features(self, quantum, n, m, rounds):
+        """ Variables explicativas del tiempo de un juego. """
+        x = 2 ** (n * math.ceil_log2(m)) if quantum else n * m
+        return [rounds, rounds * n, rounds * x]
+
+    def _memory_features(self, quantum, n, m):
+        """ Variables explicativas de la memoria pico de un juego. """
+        x = (2 ** (n * math.ceil_log2(m))) * AMPLITUDE_BYTES if quantum else n * m
+        return [1, x]
+
+
+#----------------- Planificación ---------------------------------
+
+
+class Task:
+    """
+        Clase que modela una tarea de un barrido: un juego (o grupo de juegos) de un protocolo
+            con n paquetes, m caminos y 'rounds' rondas, repetido 'repetitions' veces.
+            key: identificador de la tarea (por ejemplo (i, j, p) en la matriz de pruebas).
+    """
+
+    def __init__(self, key, protocol_name, n, m, rounds, repetitions = 1):
+        self.key = key
+        self.protocol_name = protocol_name
+        self.n = n
+        self.m = m
+        self.rounds = rounds
+        self.repetitions = repetitions
+        self.predicted_time = None
+        self.predicted_memory = None
+
+
+class Schedule:
+    """
+        Clase que modela la planificación de las tareas entre los workers.
+            order: las tareas aceptadas, de mayor a menor tiempo estimado.
+            workers: las tareas asignadas a cada worker.
+            rejected: las tareas que superan el presupuesto de memoria.
+    """
+
+    def __init__(self, order, workers, loads, rejected):
+        self.order = order
+        self.workers = workers
+        self.loads = loads
+        self.rejected = rejected
+
+    def get_makespan(self):
+        """ Devuelve el tiempo estimado (en segundos) hasta completar el barrido. """
+        return max(self.loads) if len(self.loads) > 0 else 0
+
+    def get_total_time(self):
+        """ Devuelve el tiempo estimado de cómputo total (suma de todas las tareas). """
+        return sum(self.loads)
+
+    def describe(self):
+        """ Devuelve un texto con el resumen de la planificación. """
+        return (f"{len(self.order)} tareas en {len(self.workers)} workers, "
+                f"{len(self.rejected)} rechazadas por memoria. "
+                f"Tiempo estimado: {self.get_makespan():.1f}s "
+                f"(cómputo total {self.get_total_time():.1f}s).")
+
+
+def schedule(tasks, model, n_workers, memory_budget = None):
+    """
+        Planifica las tareas entre 'n_workers' workers usando el modelo de costo.
+            Las tareas se ordenan de mayor a menor tiempo estimado y cada una se asigna al
+            worker menos cargado (LPT). Se rechazan las tareas cuya memoria estimada supera
+            'memory_budget' (en bytes), si se indica.
+    """
+    accepted = []
+    rejected = []
+    for task in tasks:
+        task.predicted_time = model.predict_time(task.protocol_name, task.n, task.m, task.rounds) * task.repetitions
+        task.predicted_memory = model.predict_memory(task.protocol_name, task.n, task.m)
+        if memory_budget is not None and task.predicted_memory > memory_budget:
+            rejected.append(task)
+        else:
+            accepted.append(task)
+
+    order = sorted(accepted, key=lambda t: t.predicted_time, reverse=True)
+    workers = [[] for _ in range(n_workers)]
+    loads = [0.0] * n_workers
+    heap = [(0.0, w) for w in range(n_workers)]
+    for task in order:
+        load, w = heapq.heappop(heap)
+        workers[w].append(task)
+        loads[w] = load + task.predicted_time
+        heapq.heappush(heap, (loads[w], w))
+    return Schedule(order, workers, loads, rejected)
+
+def get_matrix_tasks(rounds, test_cases, protocols):
+    """
+        Obtiene las tareas de una prueba de matriz (ver utils.tests.execute_matrix_test):
+            una tarea por cada celda (i, j) y protocolo p, con clave (i, j, p).
+    """
+    tasks = []
+    for i in range(len(test_cases)):
+        for j in range(len(test_cases[i])):
+            test_cases_ij = test_cases[i][j]
+            if len(test_cases_ij) == 0:
+                continue
+            _, n, m, _ = test_cases_ij[0]
+            for p, protocol in enumerate(protocols):
+                tasks.append(Task((i, j, p), protocol.get_name(), n, m, rounds, len(test_cases_ij)))
+    return tasks
@@ -0,0 +1,75 @@
+#######################################################################
+# Búsqueda de hiperparámetros de los protocolos (successive halving). #
+#######################################################################
+
+from . import tests as test
+
+import itertools
+import math
+import numpy as np
+
+
+#----------------- Búsqueda ---------------------------------
+
+
+def successive_halving_search(rounds, test_cases, protocol_provider, search_space,
+                              metric = "mean_poa", eta = 3, min_rounds = 10, n_candidates = None,
+                              seed = None, profiler = None):
+    """
+        Busca la mejor configuración de hiperparámetros de un protocolo utilizando successive halving.
+            En cada etapa se evalúan los candidatos restantes con menos rondas y casos de prueba, y
+            sólo el mejor 1/eta pasa a la etapa siguiente. La última etapa utiliza 'rounds' rondas
+            y todos los 'test_cases'.
+            rounds: cantidad de rondas a jugar por prueba en la última etapa.
+            test_cases: los casos de prueba a utilizar.
+            protocol_provider: función que recibe los hiperparámetros como kwargs y devuelve el protocolo
+                (por ejemplo: lambda **p : gb.ewl(**p)).
+            search_space: diccionario {hiperparámetro: valores posibles}, se buscan todas las combinaciones.
+            metric: la métrica de MEAN_METRICS a minimizar.
+            eta: el factor de reducción de candidatos (y de aumento de presupuesto) por etapa.
+            min_rounds: cantidad mínima de rondas a jugar en la primera etapa.
+            n_candidates: si se indica, se evalúa una muestra aleatoria de ese tamaño de las combinaciones.
+            seed, profiler: ver utils.tests.execute_hyperparameter_test (con semilla, todos los candidatos
+                usan los mismos números aleatorios en cada caso de prueba).
+            Retorna la mejor configuración y la traza de evaluaciones realizadas.
+    """
+    candidates = _get_candidates(search_space, n_candidates)
+    n_rungs = max(1, math.ceil(math.log(len(candidates), eta)))
+
+    trace = []
+    for rung in range(n_rungs):
+        # A. Presupuesto de la etapa (rondas y casos de prueba).
+        budget_factor = eta ** (n_rungs - 1 - rung)
+        rung_rounds = max(min(min_rounds, rounds), rounds // budget_factor)
+        rung_cases = test_cases[:max(1, math.ceil(len(test_cases) / budget_factor))]
+
+        # B. Evaluación de los candidatos restantes.
+        scores = []
+        rung_metrics = test.execute_hyperparameter_test(rung_rounds, rung_cases, [lambda config: protocol_provider(**config)],
+                                                        candidates, seed, profiler)[0]
+        for config, metrics in zip(candidates, rung_metrics):
+            trace.append({"rung": rung,
+                          "config": config,
+                          "rounds": rung_rounds,
+                          "n_cases": len(rung_cases),
+                          "metrics": metrics})
+            scores.append(metrics[metric])
+
+        # C. Selección de los mejores candidatos.
+        n_survivors = max(1, math.ceil(len(candidates) / eta))
+        candidates = [candidates[i] for i in np.argsort(scores, kind="stable")[:n_survivors]]
+
+    return candidates[0], trace
+
+
+#----------------- Auxiliares -------------------------
+
+
+def _get_candidates(search_space, n_candidates):
+    """ Obtiene las combinaciones de hiperparámetros a evaluar. """
+    names = list(search_space.keys())
+    candidates = [dict(zip(names, values)) for values in itertools.product(*search_space.values())]
+    if n_candidates is not None and n_candidates < len(candidates):
+        idxs = np.random.choice(range(len(candidates)), size=n_candidates, replace=False)
+        candidates = [candidates[i] for i in sorted(idxs)]
+    return candidates
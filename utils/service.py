@@ -0,0 +1,218 @@
+##########################################################################
+# Servicio local persistente que ejecuta juegos con módulos en caliente. #
+##########################################################################
+#
+# Uso:
+#   python -m utils.service --address /tmp/qrg.sock --corpus corpus.bin
+#
+# El servicio mantiene importados PennyLane, cvxpy y networkx, los simuladores cuánticos
+# (ver QuantumRoutingProtocol.enable_device_cache), los corpus abiertos y los casos de prueba
+# ya generados, por lo que los experimentos cortos no pagan el tiempo de inicialización.
+#
+# Protocolo (una línea JSON por mensaje sobre un socket Unix):
+#   -> {"type": "sweep", "config": {...}}      (configuración de utils.runner)
+#   <- {"record": {...}} por cada juego, a medida que terminan, y luego {"done": k, "seconds": s}
+#   -> {"type": "game", "corpus": path, "index": i, "protocol": {...}, "rounds": r, "seed": s}
+#   <- {"record": {...}} del juego sobre el caso i del corpus, y luego {"done": 1, "seconds": s}
+#   -> {"type": "ping"}                         <- {"pong": true, "uptime": s, "jobs": k}
+#   -> {"type": "shutdown"}                     <- {"done": 0}
+#   Los errores se devuelven como {"error": "..."}.
+
+from src.protocols.quantum_routing_protocols import QuantumRoutingProtocol
+
+from .lazy import lazy_import
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+import numpy as np
+
+corpus = lazy_import("utils.corpus")
+runner = lazy_import("utils.runner")
+
+
+#----------------- Constantes ---------------------------------
+
+
+# Dirección (socket Unix) utilizada por defecto por el servicio y sus clientes.
+DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), "quantum-routing-games.sock")
+
+# Módulos que el servicio importa al iniciar.
+WARM_MODULES = ["pennylane", "cvxpy", "networkx", "scipy.optimize"]
+
+
+#----------------- Servicio ---------------------------------
+
+
+class WorkerService:
+    """
+        Clase que modela el servicio: recibe trabajos por un socket Unix y los ejecuta de a uno
+            en un hilo propio (los juegos comparten la caché de simuladores), devolviendo cada
+            resultado al cliente apenas se obtiene.
+    """
+
+    def __init__(self, address = DEFAULT_ADDRESS):
+        self.address = address
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.test_cases = {}
+        self.start_time = time.perf_counter()
+        self.n_jobs = 0
+
+    def warm_up(self, corpora = []):
+        """ Importa los módulos pesados, habilita la caché de simuladores y abre los corpus. """
+        for module in WARM_MODULES:
+            __import__(module)
+        QuantumRoutingProtocol.enable_device_cache()
+        for path in corpora:
+            corpus.open_corpus(path)
+
+    async def serve(self):
+        """ Atiende clientes hasta recibir un trabajo 'shutdown'. """
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        self.stopped = asyncio.Event()
+        server = await asyncio.start_unix_server(self._handle_client, path=self.address)
+        print(f"Servicio escuchando en {self.address}", file=sys.stderr)
+        async with server:
+            await self.stopped.wait()
+        os.remove(self.address)
+
+    def run_sweep(self, config, emit):
+        """
+            Ejecuta los juegos de una configuración de utils.runner, llamando a 'emit' con cada resultado.
+                Los casos de prueba generados con semilla se conservan para los trabajos siguientes.
+        """
+        config = {**runner.DEFAULT_CONFIG, **config}
+        test_cases = self._get_test_cases(config)
+        tasks = runner.get_tasks(config, test_cases)
+        for task in tasks:
+            emit({"record": runner.run_task(task)})
+        return len(tasks)
+
+    def run_game(self, job, emit):
+        """
+            Ejecuta un único juego sobre el caso 'index' de un corpus (que queda abierto para los trabajos
+                siguientes) con el protocolo, rondas y semilla del trabajo, llamando a 'emit' con el resultado.
+        """
+        test_cases = corpus.open_corpus(job["corpus"])
+        c = job["index"]
+        task = {"case": c, "n": int(test_cases.arrays["case_n"][c]), "m": int(test_cases.arrays["case_m"][c]),
+                "protocol_idx": 0, "protocol": job["protocol"], "replicate": 0, "test_case": (test_cases, c),
+                "rounds": job.get("rounds", runner.DEFAULT_CONFIG["rounds"]), "seed": job.get("seed"),
+                "record_rounds": job.get("record_rounds", False), "experiment_seed": job.get("seed")}
+        emit({"record": runner.run_task(task)})
+        return 1
+
+    async def _handle_client(self, reader, writer):
+        """ Atiende los trabajos de un cliente, uno por línea. """
+        loop = asyncio.get_running_loop()
+        while line := await reader.readline():
+            # Las líneas que no son un trabajo válido se responden con un error (como en _run_job).
+            try:
+                job = json.loads(line)
+                if not isinstance(job, dict):
+                    raise ValueError(f"se esperaba un objeto JSON: {line.decode(errors='replace').strip()}")
+            except ValueError as e:
+                writer.write((json.dumps({"error": f"{type(e).__name__}: {e}"}) + "\n").encode())
+                await writer.drain()
+                continue
+            messages = asyncio.Queue()
+            emit = lambda message: loop.call_soon_threadsafe(messages.put_nowait, message)
+            future = loop.run_in_executor(self.executor, self._run_job, job, emit)
+            while True:
+                message = await messages.get()
+                writer.write((json.dumps(message) + "\n").encode())
+                await writer.drain()
+                if "done" in message or "error" in message or "pong" in message:
+                    break
+            await future
+            if job.get("type") == "shutdown":
+                self.stopped.set()
+                break
+        writer.close()
+
+    def _run_job(self, job, emit):
+        """ Ejecuta un trabajo (en el hilo del servicio) y emite sus mensajes. """
+        try:
+            if job["type"] == "ping":
+                emit({"pong": True, "uptime": time.perf_counter() - self.start_time, "jobs": self.n_jobs})
+            elif job["type"] in ["sweep", "game"]:
+                start_time = time.perf_counter()
+                n_games = self.run_sweep(job["config"], emit) if job["type"] == "sweep" else self.run_game(job, emit)
+                self.n_jobs += 1
+                emit({"done": n_games, "seconds": time.perf_counter() - start_time})
+            elif job["type"] == "shutdown":
+                emit({"done": 0})
+            else:
+                emit({"error": f"Tipo de trabajo desconocido: {job['type']}"})
+        except Exception as e:
+            emit({"error": f"{type(e).__name__}: {e}"})
+
+    def _get_test_cases(self, config):
+        """ Genera los casos de prueba de la configuración (o reutiliza los ya generados con la misma semilla). """
+        key = json.dumps([config["test_cases"], config["seed"]], sort_keys=True)
+        if key in self.test_cases:
+            return self.test_cases[key]
+        if config["seed"] is not None:
+            np.random.seed(config["seed"])
+            random.seed(config["seed"])
+        test_cases = runner.build_test_cases(config["test_cases"])
+        if config["seed"] is not None:
+            self.test_cases[key] = test_cases
+        return test_cases
+
+
+#----------------- Cliente ---------------------------------
+
+
+def submit_job(job, address = DEFAULT_ADDRESS):
+    """
+        Envía un trabajo al servicio y devuelve (generador) cada mensaje de respuesta a medida que llega.
+            Lanza RuntimeError si el servicio informa un error.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(address)
+        connection.sendall((json.dumps(job) + "\n").encode())
+        with connection.makefile("r") as responses:
+            for line in responses:
+                message = json.loads(line)
+                if "error" in message:
+                    raise RuntimeError(message["error"])
+                yield message
+                if "done" in message or "pong" in message:
+                    return
+
+def is_running(address = DEFAULT_ADDRESS):
+    """ Indica si hay un servicio atendiendo en 'address'. """
+    try:
+        next(submit_job({"type": "ping"}, address))
+        return True
+    except (OSError, RuntimeError):
+        return False
+
+
+#----------------- CLI ---------------------------------
+
+
+def main(argv = None):
+    """ Punto de entrada de la línea de comandos. """
+    parser = argparse.ArgumentParser(description="Servicio local que ejecuta juegos de enrutamiento en caliente.")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="ruta del socket Unix del servicio")
+    parser.add_argument("--corpus", action="append", default=[], help="corpus a mantener abierto (puede repetirse)")
+    args = parser.parse_args(argv)
+
+    service = WorkerService(args.address)
+    service.warm_up(args.corpus)
+    asyncio.run(service.serve())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
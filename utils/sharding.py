@@ -0,0 +1,261 @@
+###################################################################
+# Barridos distribuidos mediante una cola de trabajo en archivos. #
+###################################################################
+#
+# Uso (el directorio de la cola debe estar en un sistema de archivos compartido por los nodos):
+#   1. Crear la cola:   sharding.submit_matrix_test(queue_dir, rounds, test_cases, protocol_specs, seed)
+#   2. En cada nodo:    python -m utils.sharding worker queue_dir --processes 8
+#   3. Unir resultados: sharding.merge_results(queue_dir)
+#
+# Estructura de la cola:
+#   queue_dir/job.pkl                  definición del barrido (casos de prueba, protocolos, semilla).
+#   queue_dir/shards/<s>.json          claves de las tareas del shard s.
+#   queue_dir/leases/<s>.lease         lease del worker que ejecuta el shard (creado con O_EXCL).
+#   queue_dir/results/<s>.pkl          resultados parciales del shard (escritos de forma atómica).
+
+import src.game_builder as gb
+
+from . import metric as mu
+from . import rng as ru
+from . import runner
+
+import argparse
+from contextlib import contextmanager
+import json
+import multiprocessing as mp
+import os
+import pickle
+import socket
+import sys
+import threading
+import time
+
+
+#----------------- Constantes ---------------------------------
+
+
+# Segundos sin renovar tras los cuales el lease de un shard no terminado se considera abandonado.
+LEASE_TIMEOUT = 6 * 3600
+
+# Segundos máximos entre renovaciones del lease del shard en ejecución.
+HEARTBEAT_INTERVAL = 60
+
+
+#----------------- Creación de la cola ---------------------------------
+
+
+def submit_matrix_test(queue_dir, rounds, test_cases, protocol_specs, seed = None, n_shards = None):
+    """
+        Crea la cola de una prueba de matriz (ver utils.tests.execute_matrix_test).
+            Cada tarea es una celda (i, j) y un protocolo p (con todas sus repeticiones).
+            protocol_specs: especificaciones de los protocolos (ver utils.runner.build_protocol).
+            n_shards: cantidad de shards en que se dividen las tareas (por defecto, una tarea por shard).
+    """
+    keys = [(i, j, p) for i in range(len(test_cases)) for j in range(len(test_cases[i]))
+            for p in range(len(protocol_specs))]
+    job = {"kind": "matrix", "rounds": rounds, "test_cases": test_cases, "protocols": protocol_specs, "seed": seed}
+    return _create_queue(queue_dir, job, keys, n_shards)
+
+def submit_combinations_test(queue_dir, rounds, test_cases, tests_per_case, protocol_specs, seed = None, n_shards = None):
+    """
+        Crea la cola de una prueba de combinaciones (ver utils.tests.execute_combinations_test).
+            Cada tarea es un caso i y un protocolo p (con sus 'tests_per_case' repeticiones).
+    """
+    keys = [(i, p) for i in range(len(test_cases)) for p in range(len(protocol_specs))]
+    job = {"kind": "combinations", "rounds": rounds, "test_cases": test_cases, "tests_per_case": tests_per_case,
+           "protocols": protocol_specs, "seed": seed}
+    return _create_queue(queue_dir, job, keys, n_shards)
+
+
+#----------------- Workers ---------------------------------
+
+
+def run_worker(queue_dir, worker_id = None, lease_timeout = LEASE_TIMEOUT):
+    """
+        Ejecuta shards de la cola hasta que no quede ninguno disponible.
+            Cada shard se reclama creando su archivo de lease de forma atómica, por lo que varios
+            workers (en uno o varios nodos) nunca ejecutan el mismo shard a la vez. Mientras se ejecuta
+            un shard su lease se renueva periódicamente; los leases de shards no terminados que no se
+            renovaron en 'lease_timeout' segundos se consideran abandonados (worker caído).
+            Retorna la cantidad de shards ejecutados.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    with open(os.path.join(queue_dir, "job.pkl"), "rb") as f:
+        job = pickle.load(f)
+    n_executed = 0
+    for shard in _get_shards(queue_dir):
+        if _is_done(queue_dir, shard) or not _claim(queue_dir, shard, worker_id, lease_timeout):
+            continue
+        with open(_shard_path(queue_dir, shard)) as f:
+            keys = [tuple(key) for key in json.load(f)]
+        with _heartbeat(_lease_path(queue_dir, shard), lease_timeout):
+            results = {key: _run_task(job, key) for key in keys}
+        result_path = _result_path(queue_dir, shard)
+        with open(result_path + ".tmp", "wb") as f:
+            pickle.dump(results, f)
+        os.replace(result_path + ".tmp", result_path)
+        n_executed += 1
+    return n_executed
+
+def run_local(queue_dir, n_workers, lease_timeout = LEASE_TIMEOUT):
+    """
+        Ejecuta la cola con 'n_workers' procesos independientes en este host (como si fueran nodos).
+            Retorna la cantidad de shards ejecutados por cada worker.
+    """
+    with mp.Pool(n_workers) as pool:
+        return pool.starmap(run_worker, [(queue_dir, f"{socket.gethostname()}-local-{w}", lease_timeout)
+                                         for w in range(n_workers)])
+
+def get_progress(queue_dir):
+    """ Devuelve la cantidad de shards terminados, en ejecución y pendientes. """
+    shards = _get_shards(queue_dir)
+    done = [s for s in shards if _is_done(queue_dir, s)]
+    running = [s for s in shards if s not in done and os.path.exists(_lease_path(queue_dir, s))]
+    return {"done": len(done), "running": len(running), "pending": len(shards) - len(done) - len(running)}
+
+
+#----------------- Unión de resultados ---------------------------------
+
+
+def merge_results(queue_dir):
+    """
+        Une los resultados parciales de todos los shards en la estructura anidada de la prueba original:
+            [n][m][protocolo] para la prueba de matriz y [caso][protocolo] para la de combinaciones.
+            Lanza ValueError si algún shard no terminó.
+    """
+    with open(os.path.join(queue_dir, "job.pkl"), "rb") as f:
+        job = pickle.load(f)
+    missing = [s for s in _get_shards(queue_dir) if not _is_done(queue_dir, s)]
+    if len(missing) > 0:
+        raise ValueError(f"Faltan los resultados de {len(missing)} shards: {missing[:10]}")
+    results = {}
+    for shard in _get_shards(queue_dir):
+        with open(_result_path(queue_dir, shard), "rb") as f:
+            results.update(pickle.load(f))
+
+    n_protocols = len(job["protocols"])
+    if job["kind"] == "matrix":
+        return [[[results[(i, j, p)] for p in range(n_protocols)] for j in range(len(row))]
+                for i, row in enumerate(job["test_cases"])]
+    return [[results[(i, p)] for p in range(n_protocols)] for i in range(len(job["test_cases"]))]
+
+
+#----------------- CLI ---------------------------------
+
+
+def main(argv = None):
+    """ Punto de entrada de la línea de comandos. """
+    parser = argparse.ArgumentParser(description="Workers de barridos distribuidos en una cola de archivos.")
+    parser.add_argument("command", choices=["worker", "progress"], help="ejecutar shards o mostrar el avance")
+    parser.add_argument("queue_dir", help="directorio (compartido) de la cola")
+    parser.add_argument("--processes", type=int, default=1, help="cantidad de workers en este nodo")
+    parser.add_argument("--lease-timeout", type=float, default=LEASE_TIMEOUT, help="segundos hasta considerar abandonado un lease")
+    args = parser.parse_args(argv)
+
+    if args.command == "progress":
+        print(json.dumps(get_progress(args.queue_dir)))
+        return 0
+    start_time = time.perf_counter()
+    n_shards = sum(run_local(args.queue_dir, args.processes, args.lease_timeout))
+    print(f"{n_shards} shards en {time.perf_counter() - start_time:.1f}s", file=sys.stderr)
+    return 0
+
+
+#----------------- Auxiliares -------------------------
+
+
+def _create_queue(queue_dir, job, keys, n_shards):
+    """ Escribe la definición del barrido y divide sus tareas en shards. Retorna la cantidad de shards. """
+    for sub_dir in ["shards", "leases", "results"]:
+        os.makedirs(os.path.join(queue_dir, sub_dir), exist_ok=True)
+    with open(os.path.join(queue_dir, "job.pkl"), "wb") as f:
+        pickle.dump(job, f)
+    n_shards = len(keys) if n_shards is None else min(n_shards, len(keys))
+    for s in range(n_shards):
+        with open(_shard_path(queue_dir, s), "w") as f:
+            json.dump(keys[s::n_shards], f)
+    return n_shards
+
+def _run_task(job, key):
+    """ Ejecuta las repeticiones de una tarea y devuelve sus métricas medias (como en utils.tests). """
+    protocol = runner.build_protocol(job["protocols"][key[-1]])
+    if job["kind"] == "matrix":
+        i, j, _ = key
+        games = [(test_case, (i, j, k)) for k, test_case in enumerate(job["test_cases"][i][j])]
+    else:
+        i, _ = key
+        games = [(job["test_cases"][i], (i, k)) for k in range(job["tests_per_case"])]
+    protocol_metrics = []
+    for (N, n, m, optimal), seed_key in games:
+        _, metrics = gb.game(N, n, job["rounds"], protocol, ru.seed_sequence(job["seed"], *seed_key)).play()
+        protocol_metrics.append(mu.get_single_test_metrics(metrics, optimal))
+    return mu.get_mean_test_metrics(protocol_metrics)
+
+def _claim(queue_dir, shard, worker_id, lease_timeout):
+    """ Intenta reclamar el shard creando su lease de forma atómica (recuperando leases abandonados). """
+    lease_path = _lease_path(queue_dir, shard)
+    try:
+        if time.time() - os.path.getmtime(lease_path) > lease_timeout:
+            # Sólo un worker logra renombrar el lease abandonado, pero entre la lectura de la fecha y el
+            # renombrado otro worker pudo haberlo recuperado y creado uno nuevo: si el lease movido ya no
+            # está abandonado se restaura (sin pisar otro lease) y se desiste.
+            expired_path = f"{lease_path}.expired-{worker_id}"
+            os.rename(lease_path, expired_path)
+            if time.time() - os.path.getmtime(expired_path) <= lease_timeout:
+                try:
+                    os.link(expired_path, lease_path)
+                finally:
+                    os.unlink(expired_path)
+                return False
+            os.unlink(expired_path)
+    except OSError:
+        pass
+    try:
+        fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as f:
+        json.dump({"worker": worker_id, "time": time.time()}, f)
+    return True
+
+@contextmanager
+def _heartbeat(lease_path, lease_timeout):
+    """
+        Renueva periódicamente la fecha de modificación del lease mientras se ejecuta el bloque,
+            para que 'lease_timeout' mida la caída del worker y no la duración del shard.
+    """
+    stop = threading.Event()
+    def beat():
+        while not stop.wait(min(HEARTBEAT_INTERVAL, lease_timeout / 4)):
+            try:
+                os.utime(lease_path)
+            except OSError:
+                pass
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def _get_shards(queue_dir):
+    """ Devuelve los identificadores de los shards de la cola. """
+    return sorted(int(name.split(".")[0]) for name in os.listdir(os.path.join(queue_dir, "shards")))
+
+def _is_done(queue_dir, shard):
+    """ Indica si el shard ya tiene sus resultados. """
+    return os.path.exists(_result_path(queue_dir, shard))
+
+def _shard_path(queue_dir, shard):
+    return os.path.join(queue_dir, "shards", f"{shard}.json")
+
+def _lease_path(queue_dir, shard):
+    return os.path.join(queue_dir, "leases", f"{shard}.lease")
+
+def _result_path(queue_dir, shard):
+    return os.path.join(queue_dir, "results", f"{shard}.pkl")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,13 +3,20 @@
 #########################################################
 
 import src.game_builder as gb
+from src.markov_chains import MarkovChainAnalyzer
 
+from .lazy import lazy_import
 from . import math as math
 from . import metric as mu
 from .network import NetworkGenerator
+from . import rng as ru
+from . import service
+from .results import ResultsTensor
 
 import numpy as np
 
+sharding = lazy_import("utils.sharding")
+
 
 #----------------- Constantes ---------------------------------
 
@@ -33,11 +40,19 @@ def get_specific_test_case(n, m):
 
 def get_test_case():
     """ Obtiene un caso de prueba aleatorio. """
+    return get_specific_test_case(*get_random_game_size())
+
+def get_random_game_size():
+    """ Obtiene un tamaño de juego (n, m) aleatorio válido. """
     while True:
         n = np.random.randint(2, QUBITS_LIMIT + 1)
         m = np.random.randint(2, QUBITS_LIMIT + 1)
         if _valid_game_size(n, m):
-            return get_specific_test_case(n, m)
+            return (n, m)
+
+def get_matrix_game_sizes():
+    """ Obtiene los tamaños (n, m) de los casos de 'get_matrix_test_cases', en el mismo orden. """
+    return [(n, m) for n in range(2, QUBITS_LIMIT+1) for m in range(2, QUBITS_LIMIT+1) if _valid_game_size(n, m)]
 
 def get_test_cases(n_cases):
     """ Obtiene 'n' casos de prueba aleatorios. """
@@ -136,21 +151,23 @@ def combinations_test_cases_5(n):
 #----------------- Ejecución de pruebas ----------------------
 
 
-def execute_regular_test(rounds, test_case, protocols):
+def execute_regular_test(rounds, test_case, protocols, seed = None, profiler = None):
     """ 
         Ejecuta una prueba normal.
             Ejecución de un 'test_case' por 'rounds' rondas, para cada 
             uno de los 'protocolos', compilando las métricas por ronda.
+            seed: si se indica, todos los protocolos usan números aleatorios comunes.
+            profiler: si se indica, acumula los tiempos por fase de todos los juegos.
     """
     execution_metrics = []
     N, n, _, optimal = test_case
     for protocol in protocols:
-        _, metrics = gb.game(N, n, rounds, protocol).play()
+        _, metrics = gb.game(N, n, rounds, protocol, seed, profiler).play()
         game_metrics = mu.get_game_metrics(metrics, optimal)
         execution_metrics.append(game_metrics)
     return execution_metrics
 
-def execute_hyperparameter_test(rounds, test_cases, protocol_providers, hyperparameter_range):
+def execute_hyperparameter_test(rounds, test_cases, protocol_providers, hyperparameter_range, seed = None, profiler = None):
     """ 
         Ejecuta una prueba de hiperparámetros.
             Compila la información media por cada protocolo para 
@@ -159,28 +176,42 @@ def execute_hyperparameter_test(rounds, test_cases, protocol_providers, hyperpar
             test_cases: los casos de prueba para cada combinación de (protocolo, valor de hiperparámetro).
             protocol_providers: las funciones que devuelven los protocolos a utilizar para cada valor del hiperparámetro.
             hyperparameter_range: el rango de valores del hiperparámetro a probar.
+            seed: si se indica, cada caso de prueba usa los mismos números aleatorios 
+                para todos los protocolos y valores del hiperparámetro.
+            profiler: si se indica, acumula los tiempos por fase de todos los juegos.
     """
     execution_metrics = []
     for protocol_provider in protocol_providers:
         protocol_metrics = []
         for hypterparameter in hyperparameter_range:
             tests_metrics = []
-            for (N, n, m, optimal) in test_cases:
+            for k, (N, n, m, optimal) in enumerate(test_cases):
                 protocol = protocol_provider(hypterparameter)
-                _, metrics = gb.game(N, n, rounds, protocol).play()
+                _, metrics = gb.game(N, n, rounds, protocol, ru.seed_sequence(seed, k), profiler).play()
                 tests_metrics.append(mu.get_single_test_metrics(metrics, optimal))
             protocol_metrics.append(mu.get_mean_test_metrics(tests_metrics))
         execution_metrics.append(protocol_metrics)
     return execution_metrics
 
-def execute_matrix_test(rounds, test_cases, protocols):
+def execute_matrix_test(rounds, test_cases, protocols, seed = None, profiler = None,
+                        queue_dir = None, n_shards = None, n_workers = 1):
     """ 
         Ejecuta una prueba para generar una matriz de resultados para distintos valores de n x m.
             Compila la información media por cada protocolo para cada valor de n y m.
             rounds: cantidad de rondas a jugar por prueba.
             test_cases: los casos de prueba para cada combinación de n y m.
             protocols: los protocolos a utilizar para cada prueba.
+            seed: si se indica, cada caso de prueba usa los mismos números aleatorios para todos los protocolos.
+            profiler: si se indica, acumula los tiempos por fase de todos los juegos.
+            queue_dir: si se indica, la prueba se divide en 'n_shards' shards en una cola en ese directorio
+                y se ejecuta con 'n_workers' procesos (ver utils.sharding), con los mismos resultados.
+                Los protocolos deben darse como especificaciones (ver utils.runner.build_protocol).
+                Si la prueba se interrumpe, al volver a ejecutarla sólo se ejecutan los shards pendientes.
     """
+    if queue_dir is not None:
+        _check_sharded_test(protocols, profiler)
+        sharding.submit_matrix_test(queue_dir, rounds, test_cases, protocols, seed, n_shards)
+        return _run_sharded_test(queue_dir, n_workers)
     execution_metrics = []
     for i in range(len(test_cases)):
         execution_metrics_n = []
@@ -189,15 +220,47 @@ def execute_matrix_test(rounds, test_cases, protocols):
             test_cases_ij = test_cases[i][j]
             for protocol in protocols:
                 protocol_metrics = []
-                for (N, n, m, optimal) in test_cases_ij:
-                    _, metrics = gb.game(N, n, rounds, protocol).play()
+                for k, (N, n, m, optimal) in enumerate(test_cases_ij):
+                    _, metrics = gb.game(N, n, rounds, protocol, ru.seed_sequence(seed, i, j, k), profiler).play()
                     protocol_metrics.append(mu.get_single_test_metrics(metrics, optimal))
                 execution_metrics_m.append(mu.get_mean_test_metrics(protocol_metrics))
             execution_metrics_n.append(execution_metrics_m)
         execution_metrics.append(execution_metrics_n)
     return execution_metrics
 
-def execute_combinations_test(rounds, test_cases, tests_per_case, protocols):
+def execute_matrix_test_tensor(rounds, test_cases, protocols, seed = None, profiler = None, record_rounds = False):
+    """ 
+        Ejecuta la misma prueba que execute_matrix_test, pero conserva cada repetición y devuelve
+            un ResultsTensor con ejes protocol x n x m x replicate x metric (métricas medias del juego).
+            record_rounds: si se indica, guarda las métricas de cada ronda con ejes
+                protocol x n x m x replicate x round x metric.
+            Las celdas n x m sin casos de prueba valen NaN.
+    """
+    n_labels = [_get_matrix_row_n(cases, i) for i, cases in enumerate(test_cases)]
+    m_labels = sorted({cases_ij[0][2] for cases in test_cases for cases_ij in cases if len(cases_ij) > 0})
+    n_replicates = max([len(cases_ij) for cases in test_cases for cases_ij in cases], default=0)
+    metrics = [m_name for m_name, _ in (mu.METRICS if record_rounds else mu.MEAN_METRICS)]
+    shape = (len(protocols), len(n_labels), len(m_labels), n_replicates) + ((rounds,) if record_rounds else ()) + (len(metrics),)
+    data = np.full(shape, np.nan)
+
+    for i in range(len(test_cases)):
+        for j in range(len(test_cases[i])):
+            for p, protocol in enumerate(protocols):
+                for k, (N, n, m, optimal) in enumerate(test_cases[i][j]):
+                    _, game_metrics = gb.game(N, n, rounds, protocol, ru.seed_sequence(seed, i, j, k), profiler).play()
+                    if record_rounds:
+                        game_metrics = mu.get_game_metrics(game_metrics, optimal)
+                        data[p, i, m_labels.index(m), k] = np.transpose([game_metrics[metric] for metric in metrics])
+                    else:
+                        game_metrics = mu.get_single_test_metrics(game_metrics, optimal)
+                        data[p, i, m_labels.index(m), k] = [game_metrics[metric] for metric in metrics]
+
+    axes = ["protocol", "n", "m", "replicate"] + (["round"] if record_rounds else []) + ["metric"]
+    labels = {"protocol": [protocol.get_name() for protocol in protocols], "n": n_labels, "m": m_labels, "metric": metrics}
+    return ResultsTensor(data, axes, labels)
+
+def execute_combinations_test(rounds, test_cases, tests_per_case, protocols, seed = None, profiler = None,
+                              queue_dir = None, n_shards = None, n_workers = 1):
     """ 
         Ejecuta una prueba de todas las posibles combinaciones de redes
             de v nodos y 2 caminos.
@@ -205,22 +268,103 @@ def execute_combinations_test(rounds, test_cases, tests_per_case, protocols):
             test_cases: los casos de prueba.
             tests_per_case: la cantidad de veces que se ejecuta el test por cada caso.
             protocols: los protocolos a utilizar para cada prueba.
+            seed: si se indica, cada repetición de cada caso usa los mismos números aleatorios para todos los protocolos.
+            profiler: si se indica, acumula los tiempos por fase de todos los juegos.
+            queue_dir, n_shards, n_workers: ejecución en una cola de shards (ver 'execute_matrix_test').
     """
+    if queue_dir is not None:
+        _check_sharded_test(protocols, profiler)
+        sharding.submit_combinations_test(queue_dir, rounds, test_cases, tests_per_case, protocols, seed, n_shards)
+        return _run_sharded_test(queue_dir, n_workers)
     execution_metrics = []
-    for N, n, _, optimal in test_cases:
+    for i, (N, n, _, optimal) in enumerate(test_cases):
         test_case_metrics = []
         for protocol in protocols:
             protocol_metrics = []
-            for _ in range(tests_per_case):
-                _, metrics = gb.game(N, n, rounds, protocol).play()
+            for k in range(tests_per_case):
+                _, metrics = gb.game(N, n, rounds, protocol, ru.seed_sequence(seed, i, k), profiler).play()
                 protocol_metrics.append(mu.get_single_test_metrics(metrics, optimal))
             test_case_metrics.append(mu.get_mean_test_metrics(protocol_metrics))
         execution_metrics.append(test_case_metrics)
     return execution_metrics
 
+def execute_exact_combinations_test(rounds, test_cases, protocols):
+    """ 
+        Equivalente exacto de 'execute_combinations_test' para protocolos con estrategias puras (CP y MWP):
+            las métricas medias esperadas se calculan con la cadena de Markov de cada juego (ver
+            src.markov_chains), sin ejecutar juegos.
+    """
+    execution_metrics = []
+    for N, n, _, optimal in test_cases:
+        test_case_metrics = []
+        for protocol in protocols:
+            metrics = MarkovChainAnalyzer(N, n, protocol).get_expected_metrics(rounds)
+            test_case_metrics.append(mu.get_single_test_metrics(metrics, optimal))
+        execution_metrics.append(test_case_metrics)
+    return execution_metrics
+
+
+def execute_equilibrium_test(test_cases, integer = True):
+    """ 
+        Calcula las métricas del flujo de equilibrio de cada caso de prueba sin simular rondas.
+            Su precio de anarquía es la referencia analítica de los protocolos.
+            integer: equilibrio de Nash con flujos enteros (True) o de Wardrop continuo (False).
+    """
+    execution_metrics = []
+    for (N, n, _, optimal) in test_cases:
+        _, metrics = gb.eq(N, n, integer).play()
+        metrics["poa"] = mu.compute_poa(metrics["total_cost"], optimal["total_cost"])
+        execution_metrics.append(metrics)
+    return execution_metrics
+
+def execute_service_test(config, address = service.DEFAULT_ADDRESS):
+    """ 
+        Ejecuta un experimento en el servicio persistente (ver utils.service), que mantiene los
+            módulos, simuladores y casos de prueba en caliente.
+            config: configuración del experimento (ver utils.runner).
+            Retorna la lista de registros de resultados (en orden de llegada).
+    """
+    messages = service.submit_job({"type": "sweep", "config": config}, address)
+    return [message["record"] for message in messages if "record" in message]
+
+def execute_service_game(corpus_path, index, protocol, rounds, seed = None, record_rounds = False,
+                         address = service.DEFAULT_ADDRESS):
+    """ 
+        Ejecuta un único juego en el servicio persistente (ver utils.service) sobre el caso 'index'
+            de un corpus (ver utils.corpus).
+            protocol: especificación del protocolo (ver utils.runner.build_protocol).
+            Retorna el registro de resultados del juego.
+    """
+    job = {"type": "game", "corpus": corpus_path, "index": index, "protocol": protocol,
+           "rounds": rounds, "seed": seed, "record_rounds": record_rounds}
+    messages = service.submit_job(job, address)
+    return [message["record"] for message in messages if "record" in message][0]
+
 
 #----------------- Auxiliares -------------------------
 
+def _check_sharded_test(protocols, profiler):
+    """ Valida los argumentos de una prueba ejecutada en una cola de shards. """
+    if not all(isinstance(protocol, dict) for protocol in protocols):
+        raise ValueError("Las pruebas en shards requieren especificaciones de protocolos (ver utils.runner.build_protocol).")
+    if profiler is not None:
+        raise ValueError("Las pruebas en shards no admiten profiler: los juegos se ejecutan en otros procesos.")
+
+def _run_sharded_test(queue_dir, n_workers):
+    """ Ejecuta los shards pendientes de la cola con 'n_workers' procesos y une sus resultados. """
+    sharding.run_local(queue_dir, n_workers)
+    return sharding.merge_results(queue_dir)
+
+def _get_matrix_row_n(cases, i):
+    """ 
+        Obtiene el valor de n de la fila 'i' de una matriz de casos de prueba: el de su primera celda
+            con casos o, si todas están vacías, el de la fila i de 'get_matrix_game_sizes'.
+    """
+    for cases_ij in cases:
+        if len(cases_ij) > 0:
+            return cases_ij[0][1]
+    return sorted({n for n, _ in get_matrix_game_sizes()})[i]
+
 def _valid_game_size(n, m):
     """ 
         Determina si el tamaño del juego es válido de acuerdo